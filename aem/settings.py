@@ -52,9 +52,7 @@ INSTALLED_APPS = [
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework_jwt.authentication.JSONWebTokenAuthentication',
         'aemauthentication.backends.JWTAuthentication',
-
     ],
 
     'DEFAULT_PERMISSION_CLASSES': [
@@ -68,6 +66,10 @@ REST_FRAMEWORK = {
 
 AUTH_USER_MODEL = 'aemauthentication.User'
 
+AUTHENTICATION_BACKENDS = [
+    'aemauthentication.backends.CachedPermissionBackend',
+]
+
 # JWT settings
 JWT_AUTH = {
     'JWT_ENCODE_HANDLER':
@@ -104,6 +106,69 @@ JWT_AUTH = {
     'JWT_AUTH_COOKIE': None,
 }
 
+# Access tokens are short lived, clients exchange a refresh token for a new
+# pair at /users/token/refresh/ instead of logging in again.
+ACCESS_TOKEN_LIFETIME = datetime.timedelta(minutes=15)
+REFRESH_TOKEN_LIFETIME = datetime.timedelta(days=60)
+
+# Per-process cache of authenticated users, see `aemauthentication.cache`.
+USER_CACHE_MAX_SIZE = 1024
+USER_CACHE_TIMEOUT = 60
+
+# Resolved group and user permissions are kept in the shared cache (see CACHES)
+# and invalidated by signals. The timeout bounds how long a change the signals
+# can't see, e.g. a queryset `.update()`, may go unnoticed.
+PERMISSION_CACHE_TIMEOUT = 5 * 60
+
+# When enabled, tokens carry the user's company, groups and active flag and
+# requests are authenticated from those claims without loading the user. The
+# token versions they are checked against are kept in the shared cache (see
+# CACHES), for at most TOKEN_VERSION_CACHE_TIMEOUT seconds between reads of the
+# database.
+AEM_STATELESS_AUTH = False
+TOKEN_VERSION_CACHE_TIMEOUT = 5 * 60
+
+# How often, in seconds, each worker writes buffered `User.last_active` times.
+ACTIVITY_FLUSH_INTERVAL = 30
+
+# Login password hashing runs on its own bounded pool, see
+# `aemauthentication.hashing`. Logins beyond workers + queue size get a 429.
+LOGIN_HASHING_WORKERS = 2
+LOGIN_HASHING_QUEUE_SIZE = 32
+LOGIN_HASHING_TIMEOUT = 30
+
+# Bulk user provisioning hashes passwords on a separate pool.
+PROVISIONING_HASHING_WORKERS = 4
+PROVISIONING_HASHING_TIMEOUT = 300
+
+# Token buckets limiting failed login attempts per username and all login
+# attempts per client IP, see `aemauthentication.throttling`. Set
+# LOGIN_THROTTLE_SHARED to keep the buckets in the default cache so every
+# worker shares them.
+LOGIN_THROTTLE_USERNAME_BURST = 5
+LOGIN_THROTTLE_USERNAME_PER_MINUTE = 5
+LOGIN_THROTTLE_IP_BURST = 30
+LOGIN_THROTTLE_IP_PER_MINUTE = 30
+LOGIN_THROTTLE_SHARED = False
+
+# Default and maximum page sizes of the cursor paginated list endpoints, see
+# `core.pagination.KeysetPagination`.
+CURSOR_PAGE_SIZE = 100
+CURSOR_MAX_PAGE_SIZE = 1000
+
+# Maximum number of clients returned by /clients/search/.
+SEARCH_RESULTS_LIMIT = 50
+
+# Number of clients read per query by the streaming export.
+EXPORT_CHUNK_SIZE = 2000
+
+# Number of rows validated and inserted together by the bulk endpoints.
+BULK_BATCH_SIZE = 500
+
+# Country code given to phone numbers written without one (i.e. with a
+# leading 0) when they are normalized, see `core.normalization`.
+PHONE_DEFAULT_COUNTRY_CODE = '44'
+
 PROJECT_DIR = os.path.dirname(os.path.abspath(__file__))
 STATIC_ROOT = os.path.join(PROJECT_DIR, 'static')
 
@@ -148,6 +213,17 @@ DATABASES = {
     }
 }
 
+# Token versions, resolved permissions and throttle buckets are shared between
+# workers through the default cache, so it mustn't be a per-process one. The
+# table is created by the core migrations (or `createcachetable`), deployments
+# with memcached or Redis can point this at them instead.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+        'LOCATION': 'aem_cache',
+    }
+}
+
 # Password validation
 # https://docs.djangoproject.com/en/2.1/ref/settings/#auth-password-validators
 
@@ -208,6 +284,8 @@ ADD_CLIENT_PERMISSION = "clients.add_client"
 ADD_CUSTOMER_PERMISSION = "customers.add_customer"
 ADD_COMPANY_PERMISSION = "company.add_company"
 VIEW_COMPANY_PERMISSION = "company.view_company"
+VIEW_CLIENT_PERMISSION = "clients.view_client"
+VIEW_CUSTOMER_PERMISSION = "customers.view_customer"
 
 """
     PERMISSIONS
@@ -245,13 +323,16 @@ AEM_EMPLOYEE_CLIENT_PERMISSIONS = (
 
 AEM_CUSTOMER_SUPER_USER_CLIENT_PERMISSIONS = (
     ADD_CLIENT_PERMISSION,
+    VIEW_CLIENT_PERMISSION,
 )
 
 AEM_CUSTOMER_ADMIN_CLIENT_PERMISSIONS = (
     ADD_CLIENT_PERMISSION,
+    VIEW_CLIENT_PERMISSION,
 )
 
 AEM_CUSTOMER_USER_CLIENT_PERMISSIONS = (
+    VIEW_CLIENT_PERMISSION,
 )
 
 # CUSTOMER PERMISSIONS
@@ -263,13 +344,16 @@ AEM_EMPLOYEE_CUSTOMER_PERMISSIONS = (
 
 AEM_CUSTOMER_SUPER_USER_CUSTOMER_PERMISSIONS = (
     ADD_CUSTOMER_PERMISSION,
+    VIEW_CUSTOMER_PERMISSION,
 )
 
 AEM_CUSTOMER_ADMIN_CUSTOMER_PERMISSIONS = (
     ADD_CUSTOMER_PERMISSION,
+    VIEW_CUSTOMER_PERMISSION,
 )
 
 AEM_CUSTOMER_USER_CUSTOMER_PERMISSIONS = (
+    VIEW_CUSTOMER_PERMISSION,
 )
 
 # COMPANY PERMISSIONS
@@ -5,6 +5,7 @@ from rest_framework.urlpatterns import format_suffix_patterns
 
 from aemauthentication import views as authentication_views
 from company import views as company_views
+from core import views as core_views
 from clients import views as client_views
 from customers import views as customer_views
 
@@ -14,17 +15,32 @@ urlpatterns = [
 
     # aemauthentication
     path('users/', authentication_views.CreateUserAPIView.as_view(), name="create-user"),
+    path('users/bulk/', authentication_views.BulkCreateUserAPIView.as_view(), name="bulk-create-user"),
     path('users/login/', authentication_views.LoginAPIView.as_view(), name="login"),
+    path('users/token/refresh/', authentication_views.RefreshTokenAPIView.as_view(), name="refresh-token"),
+    path('users/token/revoke/', authentication_views.RevokeTokenAPIView.as_view(), name="revoke-token"),
 
     # company
     path('company/', company_views.ListCreateCompanyAPIView.as_view(), name="list-create-company"),
     path('company/<int:pk>/', company_views.RetrieveCompanyAPIView.as_view(), name="retrieve-company"),
+    path('company/<int:pk>/stats/', company_views.CompanyStatsAPIView.as_view(), name="company-stats"),
 
     # clients
     path('clients/', client_views.ListCreateClientAPIView.as_view(), name="list-create-client"),
+    path('clients/search/', client_views.SearchClientsAPIView.as_view(), name="search-clients"),
+    path('clients/import/', client_views.ImportClientsAPIView.as_view(), name="import-clients"),
+    path('clients/export/', client_views.ExportClientsAPIView.as_view(), name="export-clients"),
+    path('clients/duplicates/', client_views.ClientDuplicatesAPIView.as_view(), name="client-duplicates"),
+    path('clients/<int:pk>/customers/', customer_views.ListClientCustomersAPIView.as_view(),
+         name="list-client-customers"),
 
     # customers
     path('customers/', customer_views.CreateCustomerAPIView.as_view(), name="list-create-customer"),
+    path('customers/bulk/', customer_views.BulkCreateCustomerAPIView.as_view(), name="bulk-create-customer"),
+    path('customers/duplicates/', customer_views.CustomerDuplicatesAPIView.as_view(), name="customer-duplicates"),
+
+    # lookup
+    path('lookup/phone/<str:number>/', core_views.PhoneLookupAPIView.as_view(), name="phone-lookup"),
 ]
 urlpatterns += [url(r'^silk/', include('silk.urls', namespace='silk'))]
 
@@ -0,0 +1,123 @@
+import atexit
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Case, DateTimeField, Value, When
+from django.utils import timezone
+
+from .models import User
+
+logger = logging.getLogger(__name__)
+
+
+class ActivityTracker:
+    """
+    Buffers each user's last seen time in memory and writes them behind in one
+    batched `UPDATE ... SET last_active = CASE ...` per `flush_interval`.
+
+    Only `last_active` is written, so tracking activity never rewrites the
+    rest of the user row, and at most one write per interval per worker hits
+    the database. `User.last_active` can therefore lag by up to
+    `flush_interval`, use `last_active()` when that matters.
+
+    A flush is also scheduled on a background timer whenever there is pending
+    activity, so a worker that goes idle still writes it, and the module
+    flushes once more when the process exits.
+    """
+
+    # Each user takes three query parameters, stay well below SQLite's limit.
+    batch_size = 250
+
+    def __init__(self, flush_interval):
+        self.flush_interval = flush_interval
+        self.flushes = 0
+        self.rows_written = 0
+        self._pending = {}
+        self._last_flush = time.monotonic()
+        self._database = None
+        self._timer = None
+        self._lock = threading.Lock()
+
+    def touch(self, user_id, when=None):
+        with self._lock:
+            if not self._pending:
+                self._database = connection.settings_dict['NAME']
+
+            self._pending[user_id] = when or timezone.now()
+            flush_due = time.monotonic() - self._last_flush >= self.flush_interval
+
+            if not flush_due and self._timer is None:
+                self._timer = threading.Timer(self.flush_interval, self._flush_in_background)
+                self._timer.daemon = True
+                self._timer.start()
+
+        if flush_due:
+            self.flush()
+
+    def _flush_in_background(self):
+        with self._lock:
+            self._timer = None
+
+        try:
+            self.flush()
+        finally:
+            connection.close()
+
+    def last_active(self, user):
+        with self._lock:
+            return self._pending.get(user.pk, user.last_active)
+
+    def flush(self):
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            self._last_flush = time.monotonic()
+
+        if not pending:
+            return 0
+
+        # The times belong to the database they were recorded against, e.g.
+        # not to the development database once a test run has torn its own down.
+        if connection.settings_dict['NAME'] != self._database:
+            logger.info('Discarding user activity recorded against another database.')
+            return 0
+
+        written = 0
+        user_ids = list(pending)
+
+        try:
+            for start in range(0, len(user_ids), self.batch_size):
+                batch = user_ids[start:start + self.batch_size]
+                written += User._base_manager.filter(pk__in=batch).update(last_active=Case(
+                    *[When(pk=user_id, then=Value(pending[user_id])) for user_id in batch],
+                    output_field=DateTimeField()
+                ))
+        except Exception:
+            logger.exception('Failed to write user activity, it will be retried on the next flush.')
+
+            with self._lock:
+                for user_id, when in pending.items():
+                    if user_id not in self._pending:
+                        self._pending[user_id] = when
+
+            return written
+
+        with self._lock:
+            self.flushes += 1
+            self.rows_written += written
+
+        return written
+
+    def stats(self):
+        with self._lock:
+            return {
+                'pending': len(self._pending),
+                'flushes': self.flushes,
+                'rows_written': self.rows_written,
+            }
+
+
+activity_tracker = ActivityTracker(flush_interval=settings.ACTIVITY_FLUSH_INTERVAL)
+atexit.register(activity_tracker.flush)
@@ -3,3 +3,6 @@ from django.apps import AppConfig
 
 class AuthenticationConfig(AppConfig):
     name = 'aemauthentication'
+
+    def ready(self):
+        from . import signals  # noqa: F401
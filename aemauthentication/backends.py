@@ -1,14 +1,26 @@
 import jwt
 
 from django.conf import settings
+from django.contrib.auth.backends import ModelBackend
 
 from rest_framework import authentication, exceptions
 
+from .activity import activity_tracker
+from .cache import permission_cache, user_cache
 from .models import User
+from .tokens import get_token_version
 
 
 class JWTAuthentication(authentication.BaseAuthentication):
-    authentication_header_prefix = 'Token'
+    """
+    The single authenticator for the API.
+
+    Both the `Bearer` prefix used by `rest_framework_jwt` clients and our own
+    `Token` prefix are accepted, so the Authorization header is only parsed
+    and the JWT only verified once per request.
+    """
+    authentication_header_prefixes = ('bearer', 'token')
+    www_authenticate_realm = 'api'
 
     def authenticate(self, request):
         """
@@ -34,10 +46,9 @@ class JWTAuthentication(authentication.BaseAuthentication):
         request.user = None
 
         # `auth_header` should be an array with two elements: 1) the name of
-        # the authentication header (in this case, "Token") and 2) the JWT
+        # the authentication header ("Bearer" or "Token") and 2) the JWT
         # that we should authenticate against.
         auth_header = authentication.get_authorization_header(request).split()
-        auth_header_prefix = self.authentication_header_prefix.lower()
 
         if not auth_header:
             return None
@@ -60,7 +71,7 @@ class JWTAuthentication(authentication.BaseAuthentication):
         prefix = auth_header[0].decode('utf-8')
         token = auth_header[1].decode('utf-8')
 
-        if prefix.lower() != auth_header_prefix:
+        if prefix.lower() not in self.authentication_header_prefixes:
             # The auth header prefix is not what we expected. Do not attempt to
             # authenticate.
             return None
@@ -70,19 +81,53 @@ class JWTAuthentication(authentication.BaseAuthentication):
         # method below.
         return self._authenticate_credentials(request, token)
 
+    def authenticate_header(self, request):
+        # Returning a value here makes DRF answer failed authentication with a
+        # 401 rather than a 403.
+        return 'Bearer realm="{}"'.format(self.www_authenticate_realm)
+
+    def _decode_token(self, request, token):
+        """
+        Verify and decode `token`, memoizing the payload on the underlying
+        Django request so that it is only ever decoded once per request.
+        """
+        http_request = getattr(request, '_request', request)
+        decoded = getattr(http_request, '_jwt_payload', None)
+
+        if decoded is not None and decoded[0] == token:
+            return decoded[1]
+
+        payload = jwt.decode(token, settings.SECRET_KEY, algorithms=['HS256'])
+        http_request._jwt_payload = (token, payload)
+
+        return payload
+
     def _authenticate_credentials(self, request, token):
         """
         Try to authenticate the given credentials. If authentication is
         successful, return the user and token. If not, throw an error.
         """
         try:
-            payload = jwt.decode(token, settings.SECRET_KEY)
-        except:
+            payload = self._decode_token(request, token)
+        except jwt.InvalidTokenError:
             msg = 'Invalid authentication. Could not decode token.'
             raise exceptions.AuthenticationFailed(msg)
 
+        # Tokens issued by `rest_framework_jwt` carry the pk as `user_id`.
+        user_id = payload.get('id', payload.get('user_id'))
+
+        if user_id is None:
+            msg = 'Invalid authentication. Token has no user.'
+            raise exceptions.AuthenticationFailed(msg)
+
+        if settings.AEM_STATELESS_AUTH and 'groups' in payload:
+            user = self._authenticate_claims(user_id, payload)
+            activity_tracker.touch(user.pk)
+
+            return user, token
+
         try:
-            user = User.objects.get(pk=payload['id'])
+            user = user_cache.get(user_id, lambda pk: User.objects.get(pk=pk))
         except User.DoesNotExist:
             msg = 'No user matching this token was found.'
             raise exceptions.AuthenticationFailed(msg)
@@ -91,4 +136,83 @@ class JWTAuthentication(authentication.BaseAuthentication):
             msg = 'This user has been deactivated.'
             raise exceptions.AuthenticationFailed(msg)
 
+        if payload.get('ver', 0) != user.token_version:
+            msg = 'This token has been revoked.'
+            raise exceptions.AuthenticationFailed(msg)
+
+        activity_tracker.touch(user.pk)
+
         return user, token
+
+    def _authenticate_claims(self, user_id, payload):
+        """
+        Build the user from the identity claims of a stateless token. The only
+        lookup is the user's current token version, which is served from the
+        cache once warm.
+        """
+        if not payload.get('is_active', False):
+            msg = 'This user has been deactivated.'
+            raise exceptions.AuthenticationFailed(msg)
+
+        token_version = get_token_version(user_id)
+
+        if token_version is None:
+            msg = 'No user matching this token was found.'
+            raise exceptions.AuthenticationFailed(msg)
+
+        if payload.get('ver', 0) != token_version:
+            msg = 'This token has been revoked.'
+            raise exceptions.AuthenticationFailed(msg)
+
+        claims = {
+            'id': user_id,
+            'username': payload.get('username', ''),
+            'company_id': payload.get('company'),
+            'is_active': True,
+            'is_superuser': payload.get('is_superuser', False),
+            'token_version': token_version,
+        }
+
+        # Every other field is deferred and only loaded if something asks for
+        # it, saving the instance only ever writes the fields above.
+        user = User.from_db(None, list(claims), [
+            claims[field.attname] for field in User._meta.concrete_fields if field.attname in claims
+        ])
+        user.aem_group_slugs = frozenset(payload['groups'])
+
+        return user
+
+
+class CachedPermissionBackend(ModelBackend):
+    """
+    `ModelBackend` with permission sets resolved from `permission_cache`, so
+    after warm up `has_perm` is a set lookup rather than a join over the
+    permission and group tables.
+
+    The sets are memoized on the user for the rest of the request, which is
+    safe because `user_cache` builds a new instance for every request.
+    """
+
+    def get_user_permissions(self, user_obj, obj=None):
+        if not user_obj.is_active or user_obj.is_anonymous or obj is not None:
+            return set()
+
+        if user_obj.is_superuser:
+            return super().get_user_permissions(user_obj, obj)
+
+        if not hasattr(user_obj, '_user_perm_cache'):
+            user_obj._user_perm_cache = permission_cache.user_permissions(user_obj.pk)
+
+        return user_obj._user_perm_cache
+
+    def get_group_permissions(self, user_obj, obj=None):
+        if not user_obj.is_active or user_obj.is_anonymous or obj is not None:
+            return set()
+
+        if user_obj.is_superuser:
+            return super().get_group_permissions(user_obj, obj)
+
+        if not hasattr(user_obj, '_group_perm_cache'):
+            user_obj._group_perm_cache = permission_cache.group_permissions(permission_cache.group_ids(user_obj.pk))
+
+        return user_obj._group_perm_cache
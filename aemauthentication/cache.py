@@ -0,0 +1,172 @@
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.contrib.auth.models import Group
+from django.core.cache import cache
+
+from .models import User
+
+
+class UserCache:
+    """
+    A bounded, per-process LRU cache of `User` rows keyed by primary key.
+
+    Only the field values are kept and every hit builds a new instance from
+    them, so requests never share, or see each other's changes to, a `User`.
+    Entries expire after `timeout` seconds so that anything the signal
+    handlers can't see (e.g. a queryset `.update()`) is only ever stale for a
+    short window. `hits` and `misses` are kept so the query savings can be
+    observed under load.
+    """
+
+    def __init__(self, max_size, timeout):
+        self.max_size = max_size
+        self.timeout = timeout
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, user_id, loader):
+        """
+        Return a `User` for `user_id` from the cached row, calling
+        `loader(user_id)` to fetch it on a miss. Exceptions raised by the
+        loader are not cached.
+        """
+        now = time.monotonic()
+
+        with self._lock:
+            entry = self._entries.get(user_id)
+
+            if entry is not None and entry[1] > now:
+                self._entries.move_to_end(user_id)
+                self.hits += 1
+                row = entry[0]
+            else:
+                row = None
+                self.misses += 1
+
+        if row is not None:
+            return User.from_db(*row)
+
+        user = loader(user_id)
+
+        if self.max_size > 0 and self.timeout > 0:
+            loaded = [field.attname for field in User._meta.concrete_fields if field.attname in user.__dict__]
+            row = (user._state.db, loaded, [getattr(user, attname) for attname in loaded])
+
+            with self._lock:
+                self._entries[user_id] = (row, now + self.timeout)
+                self._entries.move_to_end(user_id)
+
+                while len(self._entries) > self.max_size:
+                    self._entries.popitem(last=False)
+
+        return user
+
+    def invalidate(self, *user_ids):
+        with self._lock:
+            for user_id in user_ids:
+                self._entries.pop(user_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                'size': len(self._entries),
+                'max_size': self.max_size,
+                'hits': self.hits,
+                'misses': self.misses,
+            }
+
+
+user_cache = UserCache(max_size=settings.USER_CACHE_MAX_SIZE, timeout=settings.USER_CACHE_TIMEOUT)
+
+
+class PermissionCache:
+    """
+    Caches resolved permission codenames in the default Django cache, which
+    has to be shared by every worker for an invalidation to reach them all.
+
+    Each group's permission set is cached once and shared by every member, a
+    user's own group ids and direct permissions are cached per user. Entries
+    are dropped by the signal handlers whenever a membership changes.
+    """
+
+    def __init__(self, timeout):
+        self.timeout = timeout
+
+    @staticmethod
+    def _group_key(group_id):
+        return 'aemauthentication:group-perms:{}'.format(group_id)
+
+    @staticmethod
+    def _user_groups_key(user_id):
+        return 'aemauthentication:user-groups:{}'.format(user_id)
+
+    @staticmethod
+    def _user_perms_key(user_id):
+        return 'aemauthentication:user-perms:{}'.format(user_id)
+
+    def group_ids(self, user_id):
+        key = self._user_groups_key(user_id)
+        group_ids = cache.get(key)
+
+        if group_ids is None:
+            group_ids = list(User.groups.through.objects.filter(user_id=user_id).values_list('group_id', flat=True))
+            cache.set(key, group_ids, self.timeout)
+
+        return group_ids
+
+    def group_permissions(self, group_ids):
+        """
+        Return the union of the permissions of `group_ids`, every group not
+        already cached is resolved in a single query.
+        """
+        keys = {self._group_key(group_id): group_id for group_id in group_ids}
+        cached = cache.get_many(keys)
+        missing = [group_id for key, group_id in keys.items() if key not in cached]
+
+        if missing:
+            resolved = {group_id: set() for group_id in missing}
+            rows = Group.permissions.through.objects.filter(group_id__in=missing).values_list(
+                'group_id', 'permission__content_type__app_label', 'permission__codename')
+
+            for group_id, app_label, codename in rows:
+                resolved[group_id].add('{}.{}'.format(app_label, codename))
+
+            cache.set_many({self._group_key(group_id): perms for group_id, perms in resolved.items()}, self.timeout)
+            cached.update({self._group_key(group_id): perms for group_id, perms in resolved.items()})
+
+        return set().union(*cached.values())
+
+    def user_permissions(self, user_id):
+        key = self._user_perms_key(user_id)
+        perms = cache.get(key)
+
+        if perms is None:
+            rows = User.user_permissions.through.objects.filter(user_id=user_id).values_list(
+                'permission__content_type__app_label', 'permission__codename')
+            perms = {'{}.{}'.format(app_label, codename) for app_label, codename in rows}
+            cache.set(key, perms, self.timeout)
+
+        return perms
+
+    def invalidate_groups(self, *group_ids):
+        cache.delete_many([self._group_key(group_id) for group_id in group_ids])
+
+    def invalidate_user_groups(self, *user_ids):
+        cache.delete_many([self._user_groups_key(user_id) for user_id in user_ids])
+
+    def invalidate_user_permissions(self, *user_ids):
+        cache.delete_many([self._user_perms_key(user_id) for user_id in user_ids])
+
+
+permission_cache = PermissionCache(timeout=settings.PERMISSION_CACHE_TIMEOUT)
@@ -1,4 +1,5 @@
 import factory
+from django.conf import settings
 from django.contrib.auth.models import Group, Permission
 from django.contrib.contenttypes.models import ContentType
 from factory import lazy_attribute
@@ -46,6 +47,21 @@ class AemGroupFactory(factory.django.DjangoModelFactory):
     linked_group = factory.SubFactory(GroupsFactory)
     slug_field = ""
 
+    @classmethod
+    def for_role(cls, role):
+        """
+        The group of `role`, e.g. `'AEM_CUSTOMER_SUPER_USER'`, with the slug,
+        name and permissions settings gives it.
+        """
+        return cls.create(
+            slug_field=getattr(settings, '{}_SLUG_FIELD'.format(role)),
+            linked_group__name=getattr(settings, '{}_LINKED_GROUP_NAME'.format(role)),
+            can_add_permission_slugs=getattr(settings, '{}_CAN_ADD_USER_PERMISSIONS'.format(role)),
+            client_permissions=getattr(settings, '{}_CLIENT_PERMISSIONS'.format(role)),
+            customer_permissions=getattr(settings, '{}_CUSTOMER_PERMISSIONS'.format(role)),
+            company_permissions=getattr(settings, '{}_COMPANY_PERMISSIONS'.format(role))
+        )
+
     @factory.post_generation
     def can_add_permission_slugs(self, create, extracted, **kwargs):
         if not create:
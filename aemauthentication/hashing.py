@@ -0,0 +1,157 @@
+import concurrent.futures
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth import authenticate
+from django.db import close_old_connections
+from rest_framework import exceptions
+
+
+class HashingTimedOut(exceptions.APIException):
+    status_code = 503
+    default_detail = 'Logins are taking too long to check right now, please try again shortly.'
+    default_code = 'hashing_timed_out'
+
+
+class PasswordHasherPool:
+    """
+    Runs password hashing on a small, dedicated pool of threads.
+
+    PBKDF2 releases the GIL, so hashing here doesn't stall the rest of the
+    process, and at most `max_workers` hashes run at once however many logins
+    arrive together. Up to `max_queue` more may wait for a worker, beyond that
+    logins are turned away with a 429 rather than tying up request workers,
+    and a login whose hash takes longer than `timeout` gets a 503.
+    """
+
+    def __init__(self, max_workers, max_queue, timeout):
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.timeout = timeout
+
+        self.queued = 0
+        self.running = 0
+        self.max_queued = 0
+        self.completed = 0
+        self.rejected = 0
+        self.timed_out = 0
+
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='password-hashing')
+        self._slots = threading.BoundedSemaphore(max_workers + max_queue)
+        self._lock = threading.Lock()
+
+    def run(self, func, *args):
+        """
+        Run `func(*args)` on the pool and wait for its result.
+        """
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self.rejected += 1
+
+            raise exceptions.Throttled(wait=1, detail='Too many logins are in progress, please try again shortly.')
+
+        future = self._submit(func, args)
+
+        # The slot is only given back once the hash has actually finished, even
+        # if we stop waiting for it.
+        future.add_done_callback(lambda f: self._slots.release())
+
+        try:
+            return future.result(timeout=self.timeout)
+        except concurrent.futures.TimeoutError:
+            with self._lock:
+                self.timed_out += 1
+
+            raise HashingTimedOut()
+
+    def map(self, func, items):
+        """
+        Run `func` over `items` on the pool, returning the results in order.
+        Used for bulk work, which waits for a worker rather than being turned
+        away.
+        """
+        futures = [self._submit(func, (item,)) for item in items]
+        deadline = time.monotonic() + self.timeout
+
+        try:
+            return [future.result(timeout=deadline - time.monotonic()) for future in futures]
+        except concurrent.futures.TimeoutError:
+            with self._lock:
+                self.timed_out += 1
+
+            for future in futures:
+                future.cancel()
+
+            raise
+
+    def _submit(self, func, args):
+        with self._lock:
+            self.queued += 1
+            self.max_queued = max(self.max_queued, self.queued)
+
+        future = self._executor.submit(self._call, func, args)
+
+        # A cancelled call never starts, so never leaves the queue by itself.
+        future.add_done_callback(self._forget_cancelled)
+
+        return future
+
+    def _forget_cancelled(self, future):
+        if future.cancelled():
+            with self._lock:
+                self.queued -= 1
+
+    def _call(self, func, args):
+        with self._lock:
+            self.queued -= 1
+            self.running += 1
+
+        try:
+            return func(*args)
+        finally:
+            with self._lock:
+                self.running -= 1
+                self.completed += 1
+
+    def authenticate(self, username, password, request=None):
+        """
+        `django.contrib.auth.authenticate` run on the pool, so it goes through
+        `AUTHENTICATION_BACKENDS` and sends `user_login_failed` as usual.
+        """
+        return self.run(self._authenticate, request, username, password)
+
+    @staticmethod
+    def _authenticate(request, username, password):
+        # The pool's threads keep their own connections, look after them the
+        # way a request does.
+        close_old_connections()
+
+        try:
+            return authenticate(request, username=username, password=password)
+        finally:
+            close_old_connections()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'max_workers': self.max_workers,
+                'max_queue': self.max_queue,
+                'queued': self.queued,
+                'running': self.running,
+                'max_queued': self.max_queued,
+                'completed': self.completed,
+                'rejected': self.rejected,
+                'timed_out': self.timed_out,
+            }
+
+
+login_hasher = PasswordHasherPool(max_workers=settings.LOGIN_HASHING_WORKERS,
+                                  max_queue=settings.LOGIN_HASHING_QUEUE_SIZE,
+                                  timeout=settings.LOGIN_HASHING_TIMEOUT)
+
+# Bulk provisioning hashes on its own pool so it can't starve logins.
+provisioning_hasher = PasswordHasherPool(max_workers=settings.PROVISIONING_HASHING_WORKERS,
+                                         max_queue=0,
+                                         timeout=settings.PROVISIONING_HASHING_TIMEOUT)
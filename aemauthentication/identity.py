@@ -0,0 +1,114 @@
+from django.contrib.auth.models import Permission
+
+from company.models import Company
+from .cache import permission_cache
+from .models import User
+
+
+class Identity:
+    """
+    Everything the permission classes need to know about the requesting user.
+    """
+
+    def __init__(self, user_id, is_active, is_superuser, company, group_slugs, permissions):
+        self.user_id = user_id
+        self.is_active = is_active
+        self.is_superuser = is_superuser
+        self.company = company
+        self.group_slugs = frozenset(group_slugs)
+        self.permissions = frozenset(permissions)
+
+    @property
+    def company_id(self):
+        return self.company.pk if self.company is not None else None
+
+    def has_perm(self, perm):
+        """
+        Mirrors `User.has_perm` for model level permissions.
+        """
+        return self.is_active and (self.is_superuser or perm in self.permissions)
+
+    def in_any_group(self, *slugs):
+        return not self.group_slugs.isdisjoint(slugs)
+
+    @classmethod
+    def load(cls, user):
+        """
+        Load the identity of `user` in two queries: one joining its company,
+        AemGroup slugs and group permissions, and one for its own permissions.
+        Joining both permission sets in one query would return every pairing
+        of them.
+        """
+        queryset = User._base_manager.filter(pk=user.pk)
+        rows = list(queryset.values_list(
+            'is_active', 'is_superuser',
+            'company_id', 'company__name', 'company__is_active', 'company__is_deleted',
+            'groups__aemgroup__slug_field',
+            'groups__permissions__content_type__app_label', 'groups__permissions__codename',
+        ))
+
+        if not rows:
+            return cls(user.pk, False, False, None, (), ())
+
+        is_active, is_superuser, company_id, company_name, company_is_active, company_is_deleted = rows[0][:6]
+
+        company = None
+        if company_id is not None:
+            company = Company.from_db(queryset.db, ['id', 'name', 'is_active', 'is_deleted'],
+                                      [company_id, company_name, company_is_active, company_is_deleted])
+
+        group_slugs = set()
+        permissions = set()
+
+        for row in rows:
+            slug, app_label, codename = row[6:]
+
+            if slug is not None:
+                group_slugs.add(slug)
+            if codename is not None:
+                permissions.add('{}.{}'.format(app_label, codename))
+
+        user_permissions = Permission.objects.filter(user=user.pk).values_list('content_type__app_label', 'codename')
+        permissions.update('{}.{}'.format(app_label, codename) for app_label, codename in user_permissions)
+
+        return cls(user.pk, is_active, is_superuser, company, group_slugs, permissions)
+
+
+    @classmethod
+    def from_claims(cls, user):
+        """
+        The identity of a `user` built from the claims of a stateless token.
+        Its permissions come from `permission_cache`, so once that's warm
+        nothing is read from the auth tables, and its company only has an id
+        until something asks for more.
+        """
+        company = None
+        if user.company_id is not None:
+            company = Company.from_db(None, ['id'], [user.company_id])
+
+        permissions = permission_cache.user_permissions(user.pk) | permission_cache.group_permissions(
+            permission_cache.group_ids(user.pk))
+
+        return cls(user.pk, user.is_active, user.is_superuser, company, user.aem_group_slugs, permissions)
+
+
+def get_identity(request):
+    """
+    Return the `Identity` of the request's user, loading it at most once per
+    request.
+    """
+    http_request = getattr(request, '_request', request)
+    identity = getattr(http_request, '_aem_identity', None)
+
+    if identity is None or identity.user_id != request.user.pk:
+        if getattr(request.user, 'aem_group_slugs', None) is not None:
+            identity = Identity.from_claims(request.user)
+        else:
+            identity = Identity.load(request.user)
+        http_request._aem_identity = identity
+
+        # Anything that still goes through `request.user.company` shouldn't
+        # have to load it again.
+        User._meta.get_field('company').set_cached_value(request.user, identity.company)
+
+    return identity
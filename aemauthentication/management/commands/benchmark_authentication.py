@@ -0,0 +1,44 @@
+from django.core.management.base import BaseCommand
+from rest_framework.test import APIRequestFactory
+from rest_framework_jwt.authentication import JSONWebTokenAuthentication
+from rest_framework_jwt.settings import api_settings as jwt_settings
+
+from aemauthentication.backends import JWTAuthentication
+from aemauthentication.cache import user_cache
+from aemauthentication.models import User
+from core.benchmark import format_summary, measure, rolled_back
+
+
+class Command(BaseCommand):
+    help = 'Compares the per-request cost of the old two authenticator chain against JWTAuthentication alone.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        iterations = options['iterations']
+
+        with rolled_back():
+            user = User.objects.create_user(username='benchmark-user', email='benchmark@example.com',
+                                            password='Benchmark01')
+            headers = {
+                'Bearer': 'Bearer {}'.format(jwt_settings.JWT_ENCODE_HANDLER(jwt_settings.JWT_PAYLOAD_HANDLER(user))),
+                'Token': 'Token {}'.format(user.token),
+            }
+            factory = APIRequestFactory()
+
+            def authenticate_with(authenticators, header):
+                request = factory.get('/', HTTP_AUTHORIZATION=header)
+
+                for authenticator in authenticators:
+                    if authenticator.authenticate(request) is not None:
+                        return
+
+            chain = [JSONWebTokenAuthentication(), JWTAuthentication()]
+            single = [JWTAuthentication()]
+
+            for prefix, header in headers.items():
+                for label, authenticators in (('jwt chain', chain), ('unified', single)):
+                    user_cache.clear()
+                    timings = measure(lambda: authenticate_with(authenticators, header), iterations)
+                    self.stdout.write(format_summary('{} ({})'.format(label, prefix), timings))
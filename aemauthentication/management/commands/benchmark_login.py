@@ -0,0 +1,86 @@
+import threading
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import Client as TestClient
+from django.urls import reverse
+
+from aemauthentication.hashing import login_hasher
+from aemauthentication.models import User
+from aemauthentication.throttling import ip_limiter, username_limiter
+from clients.models import Client
+from company.models import Company
+from core.benchmark import format_summary
+
+
+class Command(BaseCommand):
+    help = 'Measures login throughput and the p99 latency of concurrent /clients/ reads during a login storm.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--duration', type=float, default=10.0, help='Seconds to run the storm for.')
+        parser.add_argument('--login-threads', type=int, default=16)
+        parser.add_argument('--reader-threads', type=int, default=4)
+
+    def handle(self, *args, **options):
+        # Requests run on their own threads and connections, so the fixtures
+        # have to be committed and are removed again afterwards.
+        company = Company.objects.create(name='benchmark-login-company')
+        user = User.objects.create_user(username='benchmark-login-user', email='benchmark@example.com',
+                                        password='Benchmark01', company=company)
+        user.is_superuser = True
+        user.save()
+        Client.objects.bulk_create(
+            Client(company=company, name='Client {}'.format(i), email='client{}@example.com'.format(i))
+            for i in range(50)
+        )
+
+        try:
+            self._run(user, options)
+        finally:
+            company.delete()
+
+    def _run(self, user, options):
+        ip_limiter.reset()
+        username_limiter.reset()
+
+        deadline = time.monotonic() + options['duration']
+        login_statuses = []
+        read_timings = []
+        token = user.token
+
+        def login():
+            client = TestClient()
+            data = {'username': user.username, 'password': 'Benchmark01'}
+
+            while time.monotonic() < deadline:
+                response = client.post(reverse('login'), data, content_type='application/json')
+                login_statuses.append(response.status_code)
+
+            connection.close()
+
+        def read():
+            client = TestClient(HTTP_AUTHORIZATION='Token {}'.format(token))
+
+            while time.monotonic() < deadline:
+                start = time.perf_counter()
+                client.get(reverse('list-create-client'))
+                read_timings.append((time.perf_counter() - start) * 1000)
+
+            connection.close()
+
+        threads = [threading.Thread(target=login) for _ in range(options['login_threads'])]
+        threads += [threading.Thread(target=read) for _ in range(options['reader_threads'])]
+
+        for thread in threads:
+            thread.start()
+
+        for thread in threads:
+            thread.join()
+
+        succeeded = login_statuses.count(200)
+        self.stdout.write('logins: {} ok, {} throttled, {:.1f}/s'.format(
+            succeeded, login_statuses.count(429), succeeded / options['duration']))
+        self.stdout.write(format_summary('/clients/ reads ({})'.format(len(read_timings)), read_timings))
+        self.stdout.write('hashing pool: {}'.format(login_hasher.stats()))
+        self.stdout.write('throttle: ip {}, username {}'.format(ip_limiter.stats(), username_limiter.stats()))
@@ -0,0 +1,18 @@
+# Generated by Django 2.1.3 on 2026-10-18 12:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('aemauthentication', '0002_auto_20181221_2324'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='token_version',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 2.1.3 on 2026-10-18 12:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    # Renamed from its generated name, databases that applied it under that
+    # name don't apply it again.
+    replaces = [
+        ('aemauthentication', '0005_auto_20261018_1256'),
+    ]
+
+    dependencies = [
+        ('aemauthentication', '0004_refreshtoken'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='user',
+            name='last_active',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
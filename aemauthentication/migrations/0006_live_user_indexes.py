@@ -0,0 +1,21 @@
+# Generated by Django 2.1.3 on 2026-10-18 13:09
+
+from django.db import migrations, models
+
+from core.indexes import add_partial_index
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('aemauthentication', '0005_user_last_active_nullable'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='user',
+            index=models.Index(fields=['company', 'is_active', 'is_deleted'], name='user_company_live_idx'),
+        ),
+        add_partial_index('user_company_live_part', 'aemauthentication_user', ['company_id'],
+                          {'is_active': True, 'is_deleted': False}),
+    ]
@@ -1,14 +1,18 @@
+import hashlib
+import hmac
+import secrets
 import uuid
 
 import jwt
 
-from datetime import datetime, timedelta
+from datetime import datetime
 
 from django.conf import settings
 from django.contrib.auth.models import (
     AbstractUser, BaseUserManager,
     Group)
 from django.db import models, transaction
+from django.utils import timezone
 
 
 class UserQuerySet(models.QuerySet):
@@ -38,11 +42,6 @@ class UserManager(BaseUserManager):
             if aem_group:
                 user.groups.add(aem_group)
 
-            if company:
-                user.company = company
-
-            user.save()
-
         return user
 
 
@@ -53,8 +52,8 @@ class User(AbstractUser):
     # Date the User info was last updated
     updated_at = models.DateTimeField(auto_now=True)
 
-    # Date the User last logged into the app
-    last_active = models.DateTimeField(auto_now=True)
+    # Date the User last made a request, written behind by `aemauthentication.activity`
+    last_active = models.DateTimeField(blank=True, null=True)
 
     # The company which this user is associated with.
     company = models.ForeignKey('company.Company', on_delete=models.CASCADE, null=True)
@@ -68,11 +67,19 @@ class User(AbstractUser):
 
     role = models.CharField(max_length=64, blank=True, null=True)
 
+    # Incremented to invalidate every token issued to this user so far.
+    token_version = models.PositiveIntegerField(default=0)
+
     USERNAME_FIELD = 'username'
     REQUIRED_FIELDS = ['email']
 
     objects = UserManager()
 
+    class Meta(AbstractUser.Meta):
+        indexes = [
+            models.Index(fields=['company', 'is_active', 'is_deleted'], name='user_company_live_idx'),
+        ]
+
     def __str__(self):
         return self.username
 
@@ -81,11 +88,112 @@ class User(AbstractUser):
         return self._generate_jwt_token()
 
     def _generate_jwt_token(self):
-        dt = datetime.now() + timedelta(days=60)
+        dt = datetime.now() + settings.ACCESS_TOKEN_LIFETIME
 
-        token = jwt.encode({
+        payload = {
             'id': self.pk,
+            'ver': self.token_version,
             'exp': int(dt.strftime('%s'))
-        }, settings.SECRET_KEY, algorithm='HS256')
+        }
+
+        if settings.AEM_STATELESS_AUTH:
+            payload.update(self._identity_claims())
+
+        token = jwt.encode(payload, settings.SECRET_KEY, algorithm='HS256')
 
         return token.decode('utf-8')
+
+    def _identity_claims(self):
+        """
+        The claims `JWTAuthentication` needs to rebuild this user without
+        touching the database when `AEM_STATELESS_AUTH` is enabled.
+        """
+        return {
+            'username': self.username,
+            'company': self.company_id,
+            'groups': list(self.groups.filter(aemgroup__isnull=False).values_list('aemgroup__slug_field', flat=True)),
+            'is_active': self.is_active,
+            'is_superuser': self.is_superuser,
+        }
+
+
+class RefreshTokenQuerySet(models.QuerySet):
+    def active(self):
+        return self.filter(revoked_at__isnull=True, expires_at__gt=timezone.now())
+
+
+class RefreshTokenManager(models.Manager):
+
+    def get_queryset(self):
+        return RefreshTokenQuerySet(self.model, using=self._db)
+
+    def issue(self, user):
+        """
+        Create a new refresh token for `user` and return its raw value, only a
+        keyed hash of it is stored.
+        """
+        raw_token = secrets.token_urlsafe(32)
+
+        self.create(
+            user=user,
+            token_hash=self.model.hash_token(raw_token),
+            expires_at=timezone.now() + settings.REFRESH_TOKEN_LIFETIME
+        )
+
+        return raw_token
+
+    def rotate(self, raw_token):
+        """
+        Exchange a refresh token for a new one, returning the user and the new
+        raw token. Each refresh token can only be used once; presenting one
+        that has already been used revokes all of the user's refresh tokens,
+        as it means the token has leaked.
+        """
+        now = timezone.now()
+        refresh_token = self.get(token_hash=self.model.hash_token(raw_token))
+
+        # Marking the token as used is conditional so that two concurrent
+        # refreshes with the same token can't both succeed.
+        revoked = self.filter(pk=refresh_token.pk, revoked_at__isnull=True, expires_at__gt=now) \
+            .update(revoked_at=now)
+
+        if not revoked:
+            if refresh_token.revoked_at is not None:
+                self.revoke_all(refresh_token.user_id)
+
+            raise self.model.DoesNotExist('Refresh token has expired or been revoked.')
+
+        user = User.objects.get(pk=refresh_token.user_id)
+
+        return user, self.issue(user)
+
+    def revoke(self, raw_token):
+        return self.filter(token_hash=self.model.hash_token(raw_token), revoked_at__isnull=True) \
+            .update(revoked_at=timezone.now())
+
+    def revoke_all(self, user_id):
+        return self.filter(user_id=user_id, revoked_at__isnull=True).update(revoked_at=timezone.now())
+
+
+class RefreshToken(models.Model):
+    # The User this token can issue access tokens for.
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='refresh_tokens')
+
+    # HMAC-SHA256 of the raw token, keyed with the SECRET_KEY.
+    token_hash = models.CharField(max_length=64, unique=True)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    expires_at = models.DateTimeField()
+
+    # Set once the token has been used or explicitly revoked.
+    revoked_at = models.DateTimeField(blank=True, null=True)
+
+    objects = RefreshTokenManager()
+
+    def __str__(self):
+        return '{} ({})'.format(self.user_id, self.created_at)
+
+    @staticmethod
+    def hash_token(raw_token):
+        return hmac.new(settings.SECRET_KEY.encode('utf-8'), raw_token.encode('utf-8'), hashlib.sha256).hexdigest()
@@ -0,0 +1,22 @@
+from django.conf import settings
+
+
+def can_create_user(identity, aem_group):
+    """
+    Whether the user behind `identity` may create an account in `aem_group`.
+
+    Returns `None` if they can, or the reason they can't.
+    """
+    if not identity.has_perm('groups.can_add_{}'.format(aem_group)):
+        return "Invalid permissions to create this account type."
+
+    if not identity.company:
+        request_user_is_staff = identity.is_superuser or identity.in_any_group(
+            settings.AEM_SUPER_USER_SLUG_FIELD,
+            settings.AEM_ADMIN_SLUG_FIELD,
+            settings.AEM_EMPLOYEE_SLUG_FIELD)
+
+        if not request_user_is_staff:
+            return "Invalid account type, user doesn't belong to a company but is not an AEM Staff account."
+
+    return None
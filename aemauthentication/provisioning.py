@@ -0,0 +1,185 @@
+import concurrent.futures
+import json
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.db import IntegrityError, transaction
+
+from company import counters
+from core.utils import chunked
+from groups.models import AemGroup
+from .cache import permission_cache, user_cache
+from .hashing import provisioning_hasher
+from .models import User
+from .permissions import can_create_user
+from .serializers import BulkUserSerializer
+from .tokens import forget_token_version
+
+
+def render_report(results):
+    """
+    The JSON report of `results`, written out as each result arrives so that
+    nothing grows with the size of the upload. The totals come last.
+    """
+    created = 0
+    failed = 0
+
+    yield '{"results":['
+
+    for index, result in enumerate(results):
+        if result['status'] == 'created':
+            created += 1
+        else:
+            failed += 1
+
+        yield ('' if index == 0 else ',') + json.dumps(result, ensure_ascii=False, separators=(',', ':'))
+
+    yield '],"created":{},"failed":{}}}'.format(created, failed)
+
+
+def provision_users(identity, rows, batch_size=None):
+    """
+    Create users in bulk for the company of `identity`.
+
+    `rows` is an iterable of `(line_number, row)` pairs, as produced by the
+    parsers in `core.parsers`. Rows are validated and inserted a batch at a
+    time, passwords are hashed on `provisioning_hasher`, and a result is
+    yielded for every row in the order they were given.
+    """
+    batch_size = batch_size or settings.BULK_BATCH_SIZE
+    groups = dict(AemGroup.objects.values_list('slug_field', 'linked_group_id'))
+
+    for batch in chunked(rows, batch_size):
+        yield from _provision_batch(identity, batch, groups)
+
+
+def _provision_batch(identity, batch, groups):
+    results = {}
+    valid = []
+    usernames = set()
+
+    for line_number, row in batch:
+        if isinstance(row, Exception):
+            results[line_number] = _error(line_number, {'error': [str(row)]})
+            continue
+
+        serializer = BulkUserSerializer(data=row)
+
+        if not serializer.is_valid():
+            results[line_number] = _error(line_number, serializer.errors)
+            continue
+
+        data = serializer.validated_data
+
+        if data['aem_group'] not in groups:
+            message = 'Object with aemgroup__slug_field={} does not exist.'.format(data['aem_group'])
+            results[line_number] = _error(line_number, {'aem_group': [message]})
+            continue
+
+        message = can_create_user(identity, data['aem_group'])
+        if message:
+            results[line_number] = _error(line_number, {'aem_group': [message]})
+            continue
+
+        if data['username'] in usernames:
+            results[line_number] = _error(line_number, {'username': ['Duplicate username in this upload.']})
+            continue
+
+        usernames.add(data['username'])
+        valid.append((line_number, data))
+
+    existing = set(User._base_manager.filter(username__in=usernames).values_list('username', flat=True))
+
+    for line_number, data in valid:
+        if data['username'] in existing:
+            results[line_number] = _error(line_number, {'username': ['A user with that username already exists.']})
+
+    valid = [(line_number, data) for line_number, data in valid if data['username'] not in existing]
+
+    if valid:
+        try:
+            passwords = provisioning_hasher.map(make_password, [data['password'] for _, data in valid])
+        except concurrent.futures.TimeoutError:
+            for line_number, _ in valid:
+                results[line_number] = _error(line_number, {'password': ['Timed out hashing the password.']})
+
+            valid = []
+            passwords = []
+
+        users = [
+            User(
+                username=data['username'],
+                email=User.objects.normalize_email(data['email']),
+                password=password,
+                company=identity.company,
+                first_name=data.get('first_name'),
+                last_name=data.get('last_name'),
+                role=data.get('role')
+            )
+            for (_, data), password in zip(valid, passwords)
+        ]
+        rows = [(line_number, data, user) for (line_number, data), user in zip(valid, users)]
+
+        try:
+            user_ids = _insert_users(rows, groups)
+        except IntegrityError:
+            # A username was taken since it was checked, insert row by row to
+            # find out which.
+            user_ids = {}
+
+            for row in rows:
+                try:
+                    user_ids.update(_insert_users([row], groups))
+                except IntegrityError:
+                    results[row[0]] = _error(row[0], {'username': ['A user with that username already exists.']})
+
+        if user_ids:
+            # `bulk_create` sends no signals, so do what the handlers would
+            # have done for a new user.
+            counters.adjust(identity.company_id, user_count=len(user_ids))
+
+            new_ids = list(user_ids.values())
+            user_cache.invalidate(*new_ids)
+            forget_token_version(*new_ids)
+            permission_cache.invalidate_user_groups(*new_ids)
+            permission_cache.invalidate_user_permissions(*new_ids)
+
+        for line_number, data in valid:
+            if data['username'] in user_ids:
+                results[line_number] = {
+                    'line': line_number,
+                    'status': 'created',
+                    'id': user_ids[data['username']],
+                    'username': data['username'],
+                }
+
+    for line_number, _ in batch:
+        yield results[line_number]
+
+
+def _insert_users(rows, groups):
+    """
+    Insert the users of `rows` and their group memberships together, returning
+    their ids by username.
+    """
+    with transaction.atomic():
+        User.objects.bulk_create([user for _, _, user in rows])
+
+        # SQLite doesn't hand back the new primary keys from a bulk insert.
+        user_ids = dict(User._base_manager.filter(username__in=[user.username for _, _, user in rows])
+                        .values_list('username', 'id'))
+
+        User.groups.through.objects.bulk_create([
+            User.groups.through(user_id=user_ids[data['username']], group_id=groups[data['aem_group']])
+            for _, data, _ in rows
+        ])
+
+    return user_ids
+
+
+def _error(line_number, errors):
+    return {
+        'line': line_number,
+        'status': 'error',
+        'errors': errors,
+    }
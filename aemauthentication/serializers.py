@@ -1,12 +1,14 @@
 import uuid
 
 from rest_framework import serializers
-from django.contrib.auth import authenticate
 
 from company.models import Company
 from company.serializers import CompanySerializer
 from groups.models import AemGroup
-from .models import User
+from .activity import activity_tracker
+from .hashing import login_hasher
+from .models import RefreshToken, User
+from .throttling import record_failed_login
 from django.contrib.auth.models import Group
 
 
@@ -39,33 +41,84 @@ class LoginSerializer(serializers.ModelSerializer):
     company_id = serializers.CharField(max_length=255, write_only=True, required=False)
 
     token = serializers.CharField(max_length=255, read_only=True)
+    refresh_token = serializers.CharField(max_length=255, read_only=True)
 
     company_name = serializers.CharField(max_length=255, read_only=True)
     company_pk = serializers.IntegerField(read_only=True)
 
     class Meta:
         model = User
-        fields = ['username', 'password', 'company_id', 'token', 'first_name', 'last_name', 'role', 'company_name',
-                  'company_pk']
+        fields = ['username', 'password', 'company_id', 'token', 'refresh_token', 'first_name', 'last_name', 'role',
+                  'company_name', 'company_pk']
 
     def validate(self, data):
-        user = authenticate(username=data.get('username', None), password=data.get('password', None))
+        user = login_hasher.authenticate(username=data.get('username', None), password=data.get('password', None),
+                                         request=self.context.get('request'))
 
         if user is None:
+            record_failed_login(data.get('username', None))
             raise serializers.ValidationError(
                 'A user with this email and password was not found.'
             )
 
+        activity_tracker.touch(user.pk)
+
         if user.company is None:
             return {
-                'token': user.token
+                'token': user.token,
+                'refresh_token': RefreshToken.objects.issue(user)
             }
         else:
             return {
                 'token': user.token,
+                'refresh_token': RefreshToken.objects.issue(user),
                 'company_name': user.company.name,
                 'company_pk': user.company.pk,
                 'first_name': user.first_name,
                 'last_name': user.last_name,
                 'role': user.role
             }
+
+
+class RefreshTokenSerializer(serializers.Serializer):
+    """
+    Exchanges a refresh token for a new access token and refresh token.
+    """
+    refresh_token = serializers.CharField(max_length=255)
+
+    token = serializers.CharField(max_length=255, read_only=True)
+
+    def validate(self, data):
+        try:
+            user, refresh_token = RefreshToken.objects.rotate(data['refresh_token'])
+        except (RefreshToken.DoesNotExist, User.DoesNotExist):
+            raise serializers.ValidationError(
+                'This refresh token is invalid or has expired.'
+            )
+
+        return {
+            'token': user.token,
+            'refresh_token': refresh_token
+        }
+
+
+class RevokeTokenSerializer(serializers.Serializer):
+    refresh_token = serializers.CharField(max_length=255, write_only=True)
+
+    def save(self):
+        RefreshToken.objects.revoke(self.validated_data['refresh_token'])
+
+
+class BulkUserSerializer(serializers.Serializer):
+    """
+    Validates a single row of a bulk user upload. Anything that needs the
+    database is checked for the whole batch at once by
+    `aemauthentication.provisioning`.
+    """
+    username = serializers.CharField(max_length=150)
+    email = serializers.EmailField()
+    password = serializers.CharField(max_length=128)
+    aem_group = serializers.SlugField()
+    first_name = serializers.CharField(max_length=64, required=False, allow_blank=True, allow_null=True)
+    last_name = serializers.CharField(max_length=64, required=False, allow_blank=True, allow_null=True)
+    role = serializers.CharField(max_length=64, required=False, allow_blank=True, allow_null=True)
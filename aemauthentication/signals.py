@@ -0,0 +1,116 @@
+from django.conf import settings
+from django.contrib.auth.models import Group
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+
+from .cache import permission_cache, user_cache
+from .models import User
+from .tokens import forget_token_version, revoke_tokens
+
+
+def _revoke_instance_tokens(user):
+    revoke_tokens(user.pk)
+
+    # Keep the in-memory instance in step with the row so that saving it again
+    # doesn't write the old version back.
+    user.token_version += 1
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_cached_user(sender, instance, **kwargs):
+    user_cache.invalidate(instance.pk)
+
+
+@receiver(post_save, sender=User)
+def revoke_deactivated_user_tokens(sender, instance, created, **kwargs):
+    if created:
+        # Primary keys can be reused, never trust a version cached for one.
+        forget_token_version(instance.pk)
+    elif not instance.is_active or instance.is_deleted:
+        _revoke_instance_tokens(instance)
+
+
+@receiver(m2m_changed, sender=User.groups.through)
+@receiver(m2m_changed, sender=User.user_permissions.through)
+def invalidate_cached_user_memberships(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+
+    if not reverse:
+        user_cache.invalidate(instance.pk)
+    elif pk_set:
+        user_cache.invalidate(*pk_set)
+    else:
+        # A group or permission was cleared of all of its users, we don't know
+        # who they were so drop everything.
+        user_cache.clear()
+
+
+@receiver(m2m_changed, sender=User.groups.through)
+def revoke_tokens_on_role_change(sender, instance, action, reverse, pk_set, **kwargs):
+    # Only stateless tokens carry the user's groups, stateful ones are always
+    # checked against the database.
+    if not settings.AEM_STATELESS_AUTH:
+        return
+
+    if not reverse:
+        if action in ('post_add', 'post_remove', 'post_clear'):
+            _revoke_instance_tokens(instance)
+    elif action in ('post_add', 'post_remove'):
+        revoke_tokens(*pk_set)
+    elif action == 'pre_clear':
+        revoke_tokens(*instance.user_set.values_list('pk', flat=True))
+
+
+@receiver(m2m_changed, sender=Group.permissions.through)
+def invalidate_cached_group_permissions(sender, instance, action, reverse, pk_set, **kwargs):
+    if not reverse:
+        if action in ('post_add', 'post_remove', 'post_clear'):
+            permission_cache.invalidate_groups(instance.pk)
+    elif action in ('post_add', 'post_remove'):
+        permission_cache.invalidate_groups(*pk_set)
+    elif action == 'pre_clear':
+        permission_cache.invalidate_groups(*instance.group_set.values_list('pk', flat=True))
+
+
+@receiver(m2m_changed, sender=User.groups.through)
+def invalidate_cached_user_groups(sender, instance, action, reverse, pk_set, **kwargs):
+    if not reverse:
+        if action in ('post_add', 'post_remove', 'post_clear'):
+            permission_cache.invalidate_user_groups(instance.pk)
+    elif action in ('post_add', 'post_remove'):
+        permission_cache.invalidate_user_groups(*pk_set)
+    elif action == 'pre_clear':
+        permission_cache.invalidate_user_groups(*instance.user_set.values_list('pk', flat=True))
+
+
+@receiver(m2m_changed, sender=User.user_permissions.through)
+def invalidate_cached_user_permissions(sender, instance, action, reverse, pk_set, **kwargs):
+    if not reverse:
+        if action in ('post_add', 'post_remove', 'post_clear'):
+            permission_cache.invalidate_user_permissions(instance.pk)
+    elif action in ('post_add', 'post_remove'):
+        permission_cache.invalidate_user_permissions(*pk_set)
+    elif action == 'pre_clear':
+        permission_cache.invalidate_user_permissions(*instance.user_set.values_list('pk', flat=True))
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def invalidate_cached_group(sender, instance, **kwargs):
+    permission_cache.invalidate_groups(instance.pk)
+
+
+@receiver(post_save, sender=User)
+def forget_new_user_permissions(sender, instance, created, **kwargs):
+    # Primary keys can be reused, so a new user must not inherit anything
+    # cached for a deleted one.
+    if created:
+        forget_user_permissions(sender, instance)
+
+
+@receiver(post_delete, sender=User)
+def forget_user_permissions(sender, instance, **kwargs):
+    permission_cache.invalidate_user_groups(instance.pk)
+    permission_cache.invalidate_user_permissions(instance.pk)
@@ -1,16 +1,35 @@
+import concurrent.futures
+import json
+import threading
+import time
 import uuid
+from unittest import mock
 
+import jwt
+
+from django.contrib.auth.hashers import make_password
 from django.contrib.auth.models import Group, Permission
+from django.contrib.auth.signals import user_login_failed
 from django.contrib.contenttypes.models import ContentType
-from django.db import transaction
-from django.test import TestCase, Client
+from django.db import connection, transaction
+from django.test import TestCase, Client, override_settings
+from django.test.utils import CaptureQueriesContext
 from rest_framework import status
+from rest_framework.exceptions import AuthenticationFailed, Throttled
 from rest_framework.reverse import reverse
-from rest_framework.test import APIRequestFactory, force_authenticate, APITestCase
+from rest_framework.test import APIRequestFactory, force_authenticate, APITestCase, APITransactionTestCase
 from django.conf import settings
+from aemauthentication.activity import ActivityTracker, activity_tracker
+from aemauthentication.backends import JWTAuthentication
+from aemauthentication.cache import user_cache
 from aemauthentication.factories import GroupsFactory, AemGroupFactory, UserFactory
+from aemauthentication.hashing import HashingTimedOut, PasswordHasherPool, login_hasher, provisioning_hasher
+from aemauthentication.identity import get_identity
 from aemauthentication.models import User
+from aemauthentication.throttling import TokenBucketLimiter, ip_limiter, username_limiter
+from aemauthentication.tokens import revoke_tokens
 from aemauthentication.views import CreateUserAPIView
+from clients.factories import ClientFactory
 from company.factories import CompanyFactory
 from groups.models import AemGroup
 
@@ -27,61 +46,17 @@ class CreateUserTestCase(APITestCase):
     }
 
     def setUp(self):
-        self.aem_admin = UserFactory.create(group=AemGroupFactory.create(
-            slug_field=settings.AEM_ADMIN_SLUG_FIELD,
-            linked_group__name=settings.AEM_ADMIN_LINKED_GROUP_NAME,
-            can_add_permission_slugs=settings.AEM_ADMIN_CAN_ADD_USER_PERMISSIONS,
-            client_permissions=settings.AEM_ADMIN_CLIENT_PERMISSIONS,
-            customer_permissions=settings.AEM_ADMIN_CUSTOMER_PERMISSIONS,
-            company_permissions=settings.AEM_ADMIN_COMPANY_PERMISSIONS
-        ))
+        self.aem_admin = UserFactory.create(group=AemGroupFactory.for_role('AEM_ADMIN'))
 
-        self.aem_employee = UserFactory.create(group=AemGroupFactory.create(
-            slug_field=settings.AEM_EMPLOYEE_SLUG_FIELD,
-            linked_group__name=settings.AEM_EMPLOYEE_LINKED_GROUP_NAME,
-            can_add_permission_slugs=settings.AEM_EMPLOYEE_CAN_ADD_USER_PERMISSIONS,
-            client_permissions=settings.AEM_EMPLOYEE_CLIENT_PERMISSIONS,
-            customer_permissions=settings.AEM_EMPLOYEE_CUSTOMER_PERMISSIONS,
-            company_permissions=settings.AEM_EMPLOYEE_COMPANY_PERMISSIONS
-        ))
+        self.aem_employee = UserFactory.create(group=AemGroupFactory.for_role('AEM_EMPLOYEE'))
 
         client_company = CompanyFactory.create()
 
-        self.aem_customer_super_user = UserFactory.create(
-            company=client_company,
-            group=AemGroupFactory.create(
-                slug_field=settings.AEM_CUSTOMER_SUPER_USER_SLUG_FIELD,
-                linked_group__name=settings.AEM_CUSTOMER_SUPER_USER_LINKED_GROUP_NAME,
-                can_add_permission_slugs=settings.AEM_CUSTOMER_SUPER_USER_CAN_ADD_USER_PERMISSIONS,
-                client_permissions=settings.AEM_CUSTOMER_SUPER_USER_CLIENT_PERMISSIONS,
-                customer_permissions=settings.AEM_CUSTOMER_SUPER_USER_CUSTOMER_PERMISSIONS,
-                company_permissions=settings.AEM_CUSTOMER_SUPER_USER_COMPANY_PERMISSIONS
-            )
-        )
+        self.aem_customer_super_user = UserFactory.create(company=client_company, group=AemGroupFactory.for_role('AEM_CUSTOMER_SUPER_USER'))
 
-        self.aem_customer_admin = UserFactory.create(
-            company=client_company,
-            group=AemGroupFactory.create(
-                slug_field=settings.AEM_CUSTOMER_ADMIN_SLUG_FIELD,
-                linked_group__name=settings.AEM_CUSTOMER_ADMIN_LINKED_GROUP_NAME,
-                can_add_permission_slugs=settings.AEM_CUSTOMER_ADMIN_CAN_ADD_USER_PERMISSIONS,
-                client_permissions=settings.AEM_CUSTOMER_ADMIN_CLIENT_PERMISSIONS,
-                customer_permissions=settings.AEM_CUSTOMER_ADMIN_CUSTOMER_PERMISSIONS,
-                company_permissions=settings.AEM_CUSTOMER_ADMIN_COMPANY_PERMISSIONS
-            )
-        )
+        self.aem_customer_admin = UserFactory.create(company=client_company, group=AemGroupFactory.for_role('AEM_CUSTOMER_ADMIN'))
 
-        self.aem_customer_user = UserFactory.create(
-            company=client_company,
-            group=AemGroupFactory.create(
-                slug_field=settings.AEM_CUSTOMER_USER_SLUG_FIELD,
-                linked_group__name=settings.AEM_CUSTOMER_USER_LINKED_GROUP_NAME,
-                can_add_permission_slugs=settings.AEM_CUSTOMER_USER_CAN_ADD_USER_PERMISSIONS,
-                client_permissions=settings.AEM_CUSTOMER_USER_CLIENT_PERMISSIONS,
-                customer_permissions=settings.AEM_CUSTOMER_USER_CUSTOMER_PERMISSIONS,
-                company_permissions=settings.AEM_CUSTOMER_USER_COMPANY_PERMISSIONS
-            )
-        )
+        self.aem_customer_user = UserFactory.create(company=client_company, group=AemGroupFactory.for_role('AEM_CUSTOMER_USER'))
 
     def _test_create_user_view_permissions(self, user, data, expected_status_code, response_keys=None):
         self.client.force_authenticate(user=user)
@@ -336,3 +311,660 @@ class CreateUserTestCase(APITestCase):
                                                 data=self.valid_add_user_request,
                                                 expected_status_code=status.HTTP_403_FORBIDDEN,
                                                 response_keys=('detail',))
+
+
+class JWTAuthenticationTestCase(APITestCase):
+
+    def setUp(self):
+        user_cache.clear()
+        activity_tracker.flush()
+        self.user = UserFactory.create(company=CompanyFactory.create())
+
+    def _authenticate(self, user, prefix='Token'):
+        request = APIRequestFactory().get('/', HTTP_AUTHORIZATION='{} {}'.format(prefix, user.token))
+        return JWTAuthentication().authenticate(request)
+
+    def test_bearer_and_token_prefixes_are_accepted(self):
+        for prefix in ('Bearer', 'Token'):
+            authenticated_user, _ = self._authenticate(self.user, prefix=prefix)
+            self.assertEqual(authenticated_user.pk, self.user.pk)
+
+    def test_unknown_prefix_is_ignored(self):
+        self.assertIsNone(self._authenticate(self.user, prefix='Basic'))
+
+    def test_token_is_only_decoded_once_per_request(self):
+        request = APIRequestFactory().get('/', HTTP_AUTHORIZATION='Token {}'.format(self.user.token))
+
+        with mock.patch('aemauthentication.backends.jwt.decode', wraps=jwt.decode) as decode:
+            JWTAuthentication().authenticate(request)
+            JWTAuthentication().authenticate(request)
+
+        self.assertEqual(decode.call_count, 1)
+
+    def test_user_is_cached_between_requests(self):
+        self._authenticate(self.user)
+
+        with self.assertNumQueries(0):
+            authenticated_user, _ = self._authenticate(self.user)
+
+        self.assertEqual(authenticated_user.pk, self.user.pk)
+        self.assertEqual(user_cache.stats()['hits'], 1)
+        self.assertEqual(user_cache.stats()['misses'], 1)
+
+    def test_requests_dont_share_cached_user_instances(self):
+        first, _ = self._authenticate(self.user)
+        first.first_name = 'Changed'
+        first._group_perm_cache = {'clients.add_client'}
+
+        second, _ = self._authenticate(self.user)
+        third, _ = self._authenticate(self.user)
+
+        self.assertIsNot(second, third)
+        self.assertEqual(second.first_name, self.user.first_name)
+        self.assertFalse(hasattr(second, '_group_perm_cache'))
+        self.assertEqual(user_cache.stats()['hits'], 2)
+
+    def test_deactivated_user_is_rejected_immediately(self):
+        self._authenticate(self.user)
+
+        self.user.is_active = False
+        self.user.save()
+
+        with self.assertRaises(AuthenticationFailed):
+            self._authenticate(self.user)
+
+    def test_deleted_user_is_rejected_immediately(self):
+        self._authenticate(self.user)
+
+        self.user.is_deleted = True
+        self.user.save()
+
+        with self.assertRaises(AuthenticationFailed):
+            self._authenticate(self.user)
+
+    def test_group_membership_change_evicts_cached_user(self):
+        self._authenticate(self.user)
+
+        self.user.groups.add(GroupsFactory.create(name='New Group'))
+        self._authenticate(self.user)
+
+        self.assertEqual(user_cache.stats()['misses'], 2)
+
+    def test_revoked_token_is_rejected(self):
+        token = self.user.token
+        revoke_tokens(self.user.pk)
+
+        request = APIRequestFactory().get('/', HTTP_AUTHORIZATION='Token {}'.format(token))
+        with self.assertRaises(AuthenticationFailed):
+            JWTAuthentication().authenticate(request)
+
+        self.user.refresh_from_db()
+        authenticated_user, _ = self._authenticate(self.user)
+        self.assertEqual(authenticated_user.pk, self.user.pk)
+
+
+@override_settings(AEM_STATELESS_AUTH=True)
+class StatelessJWTAuthenticationTestCase(APITestCase):
+
+    def setUp(self):
+        activity_tracker.flush()
+        self.company = CompanyFactory.create()
+        self.user = UserFactory.create(company=self.company, group=AemGroupFactory.create(
+            slug_field=settings.AEM_CUSTOMER_ADMIN_SLUG_FIELD,
+            linked_group__name=settings.AEM_CUSTOMER_ADMIN_LINKED_GROUP_NAME,
+        ))
+
+    def _authenticate(self, token):
+        request = APIRequestFactory().get('/', HTTP_AUTHORIZATION='Token {}'.format(token))
+        return JWTAuthentication().authenticate(request)
+
+    def test_user_is_built_from_claims_without_queries(self):
+        token = self.user.token
+        self._authenticate(token)
+
+        with CaptureQueriesContext(connection) as queries:
+            authenticated_user, _ = self._authenticate(token)
+
+        # Only the shared cache is read, which in production isn't the database.
+        self.assertEqual([query['sql'] for query in queries if 'aem_cache' not in query['sql']], [])
+
+        self.assertEqual(authenticated_user.pk, self.user.pk)
+        self.assertEqual(authenticated_user.company_id, self.company.pk)
+        self.assertEqual(authenticated_user.aem_group_slugs, {settings.AEM_CUSTOMER_ADMIN_SLUG_FIELD})
+
+    def test_requests_load_no_identity_from_the_database(self):
+        ClientFactory.create(company=self.company)
+        self.user.groups.first().permissions.add(Permission.objects.get(codename='view_client'))
+        headers = {'HTTP_AUTHORIZATION': 'Token {}'.format(self.user.token)}
+
+        self.assertEqual(self.client.get(reverse('client-duplicates'), **headers).status_code, status.HTTP_200_OK)
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('client-duplicates'), **headers)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK, response.content)
+        identity_tables = ('"aemauthentication_user', '"auth_', '"company_company"', '"groups_aemgroup"')
+        self.assertEqual([query['sql'] for query in queries
+                          if 'silk_' not in query['sql'] and any(table in query['sql'] for table in identity_tables)],
+                         [])
+
+    def test_deactivation_invalidates_old_tokens(self):
+        token = self.user.token
+
+        self.user.is_active = False
+        self.user.save()
+
+        with self.assertRaises(AuthenticationFailed):
+            self._authenticate(token)
+
+    def test_role_change_invalidates_old_tokens(self):
+        token = self.user.token
+
+        self.user.groups.clear()
+
+        with self.assertRaises(AuthenticationFailed):
+            self._authenticate(token)
+
+        authenticated_user, _ = self._authenticate(self.user.token)
+        self.assertEqual(authenticated_user.aem_group_slugs, frozenset())
+
+
+class LoginTestCase(APITransactionTestCase):
+    # Logins are checked on the hashing pool's threads, which use their own
+    # database connections and so only see committed rows.
+
+    def setUp(self):
+        ip_limiter.reset()
+        username_limiter.reset()
+
+        self.user = UserFactory.create(company=CompanyFactory.create())
+        self.user.set_password('Password01')
+        self.user.save()
+
+    def _login(self, username, password):
+        return self.client.post(reverse('login'), {'username': username, 'password': password}, format='json')
+
+    def test_valid_credentials_return_token(self):
+        completed = login_hasher.stats()['completed']
+
+        response = self._login(self.user.username, 'Password01')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK, response.content)
+        self.assertIsNotNone(response.json()['token'])
+        self.assertEqual(login_hasher.stats()['completed'], completed + 1)
+
+    def test_invalid_password_is_rejected(self):
+        response = self._login(self.user.username, 'WrongPassword')
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST, response.content)
+
+    def test_unknown_user_is_rejected(self):
+        response = self._login('unknown', 'Password01')
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST, response.content)
+
+    def test_logins_beyond_the_queue_are_throttled(self):
+        pool = PasswordHasherPool(max_workers=1, max_queue=0, timeout=5)
+        started, release = threading.Event(), threading.Event()
+
+        def block():
+            started.set()
+            release.wait(5)
+
+        worker = threading.Thread(target=pool.run, args=(block,))
+        worker.start()
+        started.wait(5)
+
+        try:
+            with self.assertRaises(Throttled):
+                pool.run(make_password, 'Password01')
+        finally:
+            release.set()
+            worker.join()
+
+        self.assertEqual(pool.stats()['rejected'], 1)
+        self.assertEqual(pool.stats()['completed'], 1)
+
+    def test_slow_hash_is_reported_as_unavailable(self):
+        pool = PasswordHasherPool(max_workers=1, max_queue=0, timeout=0.01)
+        release = threading.Event()
+
+        try:
+            with self.assertRaises(HashingTimedOut):
+                pool.run(release.wait, 5)
+        finally:
+            release.set()
+
+        self.assertEqual(pool.stats()['timed_out'], 1)
+
+    def test_timed_out_bulk_work_leaves_the_queue(self):
+        pool = PasswordHasherPool(max_workers=1, max_queue=0, timeout=0.05)
+        release = threading.Event()
+
+        with self.assertRaises(concurrent.futures.TimeoutError):
+            pool.map(lambda item: release.wait(5), range(3))
+
+        release.set()
+        pool._executor.shutdown(wait=True)
+
+        self.assertEqual(pool.stats()['queued'], 0)
+        self.assertEqual(pool.stats()['running'], 0)
+        self.assertEqual(pool.stats()['timed_out'], 1)
+
+    def test_failed_login_is_signalled(self):
+        failures = []
+
+        def receiver(sender, credentials, **kwargs):
+            failures.append(credentials['username'])
+
+        user_login_failed.connect(receiver)
+
+        try:
+            response = self._login(self.user.username, 'WrongPassword')
+        finally:
+            user_login_failed.disconnect(receiver)
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST, response.content)
+        self.assertEqual(failures, [self.user.username])
+
+    def test_login_with_slow_hash_returns_503(self):
+        with mock.patch.object(login_hasher, 'timeout', 0.01), \
+                mock.patch('aemauthentication.hashing.authenticate', side_effect=lambda *args, **kwargs: time.sleep(0.2)):
+            response = self._login(self.user.username, 'Password01')
+
+        self.assertEqual(response.status_code, status.HTTP_503_SERVICE_UNAVAILABLE, response.content)
+
+    def test_logins_over_the_username_budget_are_rejected_before_hashing(self):
+        for _ in range(settings.LOGIN_THROTTLE_USERNAME_BURST):
+            self._login(self.user.username, 'WrongPassword')
+
+        completed = login_hasher.stats()['completed']
+        rejected = username_limiter.stats()['rejected']
+
+        response = self._login(self.user.username.upper(), 'Password01')
+
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS, response.content)
+        self.assertGreater(int(response['Retry-After']), 0)
+        self.assertEqual(login_hasher.stats()['completed'], completed)
+        self.assertEqual(username_limiter.stats()['rejected'], rejected + 1)
+
+        # Other usernames still have their own budget.
+        response = self._login('unknown', 'Password01')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST, response.content)
+
+    def test_successful_logins_dont_spend_the_username_budget(self):
+        for _ in range(settings.LOGIN_THROTTLE_USERNAME_BURST + 1):
+            response = self._login(self.user.username, 'Password01')
+            self.assertEqual(response.status_code, status.HTTP_200_OK, response.content)
+
+        for _ in range(settings.LOGIN_THROTTLE_USERNAME_BURST):
+            response = self._login(self.user.username, 'WrongPassword')
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST, response.content)
+
+        response = self._login(self.user.username, 'Password01')
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS, response.content)
+
+    def test_token_bucket_check_leaves_the_bucket_alone(self):
+        limiter = TokenBucketLimiter(burst=1, per_minute=60)
+
+        with mock.patch('aemauthentication.throttling.time.monotonic', return_value=100.0):
+            self.assertEqual(limiter.check('key'), 0)
+            self.assertEqual(limiter.take('key'), 0)
+            self.assertAlmostEqual(limiter.check('key'), 1.0)
+
+    def test_token_bucket_refills_over_time(self):
+        limiter = TokenBucketLimiter(burst=2, per_minute=60)
+
+        with mock.patch('aemauthentication.throttling.time.monotonic', return_value=100.0):
+            self.assertEqual(limiter.take('key'), 0)
+            self.assertEqual(limiter.take('key'), 0)
+            self.assertAlmostEqual(limiter.take('key'), 1.0)
+
+        with mock.patch('aemauthentication.throttling.time.monotonic', return_value=101.0):
+            self.assertEqual(limiter.take('key'), 0)
+
+        self.assertEqual(limiter.stats(), {'buckets': 1, 'allowed': 3, 'rejected': 1})
+
+    def test_token_bucket_can_be_shared_through_the_cache(self):
+        first = TokenBucketLimiter(burst=1, per_minute=1, shared=True, prefix='test-{}'.format(uuid.uuid4()))
+        second = TokenBucketLimiter(burst=1, per_minute=1, shared=True, prefix=first.prefix)
+
+        self.assertEqual(first.take('key'), 0)
+        self.assertGreater(second.take('key'), 0)
+
+        self.assertEqual(first.stats(), {'allowed': 1, 'rejected': 0})
+        self.assertEqual(second.stats(), {'allowed': 0, 'rejected': 1})
+
+
+class RefreshTokenTestCase(APITransactionTestCase):
+    # Logins are checked on the hashing pool's threads, which use their own
+    # database connections and so only see committed rows.
+
+    def setUp(self):
+        ip_limiter.reset()
+        username_limiter.reset()
+
+        self.user = UserFactory.create(company=CompanyFactory.create())
+        self.user.set_password('Password01')
+        self.user.save()
+
+        response = self.client.post(reverse('login'), {'username': self.user.username, 'password': 'Password01'},
+                                    format='json')
+        self.refresh_token = response.json()['refresh_token']
+
+    def _refresh(self, refresh_token):
+        return self.client.post(reverse('refresh-token'), {'refresh_token': refresh_token}, format='json')
+
+    def test_refresh_issues_new_tokens_without_hashing(self):
+        completed = login_hasher.stats()['completed']
+
+        response = self._refresh(self.refresh_token)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK, response.content)
+        self.assertIsNotNone(response.json()['token'])
+        self.assertNotEqual(response.json()['refresh_token'], self.refresh_token)
+        self.assertEqual(login_hasher.stats()['completed'], completed)
+
+    def test_refresh_token_can_only_be_used_once(self):
+        rotated_token = self._refresh(self.refresh_token).json()['refresh_token']
+
+        response = self._refresh(self.refresh_token)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST, response.content)
+
+        # Reusing a rotated token revokes the tokens issued from it too.
+        response = self._refresh(rotated_token)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST, response.content)
+
+    def test_revoked_refresh_token_is_rejected(self):
+        response = self.client.post(reverse('revoke-token'), {'refresh_token': self.refresh_token}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT, response.content)
+
+        response = self._refresh(self.refresh_token)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST, response.content)
+
+    def test_deactivated_user_cant_refresh(self):
+        self.user.is_active = False
+        self.user.save()
+
+        response = self._refresh(self.refresh_token)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST, response.content)
+
+
+class CachedPermissionBackendTestCase(APITestCase):
+
+    def setUp(self):
+        self.aem_group = AemGroupFactory.create(
+            slug_field=settings.AEM_CUSTOMER_ADMIN_SLUG_FIELD,
+            linked_group__name=settings.AEM_CUSTOMER_ADMIN_LINKED_GROUP_NAME,
+            client_permissions=settings.AEM_CUSTOMER_ADMIN_CLIENT_PERMISSIONS,
+        )
+        self.user = UserFactory.create(company=CompanyFactory.create(), group=self.aem_group)
+
+    def _fresh_user(self):
+        return User.objects.get(pk=self.user.pk)
+
+    def test_group_permissions_are_shared_across_requests(self):
+        self.assertTrue(self._fresh_user().has_perm(settings.ADD_CLIENT_PERMISSION))
+
+        user = self._fresh_user()
+        with CaptureQueriesContext(connection) as queries:
+            self.assertTrue(user.has_perm(settings.ADD_CLIENT_PERMISSION))
+            self.assertFalse(user.has_perm(settings.ADD_COMPANY_PERMISSION))
+
+        self.assertEqual([query['sql'] for query in queries if 'aem_cache' not in query['sql']], [])
+
+    def test_removing_group_permission_takes_effect(self):
+        self.assertTrue(self._fresh_user().has_perm(settings.ADD_CLIENT_PERMISSION))
+
+        self.aem_group.linked_group.permissions.clear()
+
+        self.assertFalse(self._fresh_user().has_perm(settings.ADD_CLIENT_PERMISSION))
+
+    def test_cached_users_pick_up_group_permission_changes(self):
+        # As in a worker that didn't see the change, the cached user isn't evicted.
+        user_cache.clear()
+        user_cache.get(self.user.pk, lambda pk: User.objects.get(pk=pk))
+
+        self.assertTrue(user_cache.get(self.user.pk, None).has_perm(settings.ADD_CLIENT_PERMISSION))
+
+        self.aem_group.linked_group.permissions.clear()
+
+        self.assertFalse(user_cache.get(self.user.pk, None).has_perm(settings.ADD_CLIENT_PERMISSION))
+        self.assertEqual(user_cache.stats()['hits'], 2)
+
+    def test_leaving_group_takes_effect(self):
+        self.assertTrue(self._fresh_user().has_perm(settings.ADD_CLIENT_PERMISSION))
+
+        self.aem_group.linked_group.user_set.remove(self.user)
+
+        self.assertFalse(self._fresh_user().has_perm(settings.ADD_CLIENT_PERMISSION))
+
+
+class IdentityTestCase(APITestCase):
+
+    def setUp(self):
+        self.company = CompanyFactory.create()
+        self.user = UserFactory.create(company=self.company, group=AemGroupFactory.create(
+            slug_field=settings.AEM_CUSTOMER_SUPER_USER_SLUG_FIELD,
+            linked_group__name=settings.AEM_CUSTOMER_SUPER_USER_LINKED_GROUP_NAME,
+            can_add_permission_slugs=settings.AEM_CUSTOMER_SUPER_USER_CAN_ADD_USER_PERMISSIONS,
+            client_permissions=settings.AEM_CUSTOMER_SUPER_USER_CLIENT_PERMISSIONS,
+        ))
+
+    def test_identity_is_loaded_in_two_queries(self):
+        self.user.user_permissions.add(*Permission.objects.filter(codename__in=('add_company', 'change_company')))
+
+        request = APIRequestFactory().get('/')
+        request.user = User.objects.get(pk=self.user.pk)
+
+        with CaptureQueriesContext(connection) as queries:
+            identity = get_identity(request)
+            self.assertIs(get_identity(request), identity)
+            self.assertEqual(request.user.company, self.company)
+
+        self.assertEqual(len(queries), 2)
+        self.assertEqual(identity.company_id, self.company.pk)
+        self.assertEqual(identity.group_slugs, {settings.AEM_CUSTOMER_SUPER_USER_SLUG_FIELD})
+        self.assertTrue(identity.has_perm(settings.ADD_CLIENT_PERMISSION))
+        self.assertTrue(identity.has_perm('groups.can_add_{}'.format(settings.AEM_CUSTOMER_ADMIN_SLUG_FIELD)))
+        self.assertTrue(identity.has_perm(settings.ADD_COMPANY_PERMISSION))
+        self.assertFalse(identity.has_perm('company.delete_company'))
+
+    def test_group_and_user_permissions_arent_joined(self):
+        self.user.user_permissions.add(*Permission.objects.filter(content_type__app_label='company'))
+        group_permissions = Permission.objects.filter(group__user=self.user).count()
+
+        request = APIRequestFactory().get('/')
+        request.user = User.objects.get(pk=self.user.pk)
+
+        with CaptureQueriesContext(connection) as queries:
+            get_identity(request)
+
+        # Neither query may return a row per pairing of the two permission sets.
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT COUNT(*) FROM ({})'.format(queries[0]['sql']))
+            self.assertEqual(cursor.fetchone()[0], group_permissions)
+
+    def test_create_user_loads_identity_once(self):
+        AemGroupFactory.create(slug_field=settings.AEM_CUSTOMER_ADMIN_SLUG_FIELD,
+                               linked_group__name=settings.AEM_CUSTOMER_ADMIN_LINKED_GROUP_NAME)
+        self.client.force_authenticate(user=self.user)
+        data = {
+            "username": "NewUser",
+            "email": "NewUser@outlook.com",
+            "password": "Passw0rd01",
+            "aem_group": settings.AEM_CUSTOMER_ADMIN_SLUG_FIELD,
+        }
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(reverse('create-user'), data, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED, response.content)
+
+        identity_queries = [query['sql'] for query in queries
+                            if 'silk_' not in query['sql'] and '"aemauthentication_user"."is_superuser"' in query['sql']]
+        self.assertEqual(len(identity_queries), 1)
+
+
+class ActivityTrackerTestCase(APITestCase):
+
+    def setUp(self):
+        self.tracker = ActivityTracker(flush_interval=3600)
+        self.users = UserFactory.create_batch(3)
+
+    def test_activity_is_buffered_until_flushed(self):
+        with self.assertNumQueries(0):
+            for user in self.users:
+                self.tracker.touch(user.pk)
+
+        self.assertIsNone(User.objects.get(pk=self.users[0].pk).last_active)
+        self.assertIsNotNone(self.tracker.last_active(self.users[0]))
+
+        with self.assertNumQueries(1):
+            self.assertEqual(self.tracker.flush(), 3)
+
+        for user in self.users:
+            self.assertIsNotNone(User.objects.get(pk=user.pk).last_active)
+
+    def test_flush_only_writes_last_active(self):
+        updated_at = User.objects.get(pk=self.users[0].pk).updated_at
+
+        self.tracker.touch(self.users[0].pk)
+        self.tracker.flush()
+
+        self.assertEqual(User.objects.get(pk=self.users[0].pk).updated_at, updated_at)
+
+    def test_flush_is_triggered_by_interval(self):
+        self.tracker.flush_interval = 0
+        self.tracker.touch(self.users[0].pk)
+
+        self.assertEqual(self.tracker.stats()['pending'], 0)
+        self.assertIsNotNone(User.objects.get(pk=self.users[0].pk).last_active)
+
+    def test_idle_worker_flushes_on_a_timer(self):
+        self.tracker.flush_interval = 0.01
+
+        with mock.patch.object(self.tracker, 'flush') as flush, \
+                mock.patch('aemauthentication.activity.connection.close'):
+            self.tracker._last_flush = time.monotonic() + 60
+            self.tracker.touch(self.users[0].pk)
+            self.tracker._timer.join(5)
+
+        flush.assert_called_once_with()
+
+    def test_activity_for_another_database_is_discarded(self):
+        self.tracker.touch(self.users[0].pk)
+
+        with mock.patch.dict(connection.settings_dict, NAME='other.sqlite3'), self.assertNumQueries(0):
+            self.assertEqual(self.tracker.flush(), 0)
+
+        self.assertIsNone(User.objects.get(pk=self.users[0].pk).last_active)
+
+
+class BulkCreateUserTestCase(APITestCase):
+
+    def setUp(self):
+        self.company = CompanyFactory.create()
+        self.aem_customer_super_user = UserFactory.create(company=self.company, group=AemGroupFactory.create(
+            slug_field=settings.AEM_CUSTOMER_SUPER_USER_SLUG_FIELD,
+            linked_group__name=settings.AEM_CUSTOMER_SUPER_USER_LINKED_GROUP_NAME,
+            can_add_permission_slugs=settings.AEM_CUSTOMER_SUPER_USER_CAN_ADD_USER_PERMISSIONS,
+        ))
+
+        for slug, name in ((settings.AEM_CUSTOMER_ADMIN_SLUG_FIELD, settings.AEM_CUSTOMER_ADMIN_LINKED_GROUP_NAME),
+                           (settings.AEM_CUSTOMER_USER_SLUG_FIELD, settings.AEM_CUSTOMER_USER_LINKED_GROUP_NAME),
+                           (settings.AEM_ADMIN_SLUG_FIELD, settings.AEM_ADMIN_LINKED_GROUP_NAME)):
+            AemGroupFactory.create(slug_field=slug, linked_group__name=name)
+
+        self.client.force_authenticate(user=self.aem_customer_super_user)
+
+    def _upload(self, body, content_type):
+        """
+        Post the upload and read the streamed report, which is only written
+        as it's read.
+        """
+        response = self.client.generic('POST', reverse('bulk-create-user'), body, content_type=content_type)
+
+        if not response.streaming:
+            return response, response.json()
+
+        return response, json.loads(b''.join(response.streaming_content).decode('utf-8'))
+
+    def test_json_lines_upload_reports_every_row(self):
+        rows = [
+            {'username': 'admin', 'email': 'Admin@Example.com', 'password': 'Passw0rd01',
+             'aem_group': settings.AEM_CUSTOMER_ADMIN_SLUG_FIELD},
+            {'username': 'user', 'email': 'user@example.com', 'password': 'Passw0rd01',
+             'aem_group': settings.AEM_CUSTOMER_USER_SLUG_FIELD, 'role': 'Engineer'},
+            {'username': 'staff', 'email': 'staff@example.com', 'password': 'Passw0rd01',
+             'aem_group': settings.AEM_ADMIN_SLUG_FIELD},
+            {'username': self.aem_customer_super_user.username, 'email': 'taken@example.com',
+             'password': 'Passw0rd01', 'aem_group': settings.AEM_CUSTOMER_USER_SLUG_FIELD},
+            {'username': 'no-email', 'password': 'Passw0rd01', 'aem_group': settings.AEM_CUSTOMER_USER_SLUG_FIELD},
+        ]
+        body = '\n'.join(json.dumps(row) for row in rows) + '\nnot json\n'
+
+        response, report = self._upload(body, 'application/x-ndjson')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK, report)
+        results = report['results']
+        self.assertEqual([result['line'] for result in results], [1, 2, 3, 4, 5, 6])
+        self.assertEqual([result['status'] for result in results],
+                         ['created', 'created', 'error', 'error', 'error', 'error'])
+        self.assertEqual(report['created'], 2)
+
+        new_user = User.objects.get(username='user')
+        self.assertTrue(new_user.check_password('Passw0rd01'))
+        self.assertEqual(new_user.company, self.company)
+        self.assertEqual(new_user.role, 'Engineer')
+        self.assertTrue(new_user.groups.filter(aemgroup__slug_field=settings.AEM_CUSTOMER_USER_SLUG_FIELD).exists())
+        self.assertEqual(User.objects.get(username='admin').email, 'Admin@example.com')
+        self.assertFalse(User.objects.filter(username='staff').exists())
+
+    def test_csv_upload(self):
+        body = 'username,email,password,aem_group\n' \
+               'csv-user,csv@example.com,Passw0rd01,{}\n'.format(settings.AEM_CUSTOMER_USER_SLUG_FIELD)
+
+        response, report = self._upload(body, 'text/csv')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK, report)
+        self.assertEqual(report['results'][0]['status'], 'created')
+        self.assertTrue(User.objects.filter(username='csv-user', company=self.company).exists())
+
+    def test_requester_without_company_is_rejected(self):
+        self.client.force_authenticate(user=UserFactory.create(group=AemGroupFactory.create(
+            slug_field=settings.AEM_ADMIN_SLUG_FIELD,
+            can_add_permission_slugs=(settings.AEM_CUSTOMER_USER_SLUG_FIELD,),
+        )))
+
+        response, _ = self._upload(self._rows('orphan'), 'application/x-ndjson')
+
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+        self.assertFalse(User.objects.filter(username='orphan').exists())
+
+    def _rows(self, *usernames):
+        return '\n'.join(json.dumps({'username': username, 'email': '{}@example.com'.format(username),
+                                      'password': 'Passw0rd01', 'aem_group': settings.AEM_CUSTOMER_USER_SLUG_FIELD})
+                         for username in usernames)
+
+    def test_hashing_timeout_is_reported_per_row(self):
+        with mock.patch.object(provisioning_hasher, 'map', side_effect=concurrent.futures.TimeoutError):
+            response, report = self._upload(self._rows('first', 'second'), 'application/x-ndjson')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK, report)
+        self.assertEqual([result['status'] for result in report['results']], ['error', 'error'])
+        self.assertIn('password', report['results'][0]['errors'])
+        self.assertFalse(User.objects.filter(username__in=('first', 'second')).exists())
+
+    def test_username_taken_during_upload_is_reported_per_row(self):
+        def hash_while_another_request_creates_second(func, passwords):
+            UserFactory.create(username='second', company=self.company)
+            return ['hashed'] * len(passwords)
+
+        with mock.patch.object(provisioning_hasher, 'map', side_effect=hash_while_another_request_creates_second):
+            response, report = self._upload(self._rows('first', 'second', 'third'), 'application/x-ndjson')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK, report)
+        self.assertEqual([result['status'] for result in report['results']], ['created', 'error', 'created'])
+        self.assertIn('username', report['results'][1]['errors'])
+        self.assertEqual(User.objects.filter(username__in=('first', 'third'), company=self.company).count(), 2)
@@ -0,0 +1,155 @@
+import math
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework.throttling import BaseThrottle
+
+
+class TokenBucketLimiter:
+    """
+    A token bucket per key: each bucket holds up to `burst` tokens and refills
+    at `per_minute` tokens a minute, every request takes one.
+
+    Buckets live in process memory, or in the default cache when `shared` is
+    set so that every worker draws from the same buckets. The cache variant
+    isn't atomic, under heavy contention it can let a few extra requests in.
+    """
+
+    # Full buckets are dropped once there are this many in memory.
+    max_buckets = 10000
+
+    def __init__(self, burst, per_minute, shared=False, prefix='throttle'):
+        self.burst = burst
+        self.rate = per_minute / 60.0
+        self.shared = shared
+        self.prefix = prefix
+
+        self.allowed = 0
+        self.rejected = 0
+
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def take(self, key):
+        """
+        Take a token for `key`, returning `0` if one was available or else the
+        number of seconds until there will be.
+        """
+        with self._lock:
+            now, tokens = self._refill(key)
+
+            if tokens >= 1:
+                self._store(key, tokens - 1, now)
+                self.allowed += 1
+                return 0
+
+            self._store(key, tokens, now)
+            self.rejected += 1
+
+            return (1 - tokens) / self.rate
+
+    def check(self, key):
+        """
+        Like `take` but leaves the bucket as it is, for callers that only spend
+        a token once they know the request counts against `key`.
+        """
+        with self._lock:
+            now, tokens = self._refill(key)
+
+            if tokens >= 1:
+                return 0
+
+            self.rejected += 1
+
+            return (1 - tokens) / self.rate
+
+    def _refill(self, key):
+        now = time.monotonic() if not self.shared else time.time()
+        tokens, updated_at = self._load(key, now)
+
+        return now, min(self.burst, tokens + (now - updated_at) * self.rate)
+
+    def _load(self, key, now):
+        if self.shared:
+            return cache.get('{}:{}'.format(self.prefix, key)) or (self.burst, now)
+
+        return self._buckets.get(key, (self.burst, now))
+
+    def _store(self, key, tokens, now):
+        if self.shared:
+            # A bucket left alone for this long is full again, let it expire.
+            cache.set('{}:{}'.format(self.prefix, key), (tokens, now), timeout=math.ceil(self.burst / self.rate))
+            return
+
+        self._buckets[key] = (tokens, now)
+
+        if len(self._buckets) > self.max_buckets:
+            self._buckets = {
+                bucket_key: (bucket_tokens, updated_at)
+                for bucket_key, (bucket_tokens, updated_at) in self._buckets.items()
+                if bucket_tokens + (now - updated_at) * self.rate < self.burst
+            }
+
+    def reset(self):
+        with self._lock:
+            self._buckets.clear()
+            self.allowed = 0
+            self.rejected = 0
+
+    def stats(self):
+        """
+        This process's counts, and the number of buckets it holds unless they
+        live in the shared cache, which can't count them.
+        """
+        with self._lock:
+            stats = {
+                'allowed': self.allowed,
+                'rejected': self.rejected,
+            }
+
+            if not self.shared:
+                stats['buckets'] = len(self._buckets)
+
+            return stats
+
+
+username_limiter = TokenBucketLimiter(burst=settings.LOGIN_THROTTLE_USERNAME_BURST,
+                                      per_minute=settings.LOGIN_THROTTLE_USERNAME_PER_MINUTE,
+                                      shared=settings.LOGIN_THROTTLE_SHARED,
+                                      prefix='aemauthentication:login-throttle:username')
+
+ip_limiter = TokenBucketLimiter(burst=settings.LOGIN_THROTTLE_IP_BURST,
+                                per_minute=settings.LOGIN_THROTTLE_IP_PER_MINUTE,
+                                shared=settings.LOGIN_THROTTLE_SHARED,
+                                prefix='aemauthentication:login-throttle:ip')
+
+
+def record_failed_login(username):
+    """
+    Spends a token from the bucket of `username`. Only failed logins are
+    charged, so logging in successfully never uses up a user's budget.
+    """
+    if username:
+        username_limiter.take(str(username).lower())
+
+
+class LoginRateThrottle(BaseThrottle):
+    """
+    Limits login attempts per client IP, and per username once it has run out
+    of failed attempts, so that requests over budget are turned away before
+    any password is hashed.
+    """
+
+    def allow_request(self, request, view):
+        self.wait_time = ip_limiter.take(self.get_ident(request))
+
+        username = request.data.get('username') if hasattr(request.data, 'get') else None
+        if username:
+            self.wait_time = max(self.wait_time, username_limiter.check(str(username).lower()))
+
+        return not self.wait_time
+
+    def wait(self):
+        return self.wait_time
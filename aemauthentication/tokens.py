@@ -0,0 +1,45 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import F
+
+from .cache import user_cache
+from .models import User
+
+
+def _token_version_key(user_id):
+    return 'aemauthentication:token-version:{}'.format(user_id)
+
+
+def get_token_version(user_id):
+    """
+    Return the current token version for `user_id`, going to the database only
+    when the shared cache doesn't already know it.
+    """
+    key = _token_version_key(user_id)
+    version = cache.get(key)
+
+    if version is None:
+        version = User._base_manager.filter(pk=user_id).values_list('token_version', flat=True).first()
+
+        if version is not None:
+            cache.set(key, version, timeout=settings.TOKEN_VERSION_CACHE_TIMEOUT)
+
+    return version
+
+
+def forget_token_version(*user_ids):
+    cache.delete_many([_token_version_key(user_id) for user_id in user_ids])
+
+
+def revoke_tokens(*user_ids):
+    """
+    Invalidate every token issued so far to the given users by bumping their
+    `token_version`.
+    """
+    if not user_ids:
+        return
+
+    User._base_manager.filter(pk__in=user_ids).update(token_version=F('token_version') + 1)
+
+    forget_token_version(*user_ids)
+    user_cache.invalidate(*user_ids)
@@ -5,37 +5,36 @@ from rest_framework.response import Response
 from rest_framework.views import APIView
 
 from django.conf import settings
+from django.http import StreamingHttpResponse
 
+from core.parsers import CSVParser, JSONLinesParser
+from .identity import get_identity
+from .permissions import can_create_user
+from .provisioning import provision_users, render_report
 from .serializers import (
     LoginSerializer,
+    RefreshTokenSerializer,
+    RevokeTokenSerializer,
     UserSerializer)
+from .throttling import LoginRateThrottle
 
 
 class CanCreateUserGroupPermission(BasePermission):
     message = "Invalid permissions to create customer."
 
     def has_permission(self, request, view):
-        if not request.user.has_perm('groups.can_add_{}'.format(request.data.get('aem_group'))):
-            self.message = "Invalid permissions to create this account type."
+        identity = get_identity(request)
+        new_user_group = request.data.get('aem_group')
+
+        message = can_create_user(identity, new_user_group)
+        if message:
+            self.message = message
             return False
 
-        if not request.user.company:
-            request_user_is_staff = request.user.is_superuser \
-                                    or request.user.groups.filter(
-                aemgroup__slug_field=settings.AEM_SUPER_USER_SLUG_FIELD).exists() \
-                                    or request.user.groups.filter(
-                aemgroup__slug_field=settings.AEM_ADMIN_SLUG_FIELD).exists() \
-                                    or request.user.groups.filter(
-                aemgroup__slug_field=settings.AEM_EMPLOYEE_SLUG_FIELD).exists()
-
-            if not request_user_is_staff:
-                self.message = "Invalid account type, user doesn't belong to a company but is not an AEM Staff account."
-                return False
-            else:
-                new_user_group = request.data.get('aem_group')
-                if not new_user_group == settings.AEM_ADMIN_SLUG_FIELD \
-                        or not new_user_group == settings.AEM_EMPLOYEE_SLUG_FIELD:
-                    self.message = "You must be associated with a company to create a new user that is not an AEM Staff account."
+        if not identity.company:
+            if not new_user_group == settings.AEM_ADMIN_SLUG_FIELD \
+                    or not new_user_group == settings.AEM_EMPLOYEE_SLUG_FIELD:
+                self.message = "You must be associated with a company to create a new user that is not an AEM Staff account."
 
         return True
 
@@ -49,18 +48,60 @@ class CreateUserAPIView(CreateAPIView):
 
     def get_serializer(self, *args, **kwargs):
         serializer = super().get_serializer(*args, **kwargs)
-        serializer.company = self.request.user.company
+        serializer.company = get_identity(self.request).company
 
         return serializer
 
 
+class CanBulkCreateUsersPermission(BasePermission):
+    message = "You must be associated with a company to create users in bulk."
+
+    def has_permission(self, request, view):
+        return get_identity(request).company is not None
+
+
+class BulkCreateUserAPIView(APIView):
+    """
+    Creates many User Accounts for the user's company from a JSON lines or
+    CSV upload.
+
+    Each row is checked against the same rules as `CanCreateUserGroupPermission`
+    and the response reports the outcome of every row by line number. The
+    upload is read and the report written as the rows are provisioned.
+    """
+    permission_classes = (IsAuthenticated, CanBulkCreateUsersPermission)
+    parser_classes = (JSONLinesParser, CSVParser)
+
+    def post(self, request):
+        results = provision_users(get_identity(request), request.data)
+
+        return StreamingHttpResponse(render_report(results), content_type='application/json')
+
+
 class LoginAPIView(APIView):
     """
     View for authenticating all Users.
     """
     permission_classes = (AllowAny,)
+    throttle_classes = (LoginRateThrottle,)
     serializer_class = LoginSerializer
 
+    def post(self, request):
+        serializer = self.serializer_class(data=request.data, context={'request': request})
+
+        if serializer.is_valid():
+            return Response(serializer.data, status=status.HTTP_200_OK)
+
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+
+class RefreshTokenAPIView(APIView):
+    """
+    Issues a new access token and refresh token in exchange for a refresh token.
+    """
+    permission_classes = (AllowAny,)
+    serializer_class = RefreshTokenSerializer
+
     def post(self, request):
         serializer = self.serializer_class(data=request.data)
 
@@ -68,3 +109,20 @@ class LoginAPIView(APIView):
             return Response(serializer.data, status=status.HTTP_200_OK)
 
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+
+class RevokeTokenAPIView(APIView):
+    """
+    Revokes a refresh token, i.e logs a device out.
+    """
+    permission_classes = (AllowAny,)
+    serializer_class = RevokeTokenSerializer
+
+    def post(self, request):
+        serializer = self.serializer_class(data=request.data)
+
+        if serializer.is_valid():
+            serializer.save()
+            return Response(status=status.HTTP_204_NO_CONTENT)
+
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
@@ -0,0 +1,41 @@
+import json
+
+from django.conf import settings
+
+from core.utils import chunked
+from .models import Client
+from .readers import attach_customers, client_values
+
+
+def export_clients(company_id, chunk_size=None):
+    """
+    Yield every client of the company with its customers nested under
+    `customer`, in the same shape `ClientSerializer` gives them.
+
+    Clients are read `chunk_size` at a time and the customers of each chunk are
+    fetched in one query, so only a single chunk is ever held in memory.
+    """
+    chunk_size = chunk_size or settings.EXPORT_CHUNK_SIZE
+    clients = client_values(Client.objects.filter(company_id=company_id).order_by('id'))
+
+    for chunk in chunked(clients.iterator(chunk_size=chunk_size), chunk_size):
+        yield from attach_customers(chunk)
+
+
+def _dumps(obj):
+    # The same compact encoding as DRF's JSONRenderer.
+    return json.dumps(obj, ensure_ascii=False, separators=(',', ':'))
+
+
+def render_json_array(rows):
+    yield '['
+
+    for index, row in enumerate(rows):
+        yield _dumps(row) if index == 0 else ',' + _dumps(row)
+
+    yield ']'
+
+
+def render_json_lines(rows):
+    for row in rows:
+        yield _dumps(row) + '\n'
@@ -0,0 +1,69 @@
+from django.conf import settings
+from django.db import transaction
+
+from company import counters
+from company.versioning import bump_version
+from core.normalization import set_contact_keys
+from core.utils import chunked
+from .models import Client
+from .serializers import BulkClientSerializer
+
+
+def import_clients(company, rows, batch_size=None):
+    """
+    Create clients in bulk for `company`.
+
+    `rows` is an iterable of `(line_number, row)` pairs, as produced by the
+    parsers in `core.parsers`. Rows are validated with the `ClientSerializer`
+    rules and inserted a batch at a time, each batch in its own transaction,
+    and a result is yielded for every row in the order they were given.
+    """
+    batch_size = batch_size or settings.BULK_BATCH_SIZE
+
+    for batch in chunked(rows, batch_size):
+        yield from _import_batch(company, batch)
+
+
+def _import_batch(company, batch):
+    results = {}
+    clients = []
+
+    for line_number, row in batch:
+        if isinstance(row, Exception):
+            results[line_number] = _error(line_number, {'error': [str(row)]})
+            continue
+
+        serializer = BulkClientSerializer(data=row)
+
+        if not serializer.is_valid():
+            results[line_number] = _error(line_number, serializer.errors)
+            continue
+
+        client = Client(company=company, **serializer.validated_data)
+        set_contact_keys(client)
+        clients.append((line_number, client))
+
+    if clients:
+        with transaction.atomic():
+            Client.objects.bulk_create([client for _, client in clients])
+
+            # `bulk_create` sends no signals.
+            counters.adjust(company.pk, client_count=len(clients))
+            bump_version(company.pk)
+
+        for line_number, _ in clients:
+            results[line_number] = {
+                'line': line_number,
+                'status': 'created',
+            }
+
+    for line_number, _ in batch:
+        yield results[line_number]
+
+
+def _error(line_number, errors):
+    return {
+        'line': line_number,
+        'status': 'error',
+        'errors': errors,
+    }
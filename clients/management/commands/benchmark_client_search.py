@@ -0,0 +1,55 @@
+import random
+
+from django.core.management.base import BaseCommand
+
+from clients.models import Client
+from clients.search import scan_clients, search_clients
+from company.models import Company
+from core.benchmark import format_summary, measure, rolled_back
+from core.utils import chunked
+
+COMMON_WORDS = ('northern', 'plumbing', 'electrical', 'services', 'holdings', 'logistics', 'retail', 'dental',
+                'garage', 'bakery', 'consulting', 'solutions', 'partners', 'group', 'supplies', 'systems')
+
+
+class Command(BaseCommand):
+    help = 'Compares /clients/search/ on the FTS5 index against an icontains scan.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--clients', type=int, default=100000)
+        parser.add_argument('--companies', type=int, default=10)
+        parser.add_argument('--iterations', type=int, default=50)
+
+    def handle(self, *args, **options):
+        rng = random.Random(0)
+
+        # A handful of common words and a long tail of rare ones, roughly how
+        # names and descriptions are spread in practice.
+        syllables = ('ba', 'ker', 'lo', 'mi', 'nor', 'ton', 'vel', 'sha', 'dri', 'quen', 'fo', 'rath')
+        rare_words = [''.join(rng.choice(syllables) for _ in range(3)) for _ in range(5000)]
+
+        def word():
+            return rng.choice(COMMON_WORDS) if rng.random() < 0.3 else rng.choice(rare_words)
+
+        with rolled_back():
+            companies = [Company.objects.create(name='benchmark-search-{}'.format(i))
+                         for i in range(options['companies'])]
+
+            for batch in chunked(range(options['clients']), 5000):
+                Client.objects.bulk_create(
+                    Client(company=rng.choice(companies),
+                           name='{} {} {}'.format(word(), word(), i),
+                           account_number='AC{:08d}'.format(i),
+                           email='client{}@example.com'.format(i),
+                           description=' '.join(word() for _ in range(8)))
+                    for i in batch
+                )
+
+            company = companies[0]
+
+            for query in ('plumbing', 'northern dental', rare_words[0], 'AC0000123', 'consult', 'nonexistent'):
+                timings = measure(lambda: search_clients(company.pk, query, 50), options['iterations'])
+                self.stdout.write(format_summary('fts5 "{}"'.format(query), timings))
+
+                timings = measure(lambda: list(scan_clients(company.pk, query)[:50]), options['iterations'])
+                self.stdout.write(format_summary('icontains "{}"'.format(query), timings))
@@ -0,0 +1,83 @@
+import resource
+import time
+import tracemalloc
+
+from django.core.management.base import BaseCommand
+
+from clients.export import export_clients, render_json_array
+from clients.models import Client
+from clients.serializers import ClientSerializer
+from company.models import Company
+from core.benchmark import rolled_back
+from core.utils import chunked
+from customers.models import Customer
+
+
+def current_rss():
+    """
+    The resident set size of this process in MB.
+    """
+    with open('/proc/self/statm') as statm:
+        return int(statm.read().split()[1]) * resource.getpagesize() / (1024 * 1024)
+
+
+class Command(BaseCommand):
+    help = 'Records time, RSS and peak allocations of the /clients/export/ stream for tenants of different sizes.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, nargs='+', default=[10000, 100000, 1000000],
+                            help='Total number of client and customer rows for each run.')
+        parser.add_argument('--customers-per-client', type=int, default=1)
+        parser.add_argument('--baseline', action='store_true',
+                            help='Also serialize the whole queryset with ClientSerializer, as /clients/ used to.')
+
+    def handle(self, *args, **options):
+        for rows in options['rows']:
+            with rolled_back():
+                company = self._create_tenant(rows, options['customers_per_client'])
+
+                self._report('export {} rows'.format(rows), lambda: self._export(company))
+
+                if options['baseline']:
+                    self._report('serializer {} rows'.format(rows), lambda: self._serialize(company))
+
+    def _create_tenant(self, rows, customers_per_client):
+        company = Company.objects.create(name='benchmark-export-company')
+        clients = rows // (customers_per_client + 1)
+
+        for batch in chunked(range(clients), 5000):
+            Client.objects.bulk_create(
+                Client(company=company, name='Client {}'.format(i), email='client{}@example.com'.format(i))
+                for i in batch
+            )
+
+        client_ids = Client.objects.filter(company=company).values_list('id', flat=True).iterator()
+        for batch in chunked(client_ids, 5000):
+            Customer.objects.bulk_create(
+                Customer(client_id=client_id, company=company, name='Customer {}'.format(i), email='customer{}@example.com'.format(i))
+                for client_id in batch
+                for i in range(customers_per_client)
+            )
+
+        return company
+
+    def _export(self, company):
+        return sum(len(part) for part in render_json_array(export_clients(company.pk)))
+
+    def _serialize(self, company):
+        data = ClientSerializer(Client.objects.filter(company=company).prefetch_related('customer'), many=True).data
+        return len(data)
+
+    def _report(self, label, func):
+        tracemalloc.start()
+        rss_before = current_rss()
+        start = time.perf_counter()
+
+        func()
+
+        elapsed = time.perf_counter() - start
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        self.stdout.write('{:<28} {:8.2f}s  rss {:8.1f}MB (+{:.1f}MB)  peak allocated {:8.1f}MB'.format(
+            label, elapsed, current_rss(), current_rss() - rss_before, peak / (1024 * 1024)))
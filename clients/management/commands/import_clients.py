@@ -0,0 +1,39 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from clients.importing import import_clients
+from company.models import Company
+from core.parsers import CSVParser, JSONLinesParser
+
+
+class Command(BaseCommand):
+    help = 'Imports clients for a company from a CSV (with a header row) or JSON lines file.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('company_id', type=int)
+        parser.add_argument('path')
+        parser.add_argument('--format', choices=('csv', 'jsonl'),
+                            help='Defaults to csv for .csv files and jsonl otherwise.')
+        parser.add_argument('--batch-size', type=int, default=settings.BULK_BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        try:
+            company = Company.objects.get(pk=options['company_id'])
+        except Company.DoesNotExist:
+            raise CommandError('Company {} does not exist.'.format(options['company_id']))
+
+        file_format = options['format'] or ('csv' if options['path'].endswith('.csv') else 'jsonl')
+        parser = CSVParser() if file_format == 'csv' else JSONLinesParser()
+
+        created = failed = 0
+
+        with open(options['path'], 'rb') as stream:
+            for result in import_clients(company, parser.parse(stream), options['batch_size']):
+                if result['status'] == 'created':
+                    created += 1
+                    continue
+
+                failed += 1
+                self.stderr.write('line {}: {}'.format(result['line'], result['errors']))
+
+        self.stdout.write('{} created, {} failed'.format(created, failed))
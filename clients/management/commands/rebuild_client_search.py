@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from clients import search
+
+
+class Command(BaseCommand):
+    help = 'Installs the client full text index and its triggers if missing, and reindexes every client.'
+
+    def handle(self, *args, **options):
+        if not search.install():
+            raise CommandError('Full text search needs SQLite with FTS5, /clients/search/ will scan instead.')
+
+        search.rebuild()
+        self.stdout.write('Client search index rebuilt.')
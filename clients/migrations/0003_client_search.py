@@ -0,0 +1,25 @@
+# Generated by Django 2.1.3 on 2026-10-18 13:30
+
+from django.db import migrations
+
+from clients import search
+
+
+def install_search(apps, schema_editor):
+    if search.install(schema_editor.connection):
+        search.rebuild(schema_editor.connection)
+
+
+def uninstall_search(apps, schema_editor):
+    search.uninstall(schema_editor.connection)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('clients', '0002_remove_client_client_id'),
+    ]
+
+    operations = [
+        migrations.RunPython(install_search, uninstall_search),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 2.1.3 on 2026-10-18 13:09
+
+from django.db import migrations, models
+
+from core.indexes import add_partial_index
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('clients', '0003_client_search'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='client',
+            index=models.Index(fields=['company', 'is_deleted', 'id'], name='client_company_live_idx'),
+        ),
+        add_partial_index('client_company_live_part', 'clients_client', ['company_id', 'id'], {'is_deleted': False}),
+    ]
@@ -0,0 +1,56 @@
+# Generated by Django 2.1.3 on 2026-10-18 13:23
+
+from django.db import migrations, models
+
+from clients import search
+from core.indexes import add_partial_index
+from core.normalization import backfill_contact_keys
+
+
+def set_existing_keys(apps, schema_editor):
+    backfill_contact_keys(apps.get_model('clients', 'Client'))
+
+
+def reinstall_search_triggers(apps, schema_editor):
+    search.install(schema_editor.connection)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('clients', '0004_live_client_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='client',
+            name='email_key',
+            field=models.CharField(blank=True, editable=False, max_length=254, null=True),
+        ),
+        migrations.AddField(
+            model_name='client',
+            name='landline_number_key',
+            field=models.CharField(blank=True, editable=False, max_length=15, null=True),
+        ),
+        migrations.AddField(
+            model_name='client',
+            name='mobile_number_key',
+            field=models.CharField(blank=True, editable=False, max_length=15, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='client',
+            index=models.Index(fields=['company', 'email_key'], name='client_email_key_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='client',
+            index=models.Index(fields=['company', 'mobile_number_key'], name='client_mobile_key_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='client',
+            index=models.Index(fields=['company', 'landline_number_key'], name='client_landline_key_idx'),
+        ),
+        migrations.RunPython(set_existing_keys, migrations.RunPython.noop),
+        # SQLite rebuilt the table above, dropping the search triggers and partial index.
+        migrations.RunPython(reinstall_search_triggers, migrations.RunPython.noop),
+        add_partial_index('client_company_live_part', 'clients_client', ['company_id', 'id'], {'is_deleted': False}),
+    ]
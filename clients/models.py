@@ -1,6 +1,8 @@
 from django.db import models
 import uuid
 
+from core.normalization import set_contact_keys, with_contact_keys
+
 
 class ClientQuerySet(models.QuerySet):
     def active_and_not_deleted(self):
@@ -54,10 +56,29 @@ class Client(models.Model):
     # Email
     email = models.EmailField()
 
+    # The email and phone numbers normalized for matching duplicates, see `core.normalization`
+    email_key = models.CharField(max_length=254, blank=True, null=True, editable=False)
+    mobile_number_key = models.CharField(max_length=15, blank=True, null=True, editable=False)
+    landline_number_key = models.CharField(max_length=15, blank=True, null=True, editable=False)
+
     # Indicates whether this user has been deleted or not
     is_deleted = models.BooleanField(default=False)
 
     objects = ClientManager()
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['company', 'is_deleted', 'id'], name='client_company_live_idx'),
+            models.Index(fields=['company', 'email_key'], name='client_email_key_idx'),
+            models.Index(fields=['company', 'mobile_number_key'], name='client_mobile_key_idx'),
+            models.Index(fields=['company', 'landline_number_key'], name='client_landline_key_idx'),
+        ]
+
     def __str__(self):
         return self.name
+
+    def save(self, *args, **kwargs):
+        set_contact_keys(self)
+        kwargs['update_fields'] = with_contact_keys(kwargs.get('update_fields'))
+
+        super().save(*args, **kwargs)
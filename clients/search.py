@@ -0,0 +1,160 @@
+"""
+Full text search over clients, backed by an SQLite FTS5 table.
+
+`clients_client_fts` is an external content table over `clients_client`, it
+only stores the index and reads the columns back from the clients table. The
+company id is indexed too, so a search only ever ranks that company's
+matches.
+Triggers keep it in step with every insert, update and delete, including
+`bulk_create` and queryset updates that send no signals.
+
+SQLite's schema editor rebuilds a table to alter most of its columns, which
+drops these triggers, so a migration that does that to `clients_client` has
+to call `install` again afterwards.
+"""
+import re
+from functools import reduce
+from operator import or_
+
+from django.db import OperationalError, connection, transaction
+from django.db.models import Q
+
+from .models import Client
+
+FTS_TABLE = 'clients_client_fts'
+
+# The columns searched, `company_id` is indexed ahead of them.
+FTS_COLUMNS = ('name', 'account_number', 'email', 'description', 'system_details')
+
+_INDEXED_COLUMNS = ('company_id',) + FTS_COLUMNS
+_COLUMNS = ', '.join(_INDEXED_COLUMNS)
+_NEW_COLUMNS = ', '.join('new.{}'.format(column) for column in _INDEXED_COLUMNS)
+_OLD_COLUMNS = ', '.join('old.{}'.format(column) for column in _INDEXED_COLUMNS)
+
+# bm25 weights in column order, the company id shouldn't affect the ranking.
+_WEIGHTS = ', '.join(['0.0'] + ['1.0'] * len(FTS_COLUMNS))
+
+INSTALL_SQL = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS {table} USING fts5({columns}, content='clients_client', "
+    "content_rowid='id')".format(table=FTS_TABLE, columns=_COLUMNS),
+
+    "DROP TRIGGER IF EXISTS clients_client_fts_insert",
+    "CREATE TRIGGER clients_client_fts_insert AFTER INSERT ON clients_client BEGIN "
+    "INSERT INTO {table}(rowid, {columns}) VALUES (new.id, {new}); "
+    "END".format(table=FTS_TABLE, columns=_COLUMNS, new=_NEW_COLUMNS),
+
+    "DROP TRIGGER IF EXISTS clients_client_fts_delete",
+    "CREATE TRIGGER clients_client_fts_delete AFTER DELETE ON clients_client BEGIN "
+    "INSERT INTO {table}({table}, rowid, {columns}) VALUES ('delete', old.id, {old}); "
+    "END".format(table=FTS_TABLE, columns=_COLUMNS, old=_OLD_COLUMNS),
+
+    "DROP TRIGGER IF EXISTS clients_client_fts_update",
+    "CREATE TRIGGER clients_client_fts_update AFTER UPDATE ON clients_client BEGIN "
+    "INSERT INTO {table}({table}, rowid, {columns}) VALUES ('delete', old.id, {old}); "
+    "INSERT INTO {table}(rowid, {columns}) VALUES (new.id, {new}); "
+    "END".format(table=FTS_TABLE, columns=_COLUMNS, old=_OLD_COLUMNS, new=_NEW_COLUMNS),
+]
+
+UNINSTALL_SQL = [
+    "DROP TRIGGER IF EXISTS clients_client_fts_insert",
+    "DROP TRIGGER IF EXISTS clients_client_fts_delete",
+    "DROP TRIGGER IF EXISTS clients_client_fts_update",
+    "DROP TABLE IF EXISTS {}".format(FTS_TABLE),
+]
+
+SEARCH_SQL = (
+    "SELECT c.id FROM {table} f JOIN clients_client c ON c.id = f.rowid "
+    "WHERE {table} MATCH %s AND c.company_id = %s AND NOT c.is_deleted "
+    "ORDER BY bm25({table}, {weights}) LIMIT %s".format(table=FTS_TABLE, weights=_WEIGHTS)
+)
+
+
+def install(db_connection=connection):
+    """
+    Create the FTS table and its triggers. Does nothing on databases other
+    than SQLite or SQLite builds without FTS5, where search falls back to
+    `icontains`. Returns whether the index is installed.
+    """
+    if db_connection.vendor != 'sqlite':
+        return False
+
+    try:
+        with transaction.atomic(using=db_connection.alias), db_connection.cursor() as cursor:
+            for sql in INSTALL_SQL:
+                cursor.execute(sql)
+    except OperationalError:
+        return False
+
+    return True
+
+
+def uninstall(db_connection=connection):
+    if db_connection.vendor != 'sqlite':
+        return
+
+    with db_connection.cursor() as cursor:
+        for sql in UNINSTALL_SQL:
+            cursor.execute(sql)
+
+
+def rebuild(db_connection=connection):
+    """
+    Reindex every client from `clients_client`.
+    """
+    with db_connection.cursor() as cursor:
+        cursor.execute("INSERT INTO {table}({table}) VALUES ('rebuild')".format(table=FTS_TABLE))
+
+
+def match_expression(company_id, query):
+    """
+    Turn free text into an FTS5 query matching the company's rows that contain
+    every word, each as a prefix. Words are quoted so that nothing the user
+    types is treated as query syntax.
+    """
+    words = re.findall(r'\w+', query)
+
+    if not words:
+        return None
+
+    columns = '{{{}}}'.format(' '.join(FTS_COLUMNS))
+
+    return ' AND '.join(['company_id:"{}"'.format(int(company_id))] +
+                        ['{}:"{}"*'.format(columns, word) for word in words])
+
+
+def search_clients(company_id, query, limit):
+    """
+    Return up to `limit` clients of the company matching `query`, best match
+    first.
+    """
+    expression = match_expression(company_id, query)
+
+    if expression is None:
+        return []
+
+    if connection.vendor == 'sqlite':
+        try:
+            with transaction.atomic(), connection.cursor() as cursor:
+                cursor.execute(SEARCH_SQL, [expression, company_id, limit])
+                ids = [row[0] for row in cursor.fetchall()]
+        except OperationalError:
+            # The index isn't installed, see `install`.
+            pass
+        else:
+            clients = Client.objects.in_bulk(ids)
+            return [clients[pk] for pk in ids if pk in clients]
+
+    return list(scan_clients(company_id, query)[:limit])
+
+
+def scan_clients(company_id, query):
+    """
+    The fallback search, every word has to appear in one of the indexed
+    columns.
+    """
+    clients = Client.objects.filter(company_id=company_id).order_by('id')
+
+    for word in re.findall(r'\w+', query):
+        clients = clients.filter(reduce(or_, (Q(**{'{}__icontains'.format(column): word}) for column in FTS_COLUMNS)))
+
+    return clients
@@ -1,11 +1,12 @@
 from rest_framework import serializers
 
 from company.models import Company
+from core.serializers import SparseFieldsetsMixin
 from customers.serializers import CustomerSerializer
 from .models import Client
 
 
-class ClientSerializer(serializers.ModelSerializer):
+class ClientSerializer(SparseFieldsetsMixin, serializers.ModelSerializer):
     company = serializers.PrimaryKeyRelatedField(queryset=Company.objects.all(), required=False, write_only=True)
     customer = CustomerSerializer(many=True, required=False)
 
@@ -13,6 +14,20 @@ class ClientSerializer(serializers.ModelSerializer):
         model = Client
         fields = ('id', 'company', 'name', 'account_number', 'mobile_number',
                   'landline_number', 'email', 'description', 'system_details', 'customer')
+        expandable_fields = ('customer',)
 
     def create(self, validated_data):
         return Client.objects.create_client(**validated_data, company=self.company)
+
+
+class BulkClientSerializer(ClientSerializer):
+    """
+    Validates a single row of a bulk client import, the company is the
+    importing user's and customers can't be nested.
+    """
+    company = None
+    customer = None
+
+    class Meta(ClientSerializer.Meta):
+        fields = ('name', 'account_number', 'mobile_number', 'landline_number', 'email', 'description',
+                  'system_details')
@@ -1,16 +1,32 @@
+import io
+import json
+import tempfile
 import uuid
+from unittest import mock
 
+from django.core.management import call_command
+from django.db import connection
+from django.db.models import Prefetch
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from rest_framework import status
-from rest_framework.test import APITestCase
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory, APITestCase
 
 from aemauthentication.factories import AemGroupFactory, UserFactory
 from django.conf import settings
 
 from aemauthentication.models import User
+from clients.factories import ClientFactory
 from clients.models import Client
+from clients.readers import client_rows, client_values
+from clients.search import scan_clients
+from clients.serializers import ClientSerializer
 from company.factories import CompanyFactory
+from customers.factories import CustomerFactory
+from customers.models import Customer
 
 
 class CreateClientTestCase(APITestCase):
@@ -25,61 +41,17 @@ class CreateClientTestCase(APITestCase):
     }
 
     def setUp(self):
-        self.aem_admin = UserFactory.create(group=AemGroupFactory.create(
-            slug_field=settings.AEM_ADMIN_SLUG_FIELD,
-            linked_group__name=settings.AEM_ADMIN_LINKED_GROUP_NAME,
-            can_add_permission_slugs=settings.AEM_ADMIN_CAN_ADD_USER_PERMISSIONS,
-            client_permissions=settings.AEM_ADMIN_CLIENT_PERMISSIONS,
-            customer_permissions=settings.AEM_ADMIN_CUSTOMER_PERMISSIONS,
-            company_permissions=settings.AEM_ADMIN_COMPANY_PERMISSIONS
-        ))
+        self.aem_admin = UserFactory.create(group=AemGroupFactory.for_role('AEM_ADMIN'))
 
-        self.aem_employee = UserFactory.create(group=AemGroupFactory.create(
-            slug_field=settings.AEM_EMPLOYEE_SLUG_FIELD,
-            linked_group__name=settings.AEM_EMPLOYEE_LINKED_GROUP_NAME,
-            can_add_permission_slugs=settings.AEM_EMPLOYEE_CAN_ADD_USER_PERMISSIONS,
-            client_permissions=settings.AEM_EMPLOYEE_CLIENT_PERMISSIONS,
-            customer_permissions=settings.AEM_EMPLOYEE_CUSTOMER_PERMISSIONS,
-            company_permissions=settings.AEM_EMPLOYEE_COMPANY_PERMISSIONS
-        ))
+        self.aem_employee = UserFactory.create(group=AemGroupFactory.for_role('AEM_EMPLOYEE'))
 
         client_company = CompanyFactory.create()
 
-        self.aem_customer_super_user = UserFactory.create(
-            company=client_company,
-            group=AemGroupFactory.create(
-                slug_field=settings.AEM_CUSTOMER_SUPER_USER_SLUG_FIELD,
-                linked_group__name=settings.AEM_CUSTOMER_SUPER_USER_LINKED_GROUP_NAME,
-                can_add_permission_slugs=settings.AEM_CUSTOMER_SUPER_USER_CAN_ADD_USER_PERMISSIONS,
-                client_permissions=settings.AEM_CUSTOMER_SUPER_USER_CLIENT_PERMISSIONS,
-                customer_permissions=settings.AEM_CUSTOMER_SUPER_USER_CUSTOMER_PERMISSIONS,
-                company_permissions=settings.AEM_CUSTOMER_SUPER_USER_COMPANY_PERMISSIONS
-            )
-        )
+        self.aem_customer_super_user = UserFactory.create(company=client_company, group=AemGroupFactory.for_role('AEM_CUSTOMER_SUPER_USER'))
 
-        self.aem_customer_admin = UserFactory.create(
-            company=client_company,
-            group=AemGroupFactory.create(
-                slug_field=settings.AEM_CUSTOMER_ADMIN_SLUG_FIELD,
-                linked_group__name=settings.AEM_CUSTOMER_ADMIN_LINKED_GROUP_NAME,
-                can_add_permission_slugs=settings.AEM_CUSTOMER_ADMIN_CAN_ADD_USER_PERMISSIONS,
-                client_permissions=settings.AEM_CUSTOMER_ADMIN_CLIENT_PERMISSIONS,
-                customer_permissions=settings.AEM_CUSTOMER_ADMIN_CUSTOMER_PERMISSIONS,
-                company_permissions=settings.AEM_CUSTOMER_ADMIN_COMPANY_PERMISSIONS
-            )
-        )
+        self.aem_customer_admin = UserFactory.create(company=client_company, group=AemGroupFactory.for_role('AEM_CUSTOMER_ADMIN'))
 
-        self.aem_customer_user = UserFactory.create(
-            company=client_company,
-            group=AemGroupFactory.create(
-                slug_field=settings.AEM_CUSTOMER_USER_SLUG_FIELD,
-                linked_group__name=settings.AEM_CUSTOMER_USER_LINKED_GROUP_NAME,
-                can_add_permission_slugs=settings.AEM_CUSTOMER_USER_CAN_ADD_USER_PERMISSIONS,
-                client_permissions=settings.AEM_CUSTOMER_USER_CLIENT_PERMISSIONS,
-                customer_permissions=settings.AEM_CUSTOMER_USER_CUSTOMER_PERMISSIONS,
-                company_permissions=settings.AEM_CUSTOMER_USER_COMPANY_PERMISSIONS
-            )
-        )
+        self.aem_customer_user = UserFactory.create(company=client_company, group=AemGroupFactory.for_role('AEM_CUSTOMER_USER'))
 
     def _test_list_create_client_view_permission(self, user, data, expected_status_code, response_keys=None):
         self.client.force_authenticate(user=user)
@@ -136,3 +108,337 @@ class CreateClientTestCase(APITestCase):
                                                       data=self.valid_client_request_data,
                                                       expected_status_code=status.HTTP_403_FORBIDDEN,
                                                       response_keys=('detail',))
+
+    def test_create_client_loads_identity_once(self):
+        self.client.force_authenticate(user=self.aem_customer_super_user)
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(reverse('list-create-client'), self.valid_client_request_data, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED, response.content)
+
+        # The user, its company, groups and permissions: the identity's two queries.
+        identity_queries = [query['sql'] for query in queries
+                            if 'silk_' not in query['sql'] and ('aemauthentication_user' in query['sql']
+                                                                or 'auth_permission' in query['sql'])]
+        self.assertEqual(len(identity_queries), 2)
+
+
+class ListClientTestCase(APITestCase):
+
+    def setUp(self):
+        self.company = CompanyFactory.create()
+        self.user = UserFactory.create(company=self.company, group=AemGroupFactory.for_role('AEM_CUSTOMER_SUPER_USER'))
+
+        self.clients = ClientFactory.create_batch(6, company=self.company)
+        for client in self.clients:
+            CustomerFactory.create_batch(2, client=client)
+        CustomerFactory.create(client=self.clients[0], is_deleted=True)
+
+        ClientFactory.create(company=CompanyFactory.create())
+
+        self.client.force_authenticate(user=self.user)
+
+    def _list(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK, response.content)
+
+        # Leave out silk's own bookkeeping, which varies between requests.
+        return response.json(), [query for query in queries if 'silk_' not in query['sql']]
+
+    def test_listing_needs_only_the_view_permission(self):
+        self.client.force_authenticate(user=UserFactory.create(
+            company=self.company,
+            group=AemGroupFactory.create(
+                slug_field=settings.AEM_CUSTOMER_USER_SLUG_FIELD,
+                linked_group__name=settings.AEM_CUSTOMER_USER_LINKED_GROUP_NAME,
+                client_permissions=settings.AEM_CUSTOMER_USER_CLIENT_PERMISSIONS
+            )
+        ))
+
+        self.assertEqual(self.client.get(reverse('list-create-client')).status_code, status.HTTP_200_OK)
+
+        response = self.client.post(reverse('list-create-client'), {'name': 'Client'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN, response.content)
+
+    def test_clients_are_paginated_by_cursor(self):
+        page, _ = self._list('{}?page_size=4'.format(reverse('list-create-client')))
+
+        self.assertEqual([client['id'] for client in page['results']], [client.id for client in self.clients[:4]])
+        self.assertEqual(len(page['results'][0]['customer']), 2)
+
+        page, _ = self._list(page['next'])
+
+        self.assertEqual([client['id'] for client in page['results']], [client.id for client in self.clients[4:]])
+        self.assertIsNone(page['next'])
+
+    def test_sparse_fieldsets_are_paginated_by_cursor(self):
+        for query in ('fields=name', 'fields=name&customers=count'):
+            page, _ = self._list('{}?{}&page_size=4'.format(reverse('list-create-client'), query))
+
+            self.assertEqual([client['name'] for client in page['results']],
+                             [client.name for client in self.clients[:4]])
+            self.assertNotIn('id', page['results'][0])
+
+            page, _ = self._list(page['next'])
+
+            self.assertEqual([client['name'] for client in page['results']],
+                             [client.name for client in self.clients[4:]])
+            self.assertIsNone(page['next'])
+
+    def test_query_count_doesnt_depend_on_page_size(self):
+        _, small_page_queries = self._list('{}?page_size=1'.format(reverse('list-create-client')))
+        _, large_page_queries = self._list('{}?page_size=6'.format(reverse('list-create-client')))
+
+        self.assertEqual(len(small_page_queries), len(large_page_queries))
+
+    def test_unchanged_list_is_not_modified(self):
+        etag = self.client.get(reverse('list-create-client'))['ETag']
+
+        with mock.patch.object(ClientSerializer, 'to_representation') as to_representation:
+            response = self.client.get(reverse('list-create-client'), HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        to_representation.assert_not_called()
+
+        # Each page has its own ETag.
+        response = self.client.get('{}?page_size=2'.format(reverse('list-create-client')), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_customer_writes_change_the_list_etag(self):
+        etag = self.client.get(reverse('list-create-client'))['ETag']
+
+        CustomerFactory.create(client=self.clients[0])
+
+        response = self.client.get(reverse('list-create-client'), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.json()['results'][0]['customer']), 3)
+
+    def test_reader_matches_the_serializer_byte_for_byte(self):
+        ClientFactory.create(company=self.company, mobile_number=None, description='', email='ünïcode@example.com')
+        queryset = Client.objects.filter(company=self.company).order_by('id')
+        customers = Prefetch('customer', queryset=Customer.objects.order_by('id'))
+
+        for fields in (None, {'id', 'name'}, {'name', 'customer'}):
+            request = APIRequestFactory().get('/', {'fields': ','.join(fields)} if fields else {})
+            context = {'request': Request(request)}
+            expected = JSONRenderer().render(
+                ClientSerializer(queryset.prefetch_related(customers), many=True, context=context).data)
+
+            self.assertEqual(JSONRenderer().render(client_rows(list(client_values(queryset, fields)), fields)),
+                             expected)
+
+    def test_customer_counts_in_place_of_customers(self):
+        empty = ClientFactory.create(company=self.company)
+
+        page, queries = self._list('{}?customers=count'.format(reverse('list-create-client')))
+
+        counts = {client['id']: client['customer_count'] for client in page['results']}
+        self.assertEqual(counts, {**{client.id: 2 for client in self.clients}, empty.id: 0})
+        self.assertNotIn('customer', page['results'][0])
+        self.assertFalse(any('FROM "customers_customer"' in query['sql'] for query in queries))
+
+        page, _ = self._list('{}?customers=count&fields=name'.format(reverse('list-create-client')))
+        self.assertEqual(page['results'][0], {'name': self.clients[0].name, 'customer_count': 2})
+
+
+class ExportClientsTestCase(APITestCase):
+
+    def setUp(self):
+        self.company = CompanyFactory.create()
+        self.user = UserFactory.create(company=self.company, group=AemGroupFactory.for_role('AEM_CUSTOMER_SUPER_USER'))
+
+        for client in ClientFactory.create_batch(5, company=self.company):
+            CustomerFactory.create_batch(2, client=client)
+            CustomerFactory.create(client=client, is_deleted=True)
+
+        ClientFactory.create(company=CompanyFactory.create())
+
+        self.client.force_authenticate(user=self.user)
+
+    def test_export_matches_the_client_list(self):
+        listed = self.client.get(reverse('list-create-client')).json()['results']
+
+        with self.settings(EXPORT_CHUNK_SIZE=2):
+            response = self.client.get(reverse('export-clients'))
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.streaming)
+        self.assertEqual(json.loads(b''.join(response.streaming_content)), listed)
+
+    def test_export_as_json_lines(self):
+        response = self.client.get(reverse('export-clients'), HTTP_ACCEPT='application/x-ndjson')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+
+        rows = [json.loads(line) for line in b''.join(response.streaming_content).splitlines()]
+        self.assertEqual(len(rows), 5)
+        self.assertTrue(all(len(row['customer']) == 2 for row in rows))
+
+
+class ImportClientsTestCase(APITestCase):
+
+    def setUp(self):
+        self.company = CompanyFactory.create()
+        self.user = UserFactory.create(company=self.company, group=AemGroupFactory.for_role('AEM_CUSTOMER_SUPER_USER'))
+
+        self.client.force_authenticate(user=self.user)
+
+    def _upload(self, body, content_type):
+        return self.client.generic('POST', reverse('import-clients'), body, content_type=content_type)
+
+    def test_json_lines_import_reports_failures_by_line(self):
+        body = '\n'.join([
+            json.dumps({'name': 'First Client', 'email': 'first@example.com'}),
+            json.dumps({'name': 'Second Client', 'email': 'not an email'}),
+            '{not json',
+            json.dumps({'name': 'Third Client', 'email': 'third@example.com', 'mobile_number': '07949887097'}),
+        ])
+
+        with self.settings(BULK_BATCH_SIZE=2):
+            response = self._upload(body, 'application/x-ndjson')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK, response.content)
+        self.assertEqual(response.json()['created'], 2)
+        self.assertEqual([error['line'] for error in response.json()['errors']], [2, 3])
+        self.assertIn('email', response.json()['errors'][0]['errors'])
+
+        self.assertEqual(sorted(Client.objects.filter(company=self.company).values_list('name', flat=True)),
+                         ['First Client', 'Third Client'])
+
+    def test_csv_import(self):
+        body = 'name,email,description\nFirst Client,first@example.com,\nSecond Client,,Missing email\n'
+
+        response = self._upload(body, 'text/csv')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK, response.content)
+        self.assertEqual(response.json()['created'], 1)
+        self.assertEqual(response.json()['errors'][0]['line'], 3)
+
+        self.company.refresh_from_db()
+        self.assertEqual(self.company.client_count, 1)
+
+    def test_imported_clients_have_contact_keys(self):
+        self._upload(json.dumps({'name': 'First Client', 'email': ' First@Example.com',
+                                 'landline_number': '0191 2131247'}), 'application/x-ndjson')
+
+        self.assertEqual(Client.objects.values_list('email_key', 'landline_number_key').get(),
+                         ('first@example.com', '441912131247'))
+
+    def test_duplicate_clients_are_grouped(self):
+        first = ClientFactory.create(company=self.company, email='office@example.com')
+        second = ClientFactory.create(company=self.company, email='Office@Example.com')
+        ClientFactory.create(company=self.company, email='elsewhere@example.com')
+
+        response = self.client.get(reverse('client-duplicates'))
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK, response.content)
+        self.assertEqual(response.json(), [{'ids': [first.pk, second.pk], 'matched_on': ['email']}])
+
+    def test_import_clients_command(self):
+        with tempfile.NamedTemporaryFile('w', suffix='.csv') as upload:
+            upload.write('name,email\nFirst Client,first@example.com\nSecond Client,second@example.com\n')
+            upload.flush()
+
+            call_command('import_clients', self.company.pk, upload.name, stdout=io.StringIO())
+
+        self.assertEqual(Client.objects.filter(company=self.company).count(), 2)
+
+    def test_import_changes_the_list_etag(self):
+        etag = self.client.get(reverse('list-create-client'))['ETag']
+
+        self._upload(json.dumps({'name': 'First Client', 'email': 'first@example.com'}), 'application/x-ndjson')
+
+        response = self.client.get(reverse('list-create-client'), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+
+class SearchClientsTestCase(APITestCase):
+
+    def setUp(self):
+        self.company = CompanyFactory.create()
+        self.user = UserFactory.create(company=self.company, group=AemGroupFactory.for_role('AEM_CUSTOMER_SUPER_USER'))
+
+        self.plumber = ClientFactory.create(company=self.company, name='Northern Plumbing',
+                                            email='office@northernplumbing.com', description='Boilers and plumbing')
+        self.electrician = ClientFactory.create(company=self.company, name='Northern Electrical',
+                                                email='office@northernelectrical.com',
+                                                description='Rewires, some plumbing')
+        ClientFactory.create(company=CompanyFactory.create(), name='Southern Plumbing', email='southern@example.com')
+
+        self.client.force_authenticate(user=self.user)
+
+    def _search(self, query):
+        response = self.client.get(reverse('search-clients'), {'q': query})
+        self.assertEqual(response.status_code, status.HTTP_200_OK, response.content)
+
+        return [client['id'] for client in response.json()]
+
+    def test_search_is_ranked_and_scoped_to_the_company(self):
+        self.assertEqual(self._search('plumbing'), [self.plumber.id, self.electrician.id])
+        self.assertEqual(self._search('north elec'), [self.electrician.id])
+
+    def test_index_follows_updates_and_deletes(self):
+        Client.objects.filter(pk=self.plumber.pk).update(name='Northern Heating', description='Boilers')
+        self.assertEqual(self._search('plumbing'), [self.electrician.id])
+
+        self.electrician.is_deleted = True
+        self.electrician.save()
+        self.assertEqual(self._search('northern'), [self.plumber.id])
+
+        Client.objects.filter(pk=self.plumber.pk).delete()
+        self.assertEqual(self._search('northern'), [])
+
+    def test_query_syntax_is_not_interpreted(self):
+        self.assertEqual(self._search('"plumb boilers*'), [self.plumber.id])
+        self.assertEqual(self._search('plumbing OR heating'), [])
+        self.assertEqual(self._search('  '), [])
+
+    def test_scan_fallback_matches_the_index(self):
+        self.assertEqual(list(scan_clients(self.company.pk, 'north elec')), [self.electrician])
+
+
+class SparseFieldsetsTestCase(APITestCase):
+
+    def setUp(self):
+        self.company = CompanyFactory.create()
+        self.user = UserFactory.create(company=self.company, group=AemGroupFactory.for_role('AEM_CUSTOMER_SUPER_USER'))
+
+        self.clients = ClientFactory.create_batch(2, company=self.company, description='Description')
+        for client in self.clients:
+            CustomerFactory.create(client=client)
+
+        self.client.force_authenticate(user=self.user)
+
+    def _list(self, **params):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('list-create-client'), params)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK, response.content)
+
+        return response.json()['results'], [query['sql'] for query in queries]
+
+    def test_only_requested_fields_are_loaded(self):
+        results, queries = self._list(fields='id,name')
+
+        self.assertEqual(results, [{'id': client.id, 'name': client.name} for client in self.clients])
+
+        client_queries = [sql for sql in queries if 'FROM "clients_client"' in sql]
+        self.assertTrue(client_queries)
+        self.assertFalse(any('"description"' in sql for sql in client_queries))
+        self.assertFalse(any('FROM "customers_customer"' in sql for sql in queries))
+
+    def test_customers_are_expanded_on_request(self):
+        results, _ = self._list(fields='id', expand='customer')
+
+        self.assertEqual(set(results[0]), {'id', 'customer'})
+        self.assertEqual(len(results[0]['customer']), 1)
+
+    def test_default_output_is_unchanged(self):
+        results, _ = self._list()
+
+        self.assertEqual(set(results[0]), {'id', 'name', 'account_number', 'mobile_number', 'landline_number',
+                                           'email', 'description', 'system_details', 'customer'})
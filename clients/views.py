@@ -1,12 +1,26 @@
 import itertools
 
 from django.conf import settings
+from django.db.models import Prefetch, prefetch_related_objects
+from django.http import StreamingHttpResponse
 from rest_framework.permissions import IsAuthenticated, BasePermission
+from rest_framework.renderers import JSONRenderer
 from rest_framework.response import Response
 from rest_framework.views import APIView
 from rest_framework.generics import ListCreateAPIView
 
+from aemauthentication.identity import get_identity
+from core.duplicates import find_duplicates
+from core.pagination import KeysetPagination
+from core.parsers import CSVParser, JSONLinesParser
+from core.renderers import JSONLinesRenderer
+from core.serializers import requested_fields
+from clients.export import export_clients, render_json_array, render_json_lines
+from clients.importing import import_clients
 from clients.models import Client
+from clients.readers import client_rows, client_values
+from clients.search import search_clients
+from company.versioning import CompanyETagMixin
 from clients.serializers import ClientSerializer
 from rest_framework import generics, permissions, status
 
@@ -17,22 +31,139 @@ class CanCreateClientPermission(BasePermission):
     message = "Invalid permissions to create Client."
 
     def has_permission(self, request, view):
-        if not request.user.company:
+        identity = get_identity(request)
+
+        if not identity.company:
             self.message = 'You must be associated with a company to create a client.'
             return False
 
-        return request.user.has_perm(settings.ADD_CLIENT_PERMISSION)
+        return identity.has_perm(settings.ADD_CLIENT_PERMISSION)
 
 
-class ListCreateClientAPIView(ListCreateAPIView):
-    permission_classes = (IsAuthenticated, CanCreateClientPermission,)
+class CanViewClientsPermission(BasePermission):
+    message = "Invalid permissions to view clients."
+
+    def has_permission(self, request, view):
+        identity = get_identity(request)
+
+        if not identity.company:
+            self.message = 'You must be associated with a company to view clients.'
+            return False
+
+        return identity.has_perm(settings.VIEW_CLIENT_PERMISSION)
+
+
+class CanListCreateClientPermission(BasePermission):
+    """
+    Listing needs the view permission and creating the add permission.
+    """
+    message = "Invalid permissions."
+
+    def has_permission(self, request, view):
+        permission = CanCreateClientPermission() if request.method == 'POST' else CanViewClientsPermission()
+        allowed = permission.has_permission(request, view)
+        self.message = permission.message
+
+        return allowed
+
+
+class ListCreateClientAPIView(CompanyETagMixin, ListCreateAPIView):
+    permission_classes = (IsAuthenticated, CanListCreateClientPermission,)
     serializer_class = ClientSerializer
+    pagination_class = KeysetPagination
 
     def get_serializer(self, *args, **kwargs):
         serializer = super().get_serializer(*args, **kwargs)
-        serializer.company = self.request.user.company
+        serializer.company = get_identity(self.request).company
 
         return serializer
 
     def get_queryset(self):
-        return Client.objects.filter(company=self.request.user.company)
+        return Client.objects.filter(company_id=get_identity(self.request).company_id)
+
+    def list(self, request, *args, **kwargs):
+        """
+        Lists the company's clients, with `?customers=count` each client has a
+        `customer_count` instead of its customers.
+        """
+        # Reads skip the serializer, see `clients.readers`.
+        fields = requested_fields(request, ClientSerializer)
+        count_customers = request.query_params.get('customers') == 'count'
+
+        page = self.paginate_queryset(client_values(self.get_queryset(), fields, count_customers))
+
+        return self.get_paginated_response(client_rows(page, fields, count_customers))
+
+
+class SearchClientsAPIView(APIView):
+    """
+    Full text search over the name, account number, email, description and
+    system details of the user's company's clients, `?q=` is matched word by
+    word as prefixes and the best matches come first.
+    """
+    permission_classes = (IsAuthenticated, CanCreateClientPermission,)
+
+    def get(self, request):
+        clients = search_clients(get_identity(request).company_id, request.query_params.get('q', ''),
+                                 settings.SEARCH_RESULTS_LIMIT)
+        prefetch_related_objects(clients, Prefetch('customer', queryset=Customer.objects.order_by('id')))
+
+        return Response(ClientSerializer(clients, many=True).data, status=status.HTTP_200_OK)
+
+
+class ImportClientsAPIView(APIView):
+    """
+    Creates clients for the user's company from a JSON lines or CSV upload.
+
+    Only failed rows are listed in the response, by line number, so it stays
+    small however many rows are imported.
+    """
+    permission_classes = (IsAuthenticated, CanCreateClientPermission,)
+    parser_classes = (JSONLinesParser, CSVParser)
+
+    def post(self, request):
+        created = 0
+        errors = []
+
+        for result in import_clients(get_identity(request).company, request.data):
+            if result['status'] == 'created':
+                created += 1
+            else:
+                errors.append(result)
+
+        return Response({
+            'created': created,
+            'failed': len(errors),
+            'errors': errors
+        }, status=status.HTTP_200_OK)
+
+
+class ExportClientsAPIView(APIView):
+    """
+    Streams every client of the user's company, with their customers, as a
+    JSON array, or as newline delimited JSON when asked for
+    `application/x-ndjson`.
+    """
+    permission_classes = (IsAuthenticated, CanCreateClientPermission,)
+    renderer_classes = (JSONRenderer, JSONLinesRenderer,)
+
+    def get(self, request):
+        rows = export_clients(get_identity(request).company_id)
+
+        if isinstance(request.accepted_renderer, JSONLinesRenderer):
+            return StreamingHttpResponse(render_json_lines(rows), content_type='application/x-ndjson')
+
+        return StreamingHttpResponse(render_json_array(rows), content_type='application/json')
+
+
+class ClientDuplicatesAPIView(APIView):
+    """
+    Groups the user's company's clients that share a normalized email or
+    phone number, see `core.duplicates`.
+    """
+    permission_classes = (IsAuthenticated, CanViewClientsPermission,)
+
+    def get(self, request):
+        groups = find_duplicates(Client.objects.filter(company_id=get_identity(request).company_id))
+
+        return Response(groups, status=status.HTTP_200_OK)
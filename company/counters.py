@@ -0,0 +1,188 @@
+"""
+The per-company counts of live users, clients, customers and active modules,
+kept in columns on `Company` so that `/company/<pk>/stats/` is a single row
+read.
+
+The signal handlers in `company.signals` move the counters with `F()`
+updates whenever a row starts or stops counting, i.e. it is created, soft
+deleted (or restored), deleted or moves company. Whether it counted before
+a save is judged from the values it was loaded with, so saves don't read
+the row again. Bulk inserts send no signals and call `adjust` themselves.
+`recount` recomputes the counters from scratch and is what
+`reconcile_company_counters` runs to repair any drift.
+"""
+from django.db.models import Count, F, IntegerField, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+from aemauthentication.models import User
+from clients.models import Client
+from customers.models import Customer
+from .models import Company
+
+COUNTERS = ('user_count', 'client_count', 'customer_count', 'module_count')
+
+# Marks a save that didn't touch any of the fields a tracker follows.
+_UNCHANGED = object()
+
+
+def adjust(company_id, **deltas):
+    """
+    Add `deltas` (e.g. `client_count=-1`) to the company's counters.
+    """
+    deltas = {counter: F(counter) + delta for counter, delta in deltas.items() if delta}
+
+    if company_id is not None and deltas:
+        Company._base_manager.filter(pk=company_id).update(**deltas)
+
+
+def apply(changes):
+    """
+    Make the `{company_id: {counter: delta}}` changes, one update per company.
+    """
+    for company_id, deltas in changes.items():
+        adjust(company_id, **deltas)
+
+
+def _change(changes, company_id, counter, delta):
+    if company_id is not None:
+        deltas = changes.setdefault(company_id, {})
+        deltas[counter] = deltas.get(counter, 0) + delta
+
+
+class CounterTracker:
+    """
+    Follows the rows of `model` in and out of `counter`. `fields` are read from
+    the instance, and from the database for its previous state when it wasn't
+    loaded with them, `is_live` and `company_of` take a dict of them.
+
+    `on_move` is called with the instance, its previous and current company
+    and the changes being made when a saved row moves company.
+    """
+
+    def __init__(self, model, counter, fields, is_live, company_of=None, on_move=None):
+        self.model = model
+        self.counter = counter
+        self.fields = fields
+        self.is_live = is_live
+        self.company_of = company_of or (lambda values: values['company_id'])
+        self.on_move = on_move
+
+    def _state(self, values):
+        if values is None or not self.is_live(values):
+            return None
+
+        return self.company_of(values)
+
+    def _instance_values(self, instance):
+        return {field: getattr(instance, field) for field in self.fields}
+
+    def remember(self, instance):
+        """
+        Keep the values the instance was created or loaded with, unless some
+        were deferred.
+        """
+        loaded = instance.__dict__
+        instance._counted_values = ({field: loaded[field] for field in self.fields}
+                                    if all(field in loaded for field in self.fields) else None)
+
+    def pre_save(self, instance, update_fields=None):
+        """
+        Remember which values the row had before the save.
+        """
+        if instance._state.adding:
+            instance._previous_counted_values = None
+        elif update_fields is not None and {
+                self.model._meta.get_field(name).attname for name in update_fields}.isdisjoint(self.fields):
+            instance._previous_counted_values = _UNCHANGED
+        else:
+            previous = getattr(instance, '_counted_values', None)
+            if previous is None:
+                previous = self.model._base_manager.filter(pk=instance.pk).values(*self.fields).first()
+
+            instance._previous_counted_values = previous
+
+    def post_save(self, instance, update_fields=None):
+        """
+        The counter changes made by the save.
+        """
+        changes = {}
+        previous = getattr(instance, '_previous_counted_values', None)
+
+        if previous is _UNCHANGED:
+            return changes
+
+        current = self._instance_values(instance)
+        if previous is not None and update_fields is not None:
+            saved = {self.model._meta.get_field(name).attname for name in update_fields}
+            current = {field: current[field] if field in saved else previous[field] for field in self.fields}
+
+        instance._counted_values = current
+
+        if self._state(previous) != self._state(current):
+            _change(changes, self._state(previous), self.counter, -1)
+            _change(changes, self._state(current), self.counter, 1)
+
+        if self.on_move and previous is not None and previous['company_id'] != current['company_id']:
+            self.on_move(instance, previous['company_id'], current['company_id'], changes)
+
+        return changes
+
+    def post_delete(self, instance):
+        changes = {}
+        _change(changes, self._state(self._instance_values(instance)), self.counter, -1)
+
+        return changes
+
+
+def move_customers(client, previous_company_id, company_id, changes):
+    """
+    Take the customers of a client that moved company along with it.
+    """
+    customers = Customer._base_manager.filter(client=client)
+    live = customers.filter(is_deleted=False).count()
+    customers.update(company_id=company_id)
+
+    _change(changes, previous_company_id, 'customer_count', -live)
+    _change(changes, company_id, 'customer_count', live)
+
+
+user_tracker = CounterTracker(User, 'user_count', ('company_id', 'is_active', 'is_deleted'),
+                              lambda values: values['is_active'] and not values['is_deleted'])
+
+client_tracker = CounterTracker(Client, 'client_count', ('company_id', 'is_deleted'),
+                                lambda values: not values['is_deleted'], on_move=move_customers)
+
+customer_tracker = CounterTracker(Customer, 'customer_count', ('company_id', 'is_deleted'),
+                                  lambda values: not values['is_deleted'])
+
+trackers = {
+    User: user_tracker,
+    Client: client_tracker,
+    Customer: customer_tracker,
+}
+
+
+def _count(queryset):
+    counts = queryset.filter(company=OuterRef('pk')).order_by().values('company').annotate(
+        count=Count('pk')).values('count')
+
+    return Coalesce(Subquery(counts, output_field=IntegerField()), Value(0))
+
+
+def recount(company_ids=None, counters=COUNTERS):
+    """
+    Recompute `counters` for the companies in `company_ids`, or for every
+    company, in a single update.
+    """
+    counts = {
+        'user_count': lambda: _count(User._base_manager.filter(is_active=True, is_deleted=False)),
+        'client_count': lambda: _count(Client._base_manager.filter(is_deleted=False)),
+        'customer_count': lambda: _count(Customer._base_manager.filter(is_deleted=False)),
+        'module_count': lambda: _count(Company.modules.through.objects.filter(companymodule__is_active=True)),
+    }
+
+    companies = Company._base_manager.all()
+    if company_ids is not None:
+        companies = companies.filter(pk__in=company_ids)
+
+    companies.update(**{counter: counts[counter]() for counter in counters})
@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+
+from company import counters
+from company.models import Company
+
+
+class Command(BaseCommand):
+    help = 'Recomputes the user, client, customer and module counters of every (or the given) company.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('company_ids', type=int, nargs='*')
+
+    def handle(self, *args, **options):
+        company_ids = options['company_ids'] or None
+
+        companies = Company._base_manager.all()
+        if company_ids is not None:
+            companies = companies.filter(pk__in=company_ids)
+
+        before = {row[0]: row[1:] for row in companies.values_list('pk', *counters.COUNTERS)}
+        counters.recount(company_ids)
+        after = {row[0]: row[1:] for row in companies.values_list('pk', *counters.COUNTERS)}
+
+        drifted = [pk for pk in after if before.get(pk) != after[pk]]
+
+        for pk in drifted:
+            self.stdout.write('company {}: {} -> {}'.format(pk, before.get(pk), after[pk]))
+
+        self.stdout.write('{} companies reconciled, {} had drifted.'.format(len(after), len(drifted)))
@@ -0,0 +1,59 @@
+# Generated by Django 2.1.3 on 2026-10-18 13:17
+
+from django.db import migrations, models
+from django.db.models import Count, IntegerField, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+def _count(queryset, company_field='company'):
+    counts = queryset.filter(**{company_field: OuterRef('pk')}).order_by().values(company_field).annotate(
+        count=Count('pk')).values('count')
+
+    return Coalesce(Subquery(counts, output_field=IntegerField()), Value(0))
+
+
+def count_existing_rows(apps, schema_editor):
+    Company = apps.get_model('company', 'Company')
+    User = apps.get_model('aemauthentication', 'User')
+    Client = apps.get_model('clients', 'Client')
+    Customer = apps.get_model('customers', 'Customer')
+
+    Company._base_manager.update(
+        user_count=_count(User._base_manager.filter(is_active=True, is_deleted=False)),
+        client_count=_count(Client._base_manager.filter(is_deleted=False)),
+        customer_count=_count(Customer._base_manager.filter(is_deleted=False), 'client__company'),
+        module_count=_count(Company.modules.through.objects.filter(companymodule__is_active=True)))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('company', '0009_companymodule_image_url'),
+        ('aemauthentication', '0006_live_user_indexes'),
+        ('clients', '0004_live_client_indexes'),
+        ('customers', '0003_live_customer_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='company',
+            name='client_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='company',
+            name='customer_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='company',
+            name='module_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='company',
+            name='user_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.RunPython(count_existing_rows, migrations.RunPython.noop),
+    ]
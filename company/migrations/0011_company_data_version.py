@@ -0,0 +1,18 @@
+# Generated by Django 2.1.3 on 2026-10-18 16:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('company', '0010_company_counters'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='company',
+            name='data_version',
+            field=models.BigIntegerField(default=0),
+        ),
+    ]
@@ -67,6 +67,17 @@ class Company(models.Model):
     is_active = models.BooleanField(default=True)
     is_deleted = models.BooleanField(default=False)
 
+    # Live users, clients and customers and active modules, kept up to date by
+    # `company.counters`.
+    user_count = models.IntegerField(default=0)
+    client_count = models.IntegerField(default=0)
+    customer_count = models.IntegerField(default=0)
+    module_count = models.IntegerField(default=0)
+
+    # Moves on whenever anything served under the company changes, see
+    # `company.versioning`.
+    data_version = models.BigIntegerField(default=0)
+
     objects = CompanyManager()
 
     def __str__(self):
@@ -5,6 +5,7 @@ from rest_framework import serializers
 from rest_framework.validators import UniqueValidator
 
 from aemauthentication.models import User
+from core.serializers import SparseFieldsetsMixin
 from .models import Company, CompanyModule
 
 
@@ -20,7 +21,7 @@ class UserSerializer(serializers.ModelSerializer):
         fields = ['username', 'password', 'email']
 
 
-class CompanySerializer(serializers.ModelSerializer):
+class CompanySerializer(SparseFieldsetsMixin, serializers.ModelSerializer):
     user = UserSerializer(write_only=True)
     modules = ModulesSerializer(many=True, required=False)
 
@@ -29,6 +30,7 @@ class CompanySerializer(serializers.ModelSerializer):
     class Meta:
         model = Company
         fields = ['pk', 'company_id', 'name', 'user', 'modules']
+        expandable_fields = ['modules']
 
     def create(self, validated_data):
         return Company.objects.create_company(**validated_data)
@@ -0,0 +1,112 @@
+from django.db.models.signals import m2m_changed, post_delete, post_init, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from aemauthentication.models import User
+from clients.models import Client
+from customers.models import Customer
+from . import counters
+from .models import Company, CompanyModule
+from .versioning import bump_version
+
+
+@receiver(post_save, sender=Company)
+@receiver(post_delete, sender=Company)
+def bump_company_version(sender, instance, **kwargs):
+    bump_version(instance.pk)
+
+
+@receiver(m2m_changed, sender=Company.modules.through)
+def bump_company_modules_version(sender, instance, action, reverse, pk_set, **kwargs):
+    if not reverse and action in ('post_add', 'post_remove', 'post_clear'):
+        bump_version(instance.pk)
+    elif reverse and action in ('post_add', 'post_remove'):
+        bump_version(*pk_set)
+    elif reverse and action == 'pre_clear':
+        # The companies losing the module are only known before the clear.
+        bump_version(*Company.modules.through.objects.filter(companymodule=instance)
+                     .values_list('company_id', flat=True))
+
+
+@receiver(m2m_changed, sender=Company.modules.through)
+def recount_company_modules(sender, instance, action, reverse, pk_set, **kwargs):
+    if not reverse and action in ('post_add', 'post_remove', 'post_clear'):
+        counters.recount([instance.pk], counters=('module_count',))
+    elif reverse and action in ('post_add', 'post_remove'):
+        counters.recount(pk_set, counters=('module_count',))
+    elif reverse and action == 'pre_clear':
+        instance._cleared_company_ids = list(Company.modules.through.objects.filter(companymodule=instance)
+                                             .values_list('company_id', flat=True))
+    elif reverse and action == 'post_clear':
+        counters.recount(instance._cleared_company_ids, counters=('module_count',))
+
+
+@receiver(post_save, sender=CompanyModule)
+@receiver(pre_delete, sender=CompanyModule)
+def bump_module_companies_version(sender, instance, **kwargs):
+    bump_version(*Company.modules.through.objects.filter(companymodule=instance)
+                 .values_list('company_id', flat=True))
+
+
+@receiver(post_save, sender=CompanyModule)
+def recount_module_companies(sender, instance, created, **kwargs):
+    # The module may have been (de)activated.
+    if not created:
+        counters.recount(Company.modules.through.objects.filter(companymodule=instance).values('company_id'),
+                         counters=('module_count',))
+
+
+@receiver(pre_delete, sender=CompanyModule)
+def remember_module_companies(sender, instance, **kwargs):
+    instance._deleted_company_ids = list(Company.modules.through.objects.filter(companymodule=instance)
+                                         .values_list('company_id', flat=True))
+
+
+@receiver(post_delete, sender=CompanyModule)
+def recount_deleted_module_companies(sender, instance, **kwargs):
+    counters.recount(instance._deleted_company_ids, counters=('module_count',))
+
+
+@receiver(post_init, sender=User)
+@receiver(post_init, sender=Client)
+@receiver(post_init, sender=Customer)
+def remember_counted_values(sender, instance, **kwargs):
+    counters.trackers[sender].remember(instance)
+
+
+@receiver(pre_save, sender=User)
+@receiver(pre_save, sender=Client)
+@receiver(pre_save, sender=Customer)
+def remember_counted_company(sender, instance, update_fields=None, raw=False, **kwargs):
+    if not raw:
+        counters.trackers[sender].pre_save(instance, update_fields)
+
+
+@receiver(post_save, sender=User)
+def adjust_counters_on_save(sender, instance, update_fields=None, raw=False, **kwargs):
+    if not raw:
+        counters.apply(counters.trackers[sender].post_save(instance, update_fields))
+
+
+@receiver(post_delete, sender=User)
+def adjust_counters_on_delete(sender, instance, **kwargs):
+    counters.apply(counters.trackers[sender].post_delete(instance))
+
+
+def _bump_with_counters(instance, changes):
+    # Bump the versions of the companies in the same update as their counters.
+    for company_id in {instance.company_id, *changes}:
+        changes.setdefault(company_id, {})['data_version'] = 1
+
+    counters.apply(changes)
+
+
+@receiver(post_save, sender=Client)
+@receiver(post_save, sender=Customer)
+def adjust_company_on_save(sender, instance, update_fields=None, raw=False, **kwargs):
+    _bump_with_counters(instance, {} if raw else counters.trackers[sender].post_save(instance, update_fields))
+
+
+@receiver(post_delete, sender=Client)
+@receiver(post_delete, sender=Customer)
+def adjust_company_on_delete(sender, instance, **kwargs):
+    _bump_with_counters(instance, counters.trackers[sender].post_delete(instance))
@@ -1,10 +1,26 @@
+import io
+from unittest import mock
+
 from django.conf import settings
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from rest_framework import status
 from rest_framework.reverse import reverse
-from rest_framework.test import APITestCase
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory, APITestCase
 
 from aemauthentication.factories import AemGroupFactory, UserFactory
+from clients.factories import ClientFactory
+from clients.models import Client
 from company.factories import CompanyFactory
+from company.models import Company, CompanyModule
+from company.readers import company_rows
+from company.serializers import CompanySerializer
+from company.views import select_company_fields
+from customers.factories import CustomerFactory
 
 
 class CreateClientTestCase(APITestCase):
@@ -18,61 +34,17 @@ class CreateClientTestCase(APITestCase):
     }
 
     def setUp(self):
-        self.aem_admin = UserFactory.create(group=AemGroupFactory.create(
-            slug_field=settings.AEM_ADMIN_SLUG_FIELD,
-            linked_group__name=settings.AEM_ADMIN_LINKED_GROUP_NAME,
-            can_add_permission_slugs=settings.AEM_ADMIN_CAN_ADD_USER_PERMISSIONS,
-            client_permissions=settings.AEM_ADMIN_CLIENT_PERMISSIONS,
-            customer_permissions=settings.AEM_ADMIN_CUSTOMER_PERMISSIONS,
-            company_permissions=settings.AEM_ADMIN_COMPANY_PERMISSIONS
-        ))
-
-        self.aem_employee = UserFactory.create(group=AemGroupFactory.create(
-            slug_field=settings.AEM_EMPLOYEE_SLUG_FIELD,
-            linked_group__name=settings.AEM_EMPLOYEE_LINKED_GROUP_NAME,
-            can_add_permission_slugs=settings.AEM_EMPLOYEE_CAN_ADD_USER_PERMISSIONS,
-            client_permissions=settings.AEM_EMPLOYEE_CLIENT_PERMISSIONS,
-            customer_permissions=settings.AEM_EMPLOYEE_CUSTOMER_PERMISSIONS,
-            company_permissions=settings.AEM_EMPLOYEE_COMPANY_PERMISSIONS
-        ))
+        self.aem_admin = UserFactory.create(group=AemGroupFactory.for_role('AEM_ADMIN'))
+
+        self.aem_employee = UserFactory.create(group=AemGroupFactory.for_role('AEM_EMPLOYEE'))
 
         client_company = CompanyFactory.create()
 
-        self.aem_customer_super_user = UserFactory.create(
-            company=client_company,
-            group=AemGroupFactory.create(
-                slug_field=settings.AEM_CUSTOMER_SUPER_USER_SLUG_FIELD,
-                linked_group__name=settings.AEM_CUSTOMER_SUPER_USER_LINKED_GROUP_NAME,
-                can_add_permission_slugs=settings.AEM_CUSTOMER_SUPER_USER_CAN_ADD_USER_PERMISSIONS,
-                client_permissions=settings.AEM_CUSTOMER_SUPER_USER_CLIENT_PERMISSIONS,
-                customer_permissions=settings.AEM_CUSTOMER_SUPER_USER_CUSTOMER_PERMISSIONS,
-                company_permissions=settings.AEM_CUSTOMER_SUPER_USER_COMPANY_PERMISSIONS
-            )
-        )
-
-        self.aem_customer_admin = UserFactory.create(
-            company=client_company,
-            group=AemGroupFactory.create(
-                slug_field=settings.AEM_CUSTOMER_ADMIN_SLUG_FIELD,
-                linked_group__name=settings.AEM_CUSTOMER_ADMIN_LINKED_GROUP_NAME,
-                can_add_permission_slugs=settings.AEM_CUSTOMER_ADMIN_CAN_ADD_USER_PERMISSIONS,
-                client_permissions=settings.AEM_CUSTOMER_ADMIN_CLIENT_PERMISSIONS,
-                customer_permissions=settings.AEM_CUSTOMER_ADMIN_CUSTOMER_PERMISSIONS,
-                company_permissions=settings.AEM_CUSTOMER_ADMIN_COMPANY_PERMISSIONS
-            )
-        )
-
-        self.aem_customer_user = UserFactory.create(
-            company=client_company,
-            group=AemGroupFactory.create(
-                slug_field=settings.AEM_CUSTOMER_USER_SLUG_FIELD,
-                linked_group__name=settings.AEM_CUSTOMER_USER_LINKED_GROUP_NAME,
-                can_add_permission_slugs=settings.AEM_CUSTOMER_USER_CAN_ADD_USER_PERMISSIONS,
-                client_permissions=settings.AEM_CUSTOMER_USER_CLIENT_PERMISSIONS,
-                customer_permissions=settings.AEM_CUSTOMER_USER_CUSTOMER_PERMISSIONS,
-                company_permissions=settings.AEM_CUSTOMER_USER_COMPANY_PERMISSIONS
-            )
-        )
+        self.aem_customer_super_user = UserFactory.create(company=client_company, group=AemGroupFactory.for_role('AEM_CUSTOMER_SUPER_USER'))
+
+        self.aem_customer_admin = UserFactory.create(company=client_company, group=AemGroupFactory.for_role('AEM_CUSTOMER_ADMIN'))
+
+        self.aem_customer_user = UserFactory.create(company=client_company, group=AemGroupFactory.for_role('AEM_CUSTOMER_USER'))
 
     def _test_list_create_company_view_permission(self, user, data, expected_status_code, response_keys=None):
         self.client.force_authenticate(user=user)
@@ -115,3 +87,183 @@ class CreateClientTestCase(APITestCase):
                                                        expected_status_code=status.HTTP_403_FORBIDDEN,
                                                        response_keys=('detail',))
 
+
+
+class RetrieveCompanyETagTestCase(APITestCase):
+
+    def setUp(self):
+        self.company = CompanyFactory.create()
+        self.user = UserFactory.create(company=self.company, group=AemGroupFactory.for_role('AEM_CUSTOMER_USER'))
+
+        self.client.force_authenticate(user=self.user)
+
+    def _retrieve(self, etag=None):
+        headers = {'HTTP_IF_NONE_MATCH': etag} if etag else {}
+        return self.client.get(reverse('retrieve-company', kwargs={'pk': self.company.pk}), **headers)
+
+    def test_unchanged_company_is_not_modified(self):
+        etag = self._retrieve()['ETag']
+
+        with mock.patch('company.views.RetrieveCompanyAPIView.get_object') as get_object:
+            response = self._retrieve(etag)
+
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(response['ETag'], etag)
+        get_object.assert_not_called()
+
+    def test_weak_and_wildcard_tags_match(self):
+        etag = self._retrieve()['ETag']
+
+        self.assertEqual(self._retrieve('W/{}'.format(etag)).status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(self._retrieve('"other", {}'.format(etag)).status_code, status.HTTP_304_NOT_MODIFIED)
+
+        response = self._retrieve('*')
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(response['ETag'], etag)
+
+    def test_etag_outlives_the_cache(self):
+        etag = self._retrieve()['ETag']
+
+        cache.clear()
+
+        self.assertEqual(self._retrieve(etag).status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_company_writes_change_the_etag(self):
+        etag = self._retrieve()['ETag']
+
+        self.company.modules.add(CompanyModule.objects.create(name='Module', slug_field='module', image_url='url'))
+
+        response = self._retrieve(etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response['ETag'], etag)
+
+        etag = response['ETag']
+        ClientFactory.create(company=self.company)
+
+        self.assertEqual(self._retrieve(etag).status_code, status.HTTP_200_OK)
+
+    def test_sparse_fieldsets(self):
+        self.company.modules.add(CompanyModule.objects.create(name='Module', slug_field='module', image_url='url'))
+        url = reverse('retrieve-company', kwargs={'pk': self.company.pk})
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, {'fields': 'name'})
+
+        self.assertEqual(response.json(), {'name': self.company.name})
+        self.assertFalse(any('company_companymodule' in query['sql'] for query in queries))
+
+        response = self.client.get(url, {'expand': 'modules'})
+        self.assertEqual(response.json(), {'pk': self.company.pk, 'name': self.company.name,
+                                           'modules': [{'name': 'Module', 'slug_field': 'module', 'image_url': 'url'}]})
+
+
+class CompanyReaderTestCase(APITestCase):
+
+    def test_reader_matches_the_serializer_byte_for_byte(self):
+        first, second = CompanyFactory.create(), CompanyFactory.create()
+        modules = [CompanyModule.objects.create(name='Module {}'.format(i), slug_field='module-{}'.format(i),
+                                                image_url='url', is_active=i != 1) for i in range(3)]
+        first.modules.add(modules[2], modules[0], modules[1])
+        second.modules.add(modules[2])
+
+        queryset = Company.objects.filter(pk__in=[first.pk, second.pk]).order_by('id')
+
+        for fields in (None, {'pk'}, {'name', 'modules'}):
+            request = Request(APIRequestFactory().get('/', {'fields': ','.join(fields)} if fields else {}))
+            expected = JSONRenderer().render(CompanySerializer(select_company_fields(queryset, request), many=True,
+                                                               context={'request': request}).data)
+
+            self.assertEqual(JSONRenderer().render(company_rows(queryset, fields)), expected)
+
+
+class CompanyCountersTestCase(APITestCase):
+
+    def setUp(self):
+        self.company = CompanyFactory.create()
+        self.user = UserFactory.create(company=self.company, group=AemGroupFactory.for_role('AEM_CUSTOMER_USER'))
+
+        self.client.force_authenticate(user=self.user)
+
+    def _stats(self):
+        response = self.client.get(reverse('company-stats', kwargs={'pk': self.company.pk}))
+        self.assertEqual(response.status_code, status.HTTP_200_OK, response.content)
+
+        return response.json()
+
+    def test_counters_follow_creates_and_soft_deletes(self):
+        clients = ClientFactory.create_batch(2, company=self.company)
+        customers = CustomerFactory.create_batch(3, client=clients[0])
+        UserFactory.create(company=self.company)
+        self.company.modules.add(*[CompanyModule.objects.create(name='Module', slug_field='module-{}'.format(i),
+                                                                image_url='url') for i in range(2)])
+
+        self.assertEqual(self._stats(), {'users': 2, 'clients': 2, 'customers': 3, 'modules': 2})
+
+        clients[1].is_deleted = True
+        clients[1].save()
+        customers[0].is_deleted = True
+        customers[0].save()
+        customers[1].delete()
+        self.user.is_active = False
+        self.user.save()
+        CompanyModule.objects.filter(slug_field='module-0').get().delete()
+
+        self.assertEqual(self._stats(), {'users': 1, 'clients': 1, 'customers': 1, 'modules': 1})
+
+        # Saving again without a change, or only other fields, doesn't count twice.
+        clients[1].save()
+        clients[0].name = 'Renamed'
+        clients[0].save(update_fields=['name'])
+
+        self.assertEqual(self._stats()['clients'], 1)
+
+    def test_saving_a_loaded_row_doesnt_read_it_again(self):
+        ClientFactory.create(company=self.company)
+        client = Client.objects.get(company=self.company)
+        client.name = 'Renamed'
+
+        with CaptureQueriesContext(connection) as queries:
+            client.save()
+
+        self.assertEqual([query['sql'].split()[0] for query in queries], ['UPDATE', 'UPDATE'])
+
+        client.is_deleted = True
+        client.save()
+
+        self.assertEqual(self._stats()['clients'], 0)
+
+    def test_customers_move_company_with_their_client(self):
+        other = CompanyFactory.create()
+        client = ClientFactory.create(company=self.company)
+        CustomerFactory.create_batch(2, client=client)
+        CustomerFactory.create(client=client, is_deleted=True)
+
+        client.company = other
+        client.save()
+
+        self.assertEqual(self._stats(), {'users': 1, 'clients': 0, 'customers': 0, 'modules': 0})
+        self.assertEqual(Company.objects.values_list('client_count', 'customer_count').get(pk=other.pk), (1, 2))
+        self.assertEqual(set(client.customer.values_list('company_id', flat=True)), {other.pk})
+
+    def test_stats_are_only_shown_to_the_company_and_staff(self):
+        other = reverse('company-stats', kwargs={'pk': CompanyFactory.create().pk})
+        self.assertEqual(self.client.get(other).status_code, status.HTTP_403_FORBIDDEN)
+
+        self.client.force_authenticate(user=UserFactory.create())
+        self.assertEqual(self.client.get(other).status_code, status.HTTP_403_FORBIDDEN)
+
+        self.client.force_authenticate(user=UserFactory.create(group=AemGroupFactory.create(
+            slug_field=settings.AEM_EMPLOYEE_SLUG_FIELD,
+            linked_group__name=settings.AEM_EMPLOYEE_LINKED_GROUP_NAME
+        )))
+        self.assertEqual(self.client.get(other).status_code, status.HTTP_200_OK)
+
+    def test_reconcile_repairs_drift(self):
+        ClientFactory.create_batch(2, company=self.company)
+        Client.objects.filter(company=self.company).update(is_deleted=True)
+
+        self.assertEqual(self._stats()['clients'], 2)
+
+        call_command('reconcile_company_counters', self.company.pk, stdout=io.StringIO())
+
+        self.assertEqual(self._stats(), {'users': 1, 'clients': 0, 'customers': 0, 'modules': 0})
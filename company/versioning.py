@@ -0,0 +1,87 @@
+import hashlib
+
+from django.db.models import F
+from django.utils.http import parse_etags
+from rest_framework import status
+from rest_framework.response import Response
+
+from aemauthentication.identity import get_identity
+from .models import Company
+
+
+def get_version(company_id):
+    """
+    Return the current data version of the company, or `None` if there's no
+    such company.
+
+    The version is a column on the company row, so every worker sees a write
+    as soon as its transaction commits.
+    """
+    return Company._base_manager.filter(pk=company_id).values_list('data_version', flat=True).first()
+
+
+def bump_version(*company_ids):
+    """
+    Give the companies a new data version, whenever anything served under
+    them changes.
+
+    The bump is part of the writing transaction, so a request can't see the
+    new version before the data it stands for.
+    """
+    company_ids = [company_id for company_id in company_ids if company_id is not None]
+
+    if company_ids:
+        Company._base_manager.filter(pk__in=company_ids).update(data_version=F('data_version') + 1)
+
+
+def make_etag(company_id, request):
+    """
+    A strong ETag for the response to `request` from the company's current
+    data version.
+    """
+    accepted = getattr(request, 'accepted_media_type', '')
+    parts = (str(company_id), str(get_version(company_id)), request.get_full_path(), accepted)
+
+    return '"{}"'.format(hashlib.sha1('\n'.join(parts).encode('utf-8')).hexdigest())
+
+
+def _opaque_tag(etag):
+    return etag[2:] if etag.startswith('W/') else etag
+
+
+class CompanyETagMixin:
+    """
+    Tags GET responses with an ETag from the company's data version, and
+    answers a matching `If-None-Match` with a 304 before any queryset or
+    serializer runs.
+
+    The company is the requesting user's, views serving another company's data
+    override `get_etag_company_id`, returning `None` to skip it.
+    """
+
+    def get_etag_company_id(self):
+        return get_identity(self.request).company_id
+
+    def get(self, request, *args, **kwargs):
+        company_id = self.get_etag_company_id()
+
+        if company_id is None:
+            return super().get(request, *args, **kwargs)
+
+        # Read before the data, a write in between only costs a full response.
+        etag = make_etag(company_id, request)
+        if_none_match = [_opaque_tag(value) for value in parse_etags(request.META.get('HTTP_IF_NONE_MATCH', ''))]
+
+        if etag in if_none_match:
+            return Response(status=status.HTTP_304_NOT_MODIFIED, headers={'ETag': etag})
+
+        response = super().get(request, *args, **kwargs)
+
+        if response.status_code == status.HTTP_200_OK:
+            # `*` matches whatever there is, so only once the view has found it.
+            if '*' in if_none_match:
+                return Response(status=status.HTTP_304_NOT_MODIFIED, headers={'ETag': etag})
+
+            response['ETag'] = etag
+
+        return response
@@ -1,5 +1,6 @@
 from django.conf import settings
-from django.http import JsonResponse
+from django.db.models import Prefetch
+from django.http import Http404, JsonResponse
 from rest_framework import status, permissions
 from rest_framework.exceptions import ParseError
 from rest_framework.generics import ListCreateAPIView, ListAPIView, RetrieveAPIView, get_object_or_404
@@ -7,18 +8,39 @@ from rest_framework.permissions import AllowAny, IsAuthenticated, BasePermission
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
+from aemauthentication.identity import get_identity
 from company.models import Company, CompanyModule
+from company.readers import company_rows
 from company.serializers import CompanySerializer
+from company.versioning import CompanyETagMixin
+from core.serializers import requested_fields
+
+
+def select_company_fields(queryset, request):
+    """
+    Load only what the requested `CompanySerializer` fields need.
+    """
+    fields = requested_fields(request, CompanySerializer)
+
+    if fields is None or 'modules' in fields:
+        queryset = queryset.prefetch_related(Prefetch('modules', queryset=CompanyModule.objects.order_by('id')))
+
+    if fields is not None:
+        queryset = queryset.only('id', *(fields & {'name'}))
+
+    return queryset
 
 
 class CanListCreateCompanyPermission(BasePermission):
     message = "Invalid permissions."
 
     def has_permission(self, request, view):
+        identity = get_identity(request)
+
         if request.method == 'GET':
-            return request.user.has_perm(settings.VIEW_COMPANY_PERMISSION)
+            return identity.has_perm(settings.VIEW_COMPANY_PERMISSION)
         elif request.method == 'POST':
-            return request.user.has_perm(settings.ADD_COMPANY_PERMISSION)
+            return identity.has_perm(settings.ADD_COMPANY_PERMISSION)
 
         return False
 
@@ -31,31 +53,77 @@ class ListCreateCompanyAPIView(ListCreateAPIView):
     serializer_class = CompanySerializer
     queryset = Company.objects.all()
 
+    def list(self, request, *args, **kwargs):
+        # Reads skip the serializer, see `company.readers`.
+        return Response(company_rows(self.get_queryset(), requested_fields(request, CompanySerializer)))
+
 
 class CanRetrieveCompanyPermission(BasePermission):
     message = "Invalid permissions."
 
     def has_permission(self, request, view):
         if request.method == 'GET':
-            if request.user.groups.filter(name__in=['AEM Admin', 'AEM Employee']) or request.user.is_superuser:
+            identity = get_identity(request)
+
+            if identity.is_superuser or identity.in_any_group(settings.AEM_ADMIN_SLUG_FIELD,
+                                                              settings.AEM_EMPLOYEE_SLUG_FIELD):
                 return True
-            elif request.user.company is not None:
-                if request.user.company.pk is view.kwargs.get('pk', None):
+            elif identity.company is not None:
+                if identity.company_id == view.kwargs.get('pk', None):
                     return True
                 else:
-                    return request.user.has_perm(settings.VIEW_COMPANY_PERMISSION)
+                    return identity.has_perm(settings.VIEW_COMPANY_PERMISSION)
 
         return True
 
 
-class RetrieveCompanyAPIView(RetrieveAPIView):
+class CanViewCompanyStatsPermission(BasePermission):
+    message = "Invalid permissions."
+
+    def has_permission(self, request, view):
+        identity = get_identity(request)
+
+        if identity.is_superuser or identity.in_any_group(settings.AEM_ADMIN_SLUG_FIELD,
+                                                          settings.AEM_EMPLOYEE_SLUG_FIELD):
+            return True
+
+        return identity.company is not None and identity.company_id == view.kwargs.get('pk', None)
+
+
+class CompanyStatsAPIView(APIView):
+    """
+    The number of live users, clients and customers and active modules of a
+    company, read from the counters kept by `company.counters`. Only AEM staff
+    can see another company's.
+    """
+    permission_classes = (IsAuthenticated, CanViewCompanyStatsPermission)
+
+    def get(self, request, pk):
+        stats = Company.objects.filter(pk=pk).values('user_count', 'client_count', 'customer_count',
+                                                     'module_count').first()
+
+        if stats is None:
+            raise Http404
+
+        return Response({
+            'users': stats['user_count'],
+            'clients': stats['client_count'],
+            'customers': stats['customer_count'],
+            'modules': stats['module_count']
+        }, status=status.HTTP_200_OK)
+
+
+class RetrieveCompanyAPIView(CompanyETagMixin, RetrieveAPIView):
     """
     Retriecves a company based on PK
     """
     permission_classes = (IsAuthenticated, CanRetrieveCompanyPermission)
     serializer_class = CompanySerializer
 
+    def get_etag_company_id(self):
+        return self.kwargs['pk']
+
     def get_object(self):
-        return get_object_or_404(Company.objects.filter(pk=self.kwargs['pk']))
+        return get_object_or_404(select_company_fields(Company.objects.filter(pk=self.kwargs['pk']), self.request))
 
 
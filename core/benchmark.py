@@ -0,0 +1,46 @@
+import statistics
+import time
+from contextlib import contextmanager
+
+from django.db import transaction
+
+
+@contextmanager
+def rolled_back():
+    """
+    Run a benchmark's fixtures and measurements inside a transaction that is
+    always rolled back, so benchmarks can be pointed at a real database.
+    """
+    with transaction.atomic():
+        yield
+        transaction.set_rollback(True)
+
+
+def measure(func, iterations):
+    """
+    Call `func` `iterations` times and return the timings in milliseconds.
+    """
+    timings = []
+
+    for _ in range(iterations):
+        start = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - start) * 1000)
+
+    return timings
+
+
+def summarise(timings):
+    ordered = sorted(timings)
+
+    return {
+        'mean': statistics.mean(ordered),
+        'p50': ordered[len(ordered) // 2],
+        'p99': ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))],
+    }
+
+
+def format_summary(label, timings):
+    summary = summarise(timings)
+
+    return '{:<40} mean {mean:8.3f}ms  p50 {p50:8.3f}ms  p99 {p99:8.3f}ms'.format(label, **summary)
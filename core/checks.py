@@ -0,0 +1,27 @@
+from django.conf import settings
+from django.core.checks import Warning, register
+
+# Backends that keep entries in, or never leave, the process that wrote them.
+LOCAL_CACHE_BACKENDS = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+
+@register()
+def check_shared_cache(app_configs, **kwargs):
+    """
+    Token revocations, permission changes and throttle buckets only reach
+    every worker through a cache they all share.
+    """
+    backend = settings.CACHES.get('default', {}).get('BACKEND')
+
+    if backend in LOCAL_CACHE_BACKENDS:
+        return [Warning(
+            'The default cache ({}) is local to each process, so revoked tokens and permissions stay valid on '
+            'the other workers.'.format(backend),
+            hint='Point CACHES at a database, memcached or Redis cache.',
+            id='core.W001',
+        )]
+
+    return []
@@ -0,0 +1,87 @@
+"""
+Groups the rows of a company that are likely duplicates of each other, i.e.
+share a normalized email or phone number (see `core.normalization`), directly
+or through a chain of other rows.
+
+Rows are read once, in id order. Each key is looked up in a dict of the
+first row seen with it, and rows sharing a key are merged with a union-find,
+so the work grows linearly with the number of rows rather than with the
+number of pairs.
+"""
+
+# Mobile and landline numbers are matched against each other, a number is
+# often entered in the wrong field.
+KEY_KINDS = (
+    ('email_key', 'email'),
+    ('mobile_number_key', 'phone'),
+    ('landline_number_key', 'phone'),
+)
+
+
+class DisjointSet:
+    """
+    A union-find over row ids, with path halving and union by size.
+    """
+
+    def __init__(self):
+        self.parent = {}
+        self.size = {}
+
+    def find(self, item):
+        parent = self.parent.setdefault(item, item)
+
+        while parent != item:
+            grandparent = self.parent[parent]
+            self.parent[item] = grandparent
+            item, parent = parent, grandparent
+
+        return item
+
+    def union(self, first, second):
+        first, second = self.find(first), self.find(second)
+
+        if first == second:
+            return first
+
+        if self.size.get(first, 1) < self.size.get(second, 1):
+            first, second = second, first
+
+        self.parent[second] = first
+        self.size[first] = self.size.get(first, 1) + self.size.pop(second, 1)
+
+        return first
+
+
+def find_duplicates(queryset, chunk_size=2000):
+    """
+    Return the groups of likely duplicates among `queryset`, a queryset of
+    `Client` or `Customer`, as dicts of the `ids` in the group (ascending) and
+    the kinds of key, `email` and/or `phone`, they were `matched_on`. Groups
+    are ordered by their first id.
+    """
+    rows = queryset.order_by('id').values_list('id', *(key for key, _ in KEY_KINDS)).iterator(chunk_size=chunk_size)
+
+    first_seen = {}
+    matched_on = {}
+    groups = DisjointSet()
+
+    for pk, *keys in rows:
+        for (_, kind), key in zip(KEY_KINDS, keys):
+            if key is None:
+                continue
+
+            other = first_seen.setdefault((kind, key), pk)
+            if other == pk:
+                continue
+
+            kinds = matched_on.pop(groups.find(pk), set()) | matched_on.pop(groups.find(other), set())
+            matched_on[groups.union(pk, other)] = kinds | {kind}
+
+    members = {}
+    for pk in groups.parent:
+        members.setdefault(groups.find(pk), []).append(pk)
+
+    return sorted(
+        ({'ids': sorted(ids), 'matched_on': sorted(matched_on[root])} for root, ids in members.items()),
+        key=lambda group: group['ids'][0]
+    )
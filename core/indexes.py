@@ -0,0 +1,34 @@
+from django.db import migrations
+
+# Backends whose CREATE INDEX takes a WHERE clause.
+PARTIAL_INDEX_VENDORS = ('sqlite', 'postgresql')
+
+
+def add_partial_index(name, table, columns, condition):
+    """
+    A migration operation adding the index `name` on `table(columns)` for only
+    the rows where every `column=value` pair in `condition` holds, e.g. the
+    live rows of a soft deleted table. On other backends it does nothing and
+    the composite indexes on the models serve the same queries.
+
+    These indexes aren't part of the model state, so a migration that makes
+    SQLite rebuild the table (most column changes do) drops them and has to
+    add them again. Adding an index that already exists does nothing.
+    """
+
+    def create(apps, schema_editor):
+        if schema_editor.connection.vendor not in PARTIAL_INDEX_VENDORS:
+            return
+
+        quote_name = schema_editor.quote_name
+        where = ' AND '.join('{} = {}'.format(quote_name(column), schema_editor.quote_value(value))
+                             for column, value in condition.items())
+
+        schema_editor.execute('CREATE INDEX IF NOT EXISTS {} ON {} ({}) WHERE {}'.format(
+            quote_name(name), quote_name(table), ', '.join(quote_name(column) for column in columns), where))
+
+    def drop(apps, schema_editor):
+        if schema_editor.connection.vendor in PARTIAL_INDEX_VENDORS:
+            schema_editor.execute('DROP INDEX IF EXISTS {}'.format(schema_editor.quote_name(name)))
+
+    return migrations.RunPython(create, drop)
@@ -0,0 +1,50 @@
+"""
+Resolves a caller's phone number to the clients and customers of a company
+with that number, using the normalized, indexed phone keys kept by
+`core.normalization`.
+"""
+from django.db.models import CharField, F, Value
+
+from clients.models import Client
+from customers.models import Customer
+from .normalization import normalize_phone
+
+PHONE_KEYS = ('mobile_number_key', 'landline_number_key')
+
+# The client a match is, or belongs to, is returned as `client`.
+SOURCES = (
+    ('client', Client, 'id'),
+    ('customer', Customer, 'client_id'),
+)
+
+MATCH_FIELDS = ('type', 'id', 'client', 'name', 'account_number', 'email')
+
+
+def lookup_phone(company_id, number):
+    """
+    Return the clients and customers of `company_id` whose mobile or landline
+    number is `number`, in whatever format it's given, as dicts of
+    `MATCH_FIELDS` ordered by type and id. Returns `None` when `number` isn't
+    a plausible phone number.
+
+    Every (model, number column) pair is a separate equality on its
+    `(company, key)` index, combined into a single UNION query.
+    """
+    key = normalize_phone(number)
+
+    if key is None:
+        return None
+
+    queries = [
+        model.objects.filter(company_id=company_id, **{column: key}).annotate(
+            type=Value(kind, output_field=CharField()), owner=F(client_field)
+        ).values_list('type', 'id', 'owner', 'name', 'account_number', 'email')
+        for kind, model, client_field in SOURCES
+        for column in PHONE_KEYS
+    ]
+
+    # UNION rather than UNION ALL, a row with the number in both columns is
+    # only returned once.
+    rows = queries[0].union(*queries[1:]).order_by('type', 'id')
+
+    return [dict(zip(MATCH_FIELDS, row)) for row in rows]
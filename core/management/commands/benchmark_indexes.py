@@ -0,0 +1,89 @@
+import random
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.db.models import Count
+
+from aemauthentication.models import User
+from clients.models import Client
+from company.models import Company
+from core.benchmark import format_summary, measure, rolled_back
+from core.utils import chunked
+from customers.models import Customer
+
+# The indexes added for the tenant scoped queries, dropped (and restored by the
+# rollback) to get the "before" numbers.
+INDEXES = ('client_company_live_idx', 'client_company_live_part', 'customer_client_live_idx',
+           'customer_client_live_part', 'customer_company_live_idx', 'customer_company_live_part',
+           'user_company_live_idx', 'user_company_live_part')
+
+
+class Command(BaseCommand):
+    help = 'Shows the query plans and timings of the tenant scoped queries with and without the live row indexes.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--clients', type=int, default=200000)
+        parser.add_argument('--companies', type=int, default=100)
+        parser.add_argument('--deleted', type=float, default=0.2, help='Fraction of soft deleted rows.')
+        parser.add_argument('--iterations', type=int, default=200)
+
+    def handle(self, *args, **options):
+        rng = random.Random(0)
+
+        with rolled_back():
+            companies = [Company.objects.create(name='benchmark-indexes-{}'.format(i))
+                         for i in range(options['companies'])]
+
+            for batch in chunked(range(options['clients']), 5000):
+                Client.objects.bulk_create(
+                    Client(company=rng.choice(companies), name='Client {}'.format(i), email='c{}@example.com'.format(i),
+                           is_deleted=rng.random() < options['deleted'])
+                    for i in batch
+                )
+
+            clients = Client._base_manager.filter(company__in=companies).values_list('id', 'company_id').iterator()
+            for batch in chunked(clients, 5000):
+                Customer.objects.bulk_create(
+                    Customer(client_id=client_id, company_id=company_id, name='Customer', email='customer@example.com',
+                             is_deleted=rng.random() < options['deleted'])
+                    for client_id, company_id in batch
+                    for _ in range(2)
+                )
+
+            User.objects.bulk_create(
+                User(username='benchmark-indexes-{}-{}'.format(company.pk, i), company=company,
+                     is_active=rng.random() > options['deleted'])
+                for company in companies
+                for i in range(20)
+            )
+
+            with connection.cursor() as cursor:
+                cursor.execute('ANALYZE')
+
+            company = companies[0]
+            page = list(Client.objects.filter(company=company).order_by('id').values_list('id', flat=True)[:100])
+
+            queries = {
+                'client page': lambda: Client.objects.filter(company=company).order_by('id')[:100],
+                'deep client page': lambda: Client.objects.filter(company=company, id__gt=page[50]).order_by('id')[:100],
+                'live client count': lambda: Client.objects.filter(company=company).values('company').annotate(
+                    count=Count('id')),
+                'customer prefetch': lambda: Customer.objects.filter(client_id__in=page).order_by('id'),
+                'customer page': lambda: Customer.objects.filter(company=company).order_by('id')[:100],
+                'company users': lambda: User.objects.filter(company=company),
+            }
+
+            self._run('with indexes', queries, options['iterations'])
+
+            with connection.cursor() as cursor:
+                for index in INDEXES:
+                    cursor.execute('DROP INDEX IF EXISTS {}'.format(connection.ops.quote_name(index)))
+
+            self._run('without indexes', queries, options['iterations'])
+
+    def _run(self, label, queries, iterations):
+        self.stdout.write(label)
+
+        for name, queryset in queries.items():
+            self.stdout.write('  {}: {}'.format(name, queryset().explain().replace('\n', '; ')))
+            self.stdout.write('  ' + format_summary(name, measure(lambda: list(queryset()), iterations)))
@@ -0,0 +1,77 @@
+import random
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.db.models import Q
+
+from clients.models import Client
+from company.models import Company
+from core.benchmark import format_summary, measure, rolled_back
+from core.lookup import lookup_phone
+from core.normalization import set_contact_keys
+from core.utils import chunked
+from customers.models import Customer
+
+
+class Command(BaseCommand):
+    help = 'Compares /lookup/phone/ on the normalized phone keys against an icontains scan of the raw numbers.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--clients', type=int, default=100000)
+        parser.add_argument('--customers-per-client', type=int, default=4)
+        parser.add_argument('--companies', type=int, default=10)
+        parser.add_argument('--iterations', type=int, default=200)
+
+    def handle(self, *args, **options):
+        rng = random.Random(0)
+
+        # Numbers are written the ways people type them.
+        formats = ('0{} {}', '0{}{}', '+44 {} {}', '(0{}) {}')
+
+        def phone():
+            area, number = '{:04d}'.format(rng.randrange(1000, 9999)), '{:06d}'.format(rng.randrange(10 ** 6))
+            return rng.choice(formats).format(area, number)
+
+        def with_keys(instance):
+            set_contact_keys(instance)
+            return instance
+
+        with rolled_back():
+            companies = [Company.objects.create(name='benchmark-phone-{}'.format(i))
+                         for i in range(options['companies'])]
+
+            for batch in chunked(range(options['clients']), 5000):
+                Client.objects.bulk_create(
+                    with_keys(Client(company=rng.choice(companies), name='Client {}'.format(i),
+                                     email='client{}@example.com'.format(i), mobile_number=phone(),
+                                     landline_number=phone()))
+                    for i in batch
+                )
+
+            clients = Client.objects.filter(company__in=companies).values_list('id', 'company_id').iterator()
+            for batch in chunked(clients, 5000):
+                Customer.objects.bulk_create(
+                    with_keys(Customer(client_id=client_id, company_id=company_id, name='Customer',
+                                       email='customer@example.com', mobile_number=phone()))
+                    for client_id, company_id in batch
+                    for _ in range(options['customers_per_client'])
+                )
+
+            with connection.cursor() as cursor:
+                cursor.execute('ANALYZE')
+
+            company = companies[0]
+            known = Customer.objects.filter(company=company).values_list('mobile_number', flat=True).first()
+
+            for number in (known, '07000 000000'):
+                timings = measure(lambda: lookup_phone(company.pk, number), options['iterations'])
+                self.stdout.write(format_summary('keys "{}"'.format(number), timings))
+
+                def scan():
+                    digits = number[-6:]
+                    condition = Q(mobile_number__icontains=digits) | Q(landline_number__icontains=digits)
+                    list(Client.objects.filter(Q(company=company) & condition))
+                    list(Customer.objects.filter(Q(client__company=company) & condition))
+
+                timings = measure(scan, max(1, options['iterations'] // 20))
+                self.stdout.write(format_summary('icontains "{}"'.format(number), timings))
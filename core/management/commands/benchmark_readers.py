@@ -0,0 +1,90 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db.models import Prefetch
+from rest_framework.renderers import JSONRenderer
+
+from clients.models import Client
+from clients.readers import client_rows, client_values
+from clients.serializers import ClientSerializer
+from company.models import Company, CompanyModule
+from company.readers import company_rows
+from company.serializers import CompanySerializer
+from core.benchmark import rolled_back
+from core.utils import chunked
+from customers.models import Customer
+
+
+class Command(BaseCommand):
+    help = 'Compares rows per second of the values() readers against the serializers for the list endpoints.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--clients', type=int, default=5000)
+        parser.add_argument('--customers-per-client', type=int, default=3)
+        parser.add_argument('--companies', type=int, default=2000)
+        parser.add_argument('--iterations', type=int, default=5)
+
+    def handle(self, *args, **options):
+        with rolled_back():
+            company = Company.objects.create(name='benchmark-readers')
+
+            for batch in chunked(range(options['clients']), 5000):
+                Client.objects.bulk_create(
+                    Client(company=company, name='Client {}'.format(i), email='client{}@example.com'.format(i),
+                           description='Description {}'.format(i))
+                    for i in batch
+                )
+
+            client_ids = list(Client.objects.filter(company=company).values_list('id', flat=True))
+            for batch in chunked(client_ids, 5000):
+                Customer.objects.bulk_create(
+                    Customer(client_id=client_id, company=company, name='Customer {}'.format(i), email='customer@example.com')
+                    for client_id in batch
+                    for i in range(options['customers_per_client'])
+                )
+
+            Company.objects.bulk_create(Company(name='benchmark-readers-{}'.format(i))
+                                        for i in range(options['companies']))
+            modules = [CompanyModule.objects.create(name='Module {}'.format(i), slug_field='module-{}'.format(i),
+                                                    image_url='https://example.com/{}.png'.format(i))
+                       for i in range(4)]
+            Company.modules.through.objects.bulk_create(
+                Company.modules.through(company_id=company_id, companymodule_id=module.pk)
+                for company_id in Company.objects.values_list('id', flat=True)
+                for module in modules
+            )
+
+            clients = Client.objects.filter(company=company).order_by('id')
+            customers = Prefetch('customer', queryset=Customer.objects.order_by('id'))
+            companies = Company.objects.order_by('id')
+            company_modules = Prefetch('modules', queryset=CompanyModule.objects.order_by('id'))
+
+            self._compare(
+                'clients',
+                lambda: ClientSerializer(clients.prefetch_related(customers), many=True).data,
+                lambda: client_rows(list(client_values(clients))),
+                options['iterations'])
+
+            self._compare(
+                'companies',
+                lambda: CompanySerializer(companies.prefetch_related(company_modules), many=True).data,
+                lambda: company_rows(companies),
+                options['iterations'])
+
+    def _compare(self, label, serialize, read, iterations):
+        renderer = JSONRenderer()
+
+        if renderer.render(serialize()) != renderer.render(read()):
+            self.stderr.write('{}: the reader output differs from the serializer output'.format(label))
+
+        for name, func in (('serializer', serialize), ('reader', read)):
+            start = time.perf_counter()
+            rows = 0
+
+            for _ in range(iterations):
+                data = func()
+                renderer.render(data)
+                rows += len(data)
+
+            elapsed = time.perf_counter() - start
+            self.stdout.write('{:<10} {:<10} {:>12,.0f} rows/s'.format(label, name, rows / elapsed))
@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from clients.models import Client
+from company.models import Company
+from core.duplicates import find_duplicates
+from core.normalization import backfill_contact_keys
+from customers.models import Customer
+
+MODELS = {
+    'clients': Client,
+    'customers': Customer,
+}
+
+
+class Command(BaseCommand):
+    help = "Lists the groups of a company's clients or customers that share a normalized email or phone number."
+
+    def add_arguments(self, parser):
+        parser.add_argument('company_id', type=int)
+        parser.add_argument('--model', choices=sorted(MODELS), default='customers')
+        parser.add_argument('--refresh-keys', action='store_true',
+                            help='Recompute the normalized keys of every row first, e.g. after a bulk .update().')
+
+    def handle(self, *args, **options):
+        if not Company.objects.filter(pk=options['company_id']).exists():
+            raise CommandError('Company {} does not exist.'.format(options['company_id']))
+
+        model = MODELS[options['model']]
+
+        if options['refresh_keys']:
+            self.stdout.write('{} keys refreshed'.format(backfill_contact_keys(model)))
+
+        groups = find_duplicates(model.objects.filter(company_id=options['company_id']))
+
+        for group in groups:
+            self.stdout.write('{} ({})'.format(', '.join(str(pk) for pk in group['ids']), ', '.join(group['matched_on'])))
+
+        self.stdout.write('{} groups, {} {} in them'.format(
+            len(groups), sum(len(group['ids']) for group in groups), options['model']))
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from clients.models import Client
+from core.normalization import backfill_contact_keys
+from customers.models import Customer
+
+
+class Command(BaseCommand):
+    help = ('Recomputes the normalized email and phone keys of every client and customer whose keys are out of '
+            'date, e.g. after a bulk .update() or a change of PHONE_DEFAULT_COUNTRY_CODE.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        for model in (Client, Customer):
+            updated = backfill_contact_keys(model, options['batch_size'])
+            self.stdout.write('{}: {} updated'.format(model._meta.verbose_name_plural, updated))
@@ -0,0 +1,20 @@
+# Generated by Django 2.1.3 on 2026-10-18 15:10
+
+from django.core.management import call_command
+from django.db import migrations
+
+
+def create_cache_table(apps, schema_editor):
+    # Does nothing when CACHES has no database backed cache, or its table
+    # already exists.
+    call_command('createcachetable', database=schema_editor.connection.alias, verbosity=0)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.RunPython(create_cache_table, migrations.RunPython.noop),
+    ]
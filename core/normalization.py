@@ -0,0 +1,125 @@
+"""
+Normalized forms of the contact details people type in free text, used as
+the matching keys for finding duplicates.
+
+The keys are stored next to the values they're made from (`email_key`,
+`mobile_number_key` and `landline_number_key` on `Client` and `Customer`)
+and are set by `set_contact_keys` whenever a row is saved or bulk inserted.
+"""
+from django.conf import settings
+from django.db.models import Case, CharField, Value, When
+
+DIGITS = '0123456789'
+
+# E.164 numbers are at most 15 digits, anything shorter than this is too
+# incomplete to match on.
+PHONE_MIN_DIGITS = 7
+PHONE_MAX_DIGITS = 15
+
+CONTACT_KEYS = (
+    ('email_key', 'email'),
+    ('mobile_number_key', 'mobile_number'),
+    ('landline_number_key', 'landline_number'),
+)
+
+
+def normalize_email(value):
+    """
+    The email `value` trimmed and lowercased, or `None` when it's blank.
+    """
+    value = (value or '').strip().lower()
+
+    return value or None
+
+
+def normalize_phone(value, country_code=None):
+    """
+    The phone number `value` as E.164 digits without the leading `+`, e.g.
+    `'0191 213 1247'` becomes `'441912131247'`.
+
+    Numbers written with a `+` or `00` prefix keep their country code, a
+    leading `0` is taken as a national trunk prefix and replaced with
+    `country_code` (by default `PHONE_DEFAULT_COUNTRY_CODE`), anything else is
+    assumed to already start with its country code. Returns `None` when there
+    aren't a plausible number of digits.
+    """
+    value = (value or '').strip()
+    digits = ''.join(char for char in value if char in DIGITS)
+
+    if not value.startswith('+'):
+        if digits.startswith('00'):
+            digits = digits[2:]
+        elif digits.startswith('0'):
+            digits = (country_code or settings.PHONE_DEFAULT_COUNTRY_CODE) + digits[1:]
+
+    if not PHONE_MIN_DIGITS <= len(digits) <= PHONE_MAX_DIGITS:
+        return None
+
+    return digits
+
+
+def contact_keys(email, mobile_number, landline_number):
+    return {
+        'email_key': normalize_email(email),
+        'mobile_number_key': normalize_phone(mobile_number),
+        'landline_number_key': normalize_phone(landline_number),
+    }
+
+
+def set_contact_keys(instance):
+    """
+    Set the key columns of a `Client` or `Customer` from its contact details.
+    """
+    for name, value in contact_keys(instance.email, instance.mobile_number, instance.landline_number).items():
+        setattr(instance, name, value)
+
+
+def with_contact_keys(update_fields):
+    """
+    The `update_fields` of a save with the key columns of any contact details
+    among them, so the keys are written along with the values.
+    """
+    if update_fields is None:
+        return None
+
+    update_fields = list(update_fields)
+
+    return update_fields + [key for key, field in CONTACT_KEYS if field in update_fields and key not in update_fields]
+
+
+def backfill_contact_keys(model, batch_size=2000):
+    """
+    Set the key columns of every row of `model` whose keys are out of date,
+    for the migrations adding them and anything changed with `.update()`.
+    Returns the number of rows updated.
+
+    The stale rows of each page are written with a single `CASE` update.
+    """
+    fields = ['id'] + [field for _, field in CONTACT_KEYS] + [key for key, _ in CONTACT_KEYS]
+    queryset = model._base_manager.order_by('id').values_list(*fields)
+    last_id = 0
+    updated = 0
+
+    # Read a page at a time by id rather than holding a cursor open over the
+    # rows being updated.
+    while True:
+        batch = list(queryset.filter(id__gt=last_id)[:batch_size])
+
+        if not batch:
+            return updated
+
+        stale = {}
+        for pk, email, mobile_number, landline_number, *current in batch:
+            keys = contact_keys(email, mobile_number, landline_number)
+
+            if list(keys.values()) != current:
+                stale[pk] = keys
+
+        if stale:
+            updated += model._base_manager.filter(pk__in=stale).update(**{
+                key: Case(*[When(pk=pk, then=Value(keys[key])) for pk, keys in stale.items()],
+                          output_field=CharField())
+                for key, _ in CONTACT_KEYS
+            })
+
+        last_id = batch[-1][0]
@@ -0,0 +1,13 @@
+from django.conf import settings
+from rest_framework.pagination import CursorPagination
+
+
+class KeysetPagination(CursorPagination):
+    """
+    Cursor pagination on the primary key, so each page is a `WHERE id > ...
+    LIMIT n` and deep pages cost the same as the first one.
+    """
+    ordering = 'id'
+    page_size = settings.CURSOR_PAGE_SIZE
+    page_size_query_param = 'page_size'
+    max_page_size = settings.CURSOR_MAX_PAGE_SIZE
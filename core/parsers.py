@@ -0,0 +1,73 @@
+import codecs
+import csv
+import json
+
+from django.conf import settings
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import BaseParser
+
+
+class JSONLinesParser(BaseParser):
+    """
+    Parses newline delimited JSON lazily.
+
+    `request.data` becomes an iterator of `(line_number, row)` pairs, read from
+    the request stream as it is consumed. A line that can't be parsed yields a
+    `ParseError` in place of its row so the caller can report it and carry on.
+    """
+    media_type = 'application/x-ndjson'
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        parser_context = parser_context or {}
+        encoding = parser_context.get('encoding', settings.DEFAULT_CHARSET)
+
+        return self._rows(stream, encoding)
+
+    @staticmethod
+    def _rows(stream, encoding):
+        if stream is None:
+            return
+
+        for line_number, line in enumerate(codecs.iterdecode(stream, encoding), 1):
+            line = line.strip()
+
+            if not line:
+                continue
+
+            try:
+                row = json.loads(line)
+            except ValueError as exc:
+                yield line_number, ParseError('JSON parse error - {}'.format(exc))
+                continue
+
+            if not isinstance(row, dict):
+                yield line_number, ParseError('Expected a JSON object.')
+                continue
+
+            yield line_number, row
+
+
+class CSVParser(BaseParser):
+    """
+    Parses CSV with a header row lazily, see `JSONLinesParser`.
+    """
+    media_type = 'text/csv'
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        parser_context = parser_context or {}
+        encoding = parser_context.get('encoding', settings.DEFAULT_CHARSET)
+
+        return self._rows(stream, encoding)
+
+    @staticmethod
+    def _rows(stream, encoding):
+        if stream is None:
+            return
+
+        reader = csv.DictReader(codecs.iterdecode(stream, encoding))
+
+        try:
+            for row in reader:
+                yield reader.line_num, row
+        except csv.Error as exc:
+            yield reader.line_num, ParseError('CSV parse error - {}'.format(exc))
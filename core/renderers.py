@@ -0,0 +1,14 @@
+from rest_framework.renderers import JSONRenderer
+
+
+class JSONLinesRenderer(JSONRenderer):
+    """
+    Newline delimited JSON. Views that stream their rows write the lines
+    themselves, anything else rendered this way (e.g. an error) becomes a
+    single line.
+    """
+    media_type = 'application/x-ndjson'
+    format = 'ndjson'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return super().render(data, accepted_media_type, renderer_context) + b'\n'
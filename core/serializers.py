@@ -0,0 +1,50 @@
+def _parse_names(request, param):
+    value = request.query_params.get(param)
+
+    if value is None:
+        return None
+
+    return {name.strip() for name in value.split(',') if name.strip()}
+
+
+def requested_fields(request, serializer_class):
+    """
+    Return the names of the fields of `serializer_class` asked for by a GET
+    with `?fields=` and/or `?expand=`, or `None` for all of them.
+
+    `?fields=` picks fields, leaving out the nested ones in
+    `Meta.expandable_fields` unless they are named there or in `?expand=`.
+    Without either parameter every field is returned, as it always was.
+    """
+    if request is None or request.method != 'GET':
+        return None
+
+    fields = _parse_names(request, 'fields')
+    expand = _parse_names(request, 'expand')
+
+    if fields is None and expand is None:
+        return None
+
+    all_fields = set(serializer_class.Meta.fields)
+    expandable = set(getattr(serializer_class.Meta, 'expandable_fields', ()))
+
+    if fields is None:
+        fields = all_fields - expandable
+
+    return (fields | (expand or set())) & all_fields
+
+
+class SparseFieldsetsMixin:
+    """
+    Leaves out the fields not asked for, see `requested_fields`. Write only
+    fields are always kept.
+    """
+
+    def get_fields(self):
+        fields = super().get_fields()
+        selected = requested_fields(self.context.get('request'), type(self))
+
+        if selected is None:
+            return fields
+
+        return {name: field for name, field in fields.items() if name in selected or field.write_only}
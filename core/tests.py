@@ -1,3 +1,208 @@
-from django.test import TestCase
+import io
 
-# Create your tests here.
+from django.conf import settings
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from aemauthentication.factories import AemGroupFactory, UserFactory
+from clients.factories import ClientFactory
+from clients.models import Client
+from company.factories import CompanyFactory
+from core.checks import check_shared_cache
+from core.duplicates import DisjointSet, find_duplicates
+from core.normalization import backfill_contact_keys, normalize_email, normalize_phone
+from customers.factories import CustomerFactory
+from customers.models import Customer
+
+
+class NormalizationTestCase(TestCase):
+
+    def test_email_is_trimmed_and_lowercased(self):
+        self.assertEqual(normalize_email('  Someone@Example.COM '), 'someone@example.com')
+        self.assertIsNone(normalize_email('  '))
+        self.assertIsNone(normalize_email(None))
+
+    def test_phone_numbers_become_e164_digits(self):
+        self.assertEqual(normalize_phone('0191 2131247'), '441912131247')
+        self.assertEqual(normalize_phone('07949 887097'), '447949887097')
+        self.assertEqual(normalize_phone('+44 7949-887097'), '447949887097')
+        self.assertEqual(normalize_phone('0044 7949 887097'), '447949887097')
+        self.assertEqual(normalize_phone('+1 212 555 0100'), '12125550100')
+        self.assertEqual(normalize_phone('0212 555 0100', country_code='1'), '12125550100')
+
+    def test_implausible_phone_numbers_have_no_key(self):
+        self.assertIsNone(normalize_phone(''))
+        self.assertIsNone(normalize_phone('ext 12'))
+        self.assertIsNone(normalize_phone('+1234567890123456'))
+
+    def test_refresh_contact_keys_command_fixes_stale_keys(self):
+        client = ClientFactory.create(company=CompanyFactory.create(), mobile_number='07949 887097')
+        Client.objects.filter(pk=client.pk).update(mobile_number='0191 2131247')
+
+        out = io.StringIO()
+        call_command('refresh_contact_keys', stdout=out)
+
+        client.refresh_from_db()
+        self.assertEqual(client.mobile_number_key, '441912131247')
+        self.assertIn('clients: 1 updated', out.getvalue())
+
+    def test_backfill_writes_a_page_in_one_update(self):
+        company = CompanyFactory.create()
+        clients = ClientFactory.create_batch(3, company=company, email='old@example.com')
+        Client.objects.filter(company=company).update(email='Office@Example.com')
+        Client.objects.filter(pk=clients[2].pk).update(landline_number='')
+
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(backfill_contact_keys(Client), 3)
+
+        self.assertEqual([query['sql'].split()[0] for query in queries], ['SELECT', 'UPDATE', 'SELECT'])
+        self.assertEqual(set(Client.objects.values_list('email_key', flat=True)), {'office@example.com'})
+        self.assertIsNone(Client.objects.get(pk=clients[2].pk).landline_number_key)
+
+    def test_saving_contact_fields_saves_their_keys(self):
+        client = ClientFactory.create(company=CompanyFactory.create())
+        client.email = ' New@Example.com'
+        client.save(update_fields=['email'])
+
+        self.assertEqual(Client.objects.values_list('email_key', flat=True).get(pk=client.pk), 'new@example.com')
+
+
+class FindDuplicatesTestCase(TestCase):
+
+    def setUp(self):
+        self.company = CompanyFactory.create()
+        self.owner = ClientFactory.create(company=self.company)
+
+    def _customer(self, email, mobile_number=None, landline_number=None, client=None):
+        return CustomerFactory.create(client=client or self.owner, email=email, mobile_number=mobile_number,
+                                      landline_number=landline_number)
+
+    def test_disjoint_set_merges_chains(self):
+        groups = DisjointSet()
+        groups.union(1, 2)
+        groups.union(3, 4)
+        groups.union(2, 4)
+
+        self.assertEqual(len({groups.find(item) for item in (1, 2, 3, 4)}), 1)
+        self.assertNotEqual(groups.find(5), groups.find(1))
+
+    def test_rows_are_grouped_through_shared_keys(self):
+        first = self._customer('Jo@Example.com', mobile_number='07949 887097')
+        second = self._customer('jo@example.com ')
+        # Only linked to the first through a number entered as a landline.
+        third = self._customer('other@example.com', landline_number='+447949887097')
+        fourth = self._customer('fourth@example.com', mobile_number='0191 2131247')
+        fifth = self._customer('fifth@example.com', landline_number='01912131247')
+        self._customer('alone@example.com', mobile_number='0123 456789')
+
+        self.assertEqual(find_duplicates(Customer.objects.filter(company=self.company)), [
+            {'ids': [first.pk, second.pk, third.pk], 'matched_on': ['email', 'phone']},
+            {'ids': [fourth.pk, fifth.pk], 'matched_on': ['phone']},
+        ])
+
+    def test_groups_are_per_queryset(self):
+        self._customer('jo@example.com')
+        self._customer('jo@example.com', client=ClientFactory.create(company=CompanyFactory.create()))
+
+        self.assertEqual(find_duplicates(Customer.objects.filter(company=self.company)), [])
+
+    def test_rows_are_read_in_a_single_query(self):
+        for _ in range(5):
+            self._customer('jo@example.com')
+
+        with self.assertNumQueries(1):
+            groups = find_duplicates(Customer.objects.filter(company=self.company))
+
+        self.assertEqual(len(groups[0]['ids']), 5)
+
+
+class PhoneLookupTestCase(APITestCase):
+
+    def setUp(self):
+        self.company = CompanyFactory.create()
+        self.user = UserFactory.create(company=self.company, group=AemGroupFactory.for_role('AEM_CUSTOMER_SUPER_USER'))
+
+        self.caller = ClientFactory.create(company=self.company, mobile_number='07949 887097',
+                                           landline_number='+447949887097')
+        self.customer = CustomerFactory.create(client=ClientFactory.create(company=self.company),
+                                               landline_number='0044 7949 887097')
+        CustomerFactory.create(client=self.caller, mobile_number='0191 2131247')
+        CustomerFactory.create(client=self.caller, mobile_number='07949 887097', is_deleted=True)
+        ClientFactory.create(company=CompanyFactory.create(), mobile_number='07949887097')
+
+        self.client.force_authenticate(user=self.user)
+
+    def _lookup(self, number):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('phone-lookup', kwargs={'number': number}))
+
+        return response, [query['sql'] for query in queries if 'silk_' not in query['sql']]
+
+    def test_number_in_any_format_finds_clients_and_customers(self):
+        response, _ = self._lookup('+44 7949 887097')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK, response.content)
+        self.assertEqual(response.json(), [
+            {'type': 'client', 'id': self.caller.pk, 'client': self.caller.pk, 'name': self.caller.name,
+             'account_number': self.caller.account_number, 'email': self.caller.email},
+            {'type': 'customer', 'id': self.customer.pk, 'client': self.customer.client_id, 'name': self.customer.name,
+             'account_number': self.customer.account_number, 'email': self.customer.email},
+        ])
+
+    def test_lookup_is_a_single_indexed_query(self):
+        _, queries = self._lookup('07949887097')
+
+        lookup_queries = [sql for sql in queries if 'mobile_number_key' in sql]
+        self.assertEqual(len(lookup_queries), 1)
+
+        with connection.cursor() as cursor:
+            cursor.execute('EXPLAIN QUERY PLAN {}'.format(lookup_queries[0]))
+            plan = ' '.join(row[-1] for row in cursor.fetchall())
+
+        self.assertNotIn('SCAN', plan)
+        for index in ('client_mobile_key_idx', 'client_landline_key_idx', 'customer_mobile_key_idx',
+                      'customer_landline_key_idx'):
+            self.assertIn(index, plan)
+
+    def test_unknown_number_finds_nothing(self):
+        response, _ = self._lookup('07000 000000')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json(), [])
+
+    def test_invalid_number_is_rejected(self):
+        response, _ = self._lookup('ext 12')
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_lookup_needs_view_permissions_only(self):
+        self.client.force_authenticate(user=UserFactory.create(
+            company=self.company,
+            group=AemGroupFactory.create(
+                slug_field=settings.AEM_CUSTOMER_USER_SLUG_FIELD,
+                linked_group__name=settings.AEM_CUSTOMER_USER_LINKED_GROUP_NAME,
+                client_permissions=settings.AEM_CUSTOMER_USER_CLIENT_PERMISSIONS,
+                customer_permissions=settings.AEM_CUSTOMER_USER_CUSTOMER_PERMISSIONS
+            )
+        ))
+        response, _ = self._lookup('07949887097')
+        self.assertEqual(response.status_code, status.HTTP_200_OK, response.content)
+
+        self.client.force_authenticate(user=UserFactory.create(company=self.company))
+        response, _ = self._lookup('07949887097')
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN, response.content)
+
+
+class SharedCacheCheckTestCase(TestCase):
+
+    def test_configured_cache_is_shared(self):
+        self.assertEqual(check_shared_cache(None), [])
+
+    @override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+    def test_process_local_cache_is_reported(self):
+        self.assertEqual([warning.id for warning in check_shared_cache(None)], ['core.W001'])
@@ -0,0 +1,17 @@
+from itertools import islice
+
+
+def chunked(iterable, size):
+    """
+    Yield successive lists of at most `size` items from `iterable`, without
+    ever holding more than one chunk in memory.
+    """
+    iterator = iter(iterable)
+
+    while True:
+        chunk = list(islice(iterator, size))
+
+        if not chunk:
+            return
+
+        yield chunk
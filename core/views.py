@@ -1,3 +1,38 @@
-from django.shortcuts import render
+from django.conf import settings
+from rest_framework import status
+from rest_framework.permissions import IsAuthenticated, BasePermission
+from rest_framework.response import Response
+from rest_framework.views import APIView
 
-# Create your views here.
+from aemauthentication.identity import get_identity
+from core.lookup import lookup_phone
+
+
+class CanLookupPhonePermission(BasePermission):
+    message = "Invalid permissions to view clients and customers."
+
+    def has_permission(self, request, view):
+        identity = get_identity(request)
+
+        if not identity.company:
+            self.message = 'You must be associated with a company to look up a phone number.'
+            return False
+
+        return identity.has_perm(settings.VIEW_CLIENT_PERMISSION) and \
+            identity.has_perm(settings.VIEW_CUSTOMER_PERMISSION)
+
+
+class PhoneLookupAPIView(APIView):
+    """
+    Finds the user's company's clients and customers with the phone number
+    `number`, e.g. for a caller ID, written in any format.
+    """
+    permission_classes = (IsAuthenticated, CanLookupPhonePermission,)
+
+    def get(self, request, number):
+        matches = lookup_phone(get_identity(request).company_id, number)
+
+        if matches is None:
+            return Response({'detail': 'Not a valid phone number.'}, status=status.HTTP_400_BAD_REQUEST)
+
+        return Response(matches, status=status.HTTP_200_OK)
@@ -0,0 +1,12 @@
+import factory
+
+from customers.models import Customer
+
+
+class CustomerFactory(factory.django.DjangoModelFactory):
+    class Meta:
+        model = Customer
+
+    name = factory.Faker('name')
+    account_number = factory.Faker('name')
+    email = factory.Faker('email')
@@ -0,0 +1,86 @@
+from django.conf import settings
+from django.db import transaction
+
+from clients.models import Client
+from company import counters
+from company.versioning import bump_version
+from core.normalization import set_contact_keys
+from core.utils import chunked
+from .models import Customer
+from .serializers import BulkCustomerSerializer
+
+
+def import_customers(company, rows, batch_size=None):
+    """
+    Create customers in bulk for the clients of `company`.
+
+    `rows` is an iterable of `(line_number, row)` pairs, as produced by the
+    parsers in `core.parsers`. Rows are validated a batch at a time, the
+    clients they name are checked to belong to `company` in one query per
+    batch, and the valid rows are inserted together. A result is yielded for
+    every row in the order they were given.
+    """
+    batch_size = batch_size or settings.BULK_BATCH_SIZE
+
+    for batch in chunked(rows, batch_size):
+        yield from _import_batch(company, batch)
+
+
+def _import_batch(company, batch):
+    results = {}
+    valid = []
+
+    for line_number, row in batch:
+        if isinstance(row, Exception):
+            results[line_number] = _error(line_number, {'error': [str(row)]})
+            continue
+
+        serializer = BulkCustomerSerializer(data=row)
+
+        if not serializer.is_valid():
+            results[line_number] = _error(line_number, serializer.errors)
+            continue
+
+        valid.append((line_number, serializer.validated_data))
+
+    owned = set(Client.objects.filter(id__in={data['client'] for _, data in valid}, company=company)
+                .values_list('id', flat=True))
+
+    customers = []
+
+    for line_number, data in valid:
+        if data['client'] not in owned:
+            results[line_number] = _error(line_number, {'client': ['Client does not exist.']})
+            continue
+
+        fields = dict(data)
+        client_id = fields.pop('client')
+        customer = Customer(company=company, client_id=client_id, **fields)
+        set_contact_keys(customer)
+        customers.append((line_number, customer))
+
+    if customers:
+        with transaction.atomic():
+            Customer.objects.bulk_create([customer for _, customer in customers])
+
+            # `bulk_create` sends no signals.
+            counters.adjust(company.pk, customer_count=len(customers))
+            bump_version(company.pk)
+
+        for line_number, customer in customers:
+            results[line_number] = {
+                'line': line_number,
+                'status': 'created',
+                'client': customer.client_id,
+            }
+
+    for line_number, _ in batch:
+        yield results[line_number]
+
+
+def _error(line_number, errors):
+    return {
+        'line': line_number,
+        'status': 'error',
+        'errors': errors,
+    }
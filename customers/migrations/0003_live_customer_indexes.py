@@ -0,0 +1,20 @@
+# Generated by Django 2.1.3 on 2026-10-18 13:09
+
+from django.db import migrations, models
+
+from core.indexes import add_partial_index
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('customers', '0002_auto_20181212_2111'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='customer',
+            index=models.Index(fields=['client', 'is_deleted', 'id'], name='customer_client_live_idx'),
+        ),
+        add_partial_index('customer_client_live_part', 'customers_customer', ['client_id', 'id'], {'is_deleted': False}),
+    ]
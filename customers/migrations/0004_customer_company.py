@@ -0,0 +1,45 @@
+# Generated by Django 2.1.3 on 2026-10-18 14:02
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+import django.db.models.deletion
+
+from core.indexes import add_partial_index
+
+
+def copy_client_company(apps, schema_editor):
+    Client = apps.get_model('clients', 'Client')
+    Customer = apps.get_model('customers', 'Customer')
+
+    Customer._base_manager.update(company_id=Subquery(
+        Client._base_manager.filter(pk=OuterRef('client_id')).values('company_id')[:1]))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('company', '0010_company_counters'),
+        ('clients', '0004_live_client_indexes'),
+        ('customers', '0003_live_customer_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='customer',
+            name='company',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='customer', to='company.Company'),
+        ),
+        migrations.RunPython(copy_client_company, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='customer',
+            name='company',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='customer', to='company.Company'),
+        ),
+        migrations.AddIndex(
+            model_name='customer',
+            index=models.Index(fields=['company', 'is_deleted', 'id'], name='customer_company_live_idx'),
+        ),
+        # SQLite rebuilt the table above, dropping the partial indexes.
+        add_partial_index('customer_client_live_part', 'customers_customer', ['client_id', 'id'], {'is_deleted': False}),
+        add_partial_index('customer_company_live_part', 'customers_customer', ['company_id', 'id'], {'is_deleted': False}),
+    ]
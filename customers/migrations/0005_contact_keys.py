@@ -0,0 +1,51 @@
+# Generated by Django 2.1.3 on 2026-10-18 13:23
+
+from django.db import migrations, models
+
+from core.indexes import add_partial_index
+from core.normalization import backfill_contact_keys
+
+
+def set_existing_keys(apps, schema_editor):
+    backfill_contact_keys(apps.get_model('customers', 'Customer'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('customers', '0004_customer_company'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='customer',
+            name='email_key',
+            field=models.CharField(blank=True, editable=False, max_length=254, null=True),
+        ),
+        migrations.AddField(
+            model_name='customer',
+            name='landline_number_key',
+            field=models.CharField(blank=True, editable=False, max_length=15, null=True),
+        ),
+        migrations.AddField(
+            model_name='customer',
+            name='mobile_number_key',
+            field=models.CharField(blank=True, editable=False, max_length=15, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='customer',
+            index=models.Index(fields=['company', 'email_key'], name='customer_email_key_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='customer',
+            index=models.Index(fields=['company', 'mobile_number_key'], name='customer_mobile_key_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='customer',
+            index=models.Index(fields=['company', 'landline_number_key'], name='customer_landline_key_idx'),
+        ),
+        migrations.RunPython(set_existing_keys, migrations.RunPython.noop),
+        # SQLite rebuilt the table above, dropping the partial indexes.
+        add_partial_index('customer_client_live_part', 'customers_customer', ['client_id', 'id'], {'is_deleted': False}),
+        add_partial_index('customer_company_live_part', 'customers_customer', ['company_id', 'id'], {'is_deleted': False}),
+    ]
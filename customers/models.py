@@ -1,6 +1,8 @@
 from django.db import models
 import uuid
 
+from core.normalization import set_contact_keys, with_contact_keys
+
 
 class CustomerQuerySet(models.QuerySet):
     def active_and_not_deleted(self):
@@ -16,6 +18,7 @@ class CustomerManager(models.Manager):
                         landline_number, email, description, system_details):
         customer = self.model(
             client=client,
+            company_id=client.company_id,
             name=name,
             account_number=account_number,
             mobile_number=mobile_number,
@@ -33,6 +36,10 @@ class Customer(models.Model):
     client = models.ForeignKey('clients.Client', on_delete=models.CASCADE, null=False, blank=False,
                                related_name='customer')
 
+    # The client's company, kept here so a company's customers can be listed without joining clients
+    company = models.ForeignKey('company.Company', on_delete=models.CASCADE, null=False, blank=False,
+                                related_name='customer')
+
     # Customer Name
     name = models.CharField(max_length=100, blank=False, null=False)
 
@@ -54,10 +61,34 @@ class Customer(models.Model):
     # Email
     email = models.EmailField()
 
+    # The email and phone numbers normalized for matching duplicates, see `core.normalization`
+    email_key = models.CharField(max_length=254, blank=True, null=True, editable=False)
+    mobile_number_key = models.CharField(max_length=15, blank=True, null=True, editable=False)
+    landline_number_key = models.CharField(max_length=15, blank=True, null=True, editable=False)
+
     # Indicates whether this user has been deleted or not
     is_deleted = models.BooleanField(default=False)
 
     objects = CustomerManager()
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['client', 'is_deleted', 'id'], name='customer_client_live_idx'),
+            models.Index(fields=['company', 'is_deleted', 'id'], name='customer_company_live_idx'),
+            models.Index(fields=['company', 'email_key'], name='customer_email_key_idx'),
+            models.Index(fields=['company', 'mobile_number_key'], name='customer_mobile_key_idx'),
+            models.Index(fields=['company', 'landline_number_key'], name='customer_landline_key_idx'),
+        ]
+
     def __str__(self):
         return self.name
+
+    def save(self, *args, **kwargs):
+        # A customer always belongs to its client's company.
+        if self.client_id is not None:
+            self.company_id = self.client.company_id
+
+        set_contact_keys(self)
+        kwargs['update_fields'] = with_contact_keys(kwargs.get('update_fields'))
+
+        super().save(*args, **kwargs)
@@ -15,3 +15,12 @@ class CustomerSerializer(serializers.ModelSerializer):
 
     def create(self, validated_data):
         return Customer.objects.create_customer(**validated_data)
+
+
+class BulkCustomerSerializer(CustomerSerializer):
+    """
+    Validates a single row of a bulk customer upload. The client is only
+    checked to be an id here, ownership of every client in a batch is checked
+    together.
+    """
+    client = serializers.IntegerField()
@@ -1,6 +1,11 @@
+import io
+import json
 import uuid
 
+from django.core.management import call_command
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from rest_framework import status
 from rest_framework.test import APITestCase
@@ -11,6 +16,7 @@ from django.conf import settings
 from clients.factories import ClientFactory
 from clients.models import Client
 from company.factories import CompanyFactory
+from customers.factories import CustomerFactory
 from customers.models import Customer
 
 
@@ -27,75 +33,21 @@ class CreateCustomerTestCase(APITestCase):
     }
 
     def setUp(self):
-        self.aem_admin = UserFactory.create(group=AemGroupFactory.create(
-            slug_field=settings.AEM_ADMIN_SLUG_FIELD,
-            linked_group__name=settings.AEM_ADMIN_LINKED_GROUP_NAME,
-            can_add_permission_slugs=settings.AEM_ADMIN_CAN_ADD_USER_PERMISSIONS,
-            client_permissions=settings.AEM_ADMIN_CLIENT_PERMISSIONS,
-            customer_permissions=settings.AEM_ADMIN_CUSTOMER_PERMISSIONS,
-            company_permissions=settings.AEM_ADMIN_COMPANY_PERMISSIONS
-        ))
+        self.aem_admin = UserFactory.create(group=AemGroupFactory.for_role('AEM_ADMIN'))
 
-        self.aem_employee = UserFactory.create(group=AemGroupFactory.create(
-            slug_field=settings.AEM_EMPLOYEE_SLUG_FIELD,
-            linked_group__name=settings.AEM_EMPLOYEE_LINKED_GROUP_NAME,
-            can_add_permission_slugs=settings.AEM_EMPLOYEE_CAN_ADD_USER_PERMISSIONS,
-            client_permissions=settings.AEM_EMPLOYEE_CLIENT_PERMISSIONS,
-            customer_permissions=settings.AEM_EMPLOYEE_CUSTOMER_PERMISSIONS,
-            company_permissions=settings.AEM_EMPLOYEE_COMPANY_PERMISSIONS
-        ))
+        self.aem_employee = UserFactory.create(group=AemGroupFactory.for_role('AEM_EMPLOYEE'))
 
         client_company = CompanyFactory.create()
 
-        self.aem_customer_super_user = UserFactory.create(
-            company=client_company,
-            group=AemGroupFactory.create(
-                slug_field=settings.AEM_CUSTOMER_SUPER_USER_SLUG_FIELD,
-                linked_group__name=settings.AEM_CUSTOMER_SUPER_USER_LINKED_GROUP_NAME,
-                can_add_permission_slugs=settings.AEM_CUSTOMER_SUPER_USER_CAN_ADD_USER_PERMISSIONS,
-                client_permissions=settings.AEM_CUSTOMER_SUPER_USER_CLIENT_PERMISSIONS,
-                customer_permissions=settings.AEM_CUSTOMER_SUPER_USER_CUSTOMER_PERMISSIONS,
-                company_permissions=settings.AEM_CUSTOMER_SUPER_USER_COMPANY_PERMISSIONS
-            )
-        )
+        self.aem_customer_super_user = UserFactory.create(company=client_company, group=AemGroupFactory.for_role('AEM_CUSTOMER_SUPER_USER'))
 
-        self.aem_customer_admin = UserFactory.create(
-            company=client_company,
-            group=AemGroupFactory.create(
-                slug_field=settings.AEM_CUSTOMER_ADMIN_SLUG_FIELD,
-                linked_group__name=settings.AEM_CUSTOMER_ADMIN_LINKED_GROUP_NAME,
-                can_add_permission_slugs=settings.AEM_CUSTOMER_ADMIN_CAN_ADD_USER_PERMISSIONS,
-                client_permissions=settings.AEM_CUSTOMER_ADMIN_CLIENT_PERMISSIONS,
-                customer_permissions=settings.AEM_CUSTOMER_ADMIN_CUSTOMER_PERMISSIONS,
-                company_permissions=settings.AEM_CUSTOMER_ADMIN_COMPANY_PERMISSIONS
-            )
-        )
+        self.aem_customer_admin = UserFactory.create(company=client_company, group=AemGroupFactory.for_role('AEM_CUSTOMER_ADMIN'))
 
-        self.aem_customer_user = UserFactory.create(
-            company=client_company,
-            group=AemGroupFactory.create(
-                slug_field=settings.AEM_CUSTOMER_USER_SLUG_FIELD,
-                linked_group__name=settings.AEM_CUSTOMER_USER_LINKED_GROUP_NAME,
-                can_add_permission_slugs=settings.AEM_CUSTOMER_USER_CAN_ADD_USER_PERMISSIONS,
-                client_permissions=settings.AEM_CUSTOMER_USER_CLIENT_PERMISSIONS,
-                customer_permissions=settings.AEM_CUSTOMER_USER_CUSTOMER_PERMISSIONS,
-                company_permissions=settings.AEM_CUSTOMER_USER_COMPANY_PERMISSIONS
-            )
-        )
+        self.aem_customer_user = UserFactory.create(company=client_company, group=AemGroupFactory.for_role('AEM_CUSTOMER_USER'))
 
         client_company_two = CompanyFactory.create()
 
-        self.aem_customer_super_user_company_two = UserFactory.create(
-            company=client_company_two,
-            group=AemGroupFactory.create(
-                slug_field=settings.AEM_CUSTOMER_SUPER_USER_SLUG_FIELD,
-                linked_group__name=settings.AEM_CUSTOMER_SUPER_USER_LINKED_GROUP_NAME,
-                can_add_permission_slugs=settings.AEM_CUSTOMER_SUPER_USER_CAN_ADD_USER_PERMISSIONS,
-                client_permissions=settings.AEM_CUSTOMER_SUPER_USER_CLIENT_PERMISSIONS,
-                customer_permissions=settings.AEM_CUSTOMER_SUPER_USER_CUSTOMER_PERMISSIONS,
-                company_permissions=settings.AEM_CUSTOMER_SUPER_USER_COMPANY_PERMISSIONS
-            )
-        )
+        self.aem_customer_super_user_company_two = UserFactory.create(company=client_company_two, group=AemGroupFactory.for_role('AEM_CUSTOMER_SUPER_USER'))
 
     def _test_list_create_customer_view_permissions(self, user, data, expected_status_code, response_keys=None):
         self.client.force_authenticate(user=user)
@@ -188,3 +140,268 @@ class CreateCustomerTestCase(APITestCase):
                                                          data=self.valid_add_customer_request,
                                                          expected_status_code=status.HTTP_403_FORBIDDEN,
                                                          response_keys=('detail',))
+
+    def test_customer_takes_company_of_client(self):
+        user = self.aem_customer_super_user
+        self.valid_add_customer_request['client'] = ClientFactory(company=user.company).id
+
+        self._test_list_create_customer_view_permissions(user=user,
+                                                         data=self.valid_add_customer_request,
+                                                         expected_status_code=status.HTTP_201_CREATED)
+
+        self.assertEqual(Customer.objects.get().company_id, user.company_id)
+
+
+class ListCustomerTestCase(APITestCase):
+
+    def setUp(self):
+        self.company = CompanyFactory.create()
+        self.user = UserFactory.create(company=self.company, group=AemGroupFactory.for_role('AEM_CUSTOMER_SUPER_USER'))
+
+        self.customers = []
+        for client in ClientFactory.create_batch(2, company=self.company):
+            self.customers += CustomerFactory.create_batch(3, client=client)
+        self.customers.sort(key=lambda customer: customer.id)
+
+        CustomerFactory.create(client=ClientFactory.create(company=self.company), is_deleted=True)
+        CustomerFactory.create(client=ClientFactory.create(company=CompanyFactory.create()))
+
+        self.client.force_authenticate(user=self.user)
+
+    def _list(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK, response.content)
+
+        # Leave out silk's own bookkeeping, which varies between requests.
+        return response.json(), [query['sql'] for query in queries if 'silk_' not in query['sql']]
+
+    def test_customers_of_company_are_paginated_by_cursor(self):
+        page, _ = self._list('{}?page_size=4'.format(reverse('list-create-customer')))
+
+        self.assertEqual([customer['id'] for customer in page['results']],
+                         [customer.id for customer in self.customers[:4]])
+
+        page, _ = self._list(page['next'])
+
+        self.assertEqual([customer['id'] for customer in page['results']],
+                         [customer.id for customer in self.customers[4:]])
+        self.assertIsNone(page['next'])
+
+    def test_list_doesnt_join_clients(self):
+        _, queries = self._list(reverse('list-create-customer'))
+
+        customer_queries = [sql for sql in queries if 'FROM "customers_customer"' in sql]
+        self.assertEqual(len(customer_queries), 1)
+        self.assertNotIn('clients_client', customer_queries[0])
+
+    def test_page_is_read_from_company_index(self):
+        plan = Customer.objects.filter(company=self.company).order_by('id')[:100].explain()
+
+        self.assertIn('customer_company_live', plan)
+
+    def test_user_without_company_cant_list_customers(self):
+        self.client.force_authenticate(user=UserFactory.create())
+
+        response = self.client.get(reverse('list-create-customer'))
+
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+
+class ListClientCustomersTestCase(APITestCase):
+
+    def setUp(self):
+        self.company = CompanyFactory.create()
+        self.user = UserFactory.create(company=self.company, group=AemGroupFactory.for_role('AEM_CUSTOMER_SUPER_USER'))
+
+        self.client_with_customers = ClientFactory.create(company=self.company)
+        self.customers = CustomerFactory.create_batch(5, client=self.client_with_customers)
+        CustomerFactory.create(client=self.client_with_customers, is_deleted=True)
+        CustomerFactory.create(client=ClientFactory.create(company=self.company))
+
+        self.other_client = ClientFactory.create(company=CompanyFactory.create())
+        CustomerFactory.create(client=self.other_client)
+
+        self.client.force_authenticate(user=self.user)
+
+    def _url(self, client):
+        return reverse('list-client-customers', kwargs={'pk': client.pk})
+
+    def test_viewing_needs_only_the_view_permission(self):
+        self.client.force_authenticate(user=UserFactory.create(
+            company=self.company,
+            group=AemGroupFactory.create(
+                slug_field=settings.AEM_CUSTOMER_USER_SLUG_FIELD,
+                linked_group__name=settings.AEM_CUSTOMER_USER_LINKED_GROUP_NAME,
+                customer_permissions=settings.AEM_CUSTOMER_USER_CUSTOMER_PERMISSIONS
+            )
+        ))
+
+        response = self.client.get(self._url(self.client_with_customers))
+        self.assertEqual(response.status_code, status.HTTP_200_OK, response.content)
+
+    def test_customers_of_client_are_paginated_by_cursor(self):
+        response = self.client.get('{}?page_size=3'.format(self._url(self.client_with_customers)))
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK, response.content)
+        self.assertEqual([customer['id'] for customer in response.json()['results']],
+                         [customer.id for customer in self.customers[:3]])
+
+        response = self.client.get(response.json()['next'])
+
+        self.assertEqual([customer['id'] for customer in response.json()['results']],
+                         [customer.id for customer in self.customers[3:]])
+        self.assertIsNone(response.json()['next'])
+
+    def test_ownership_is_checked_in_one_query(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(self._url(self.client_with_customers))
+
+        client_queries = [query['sql'] for query in queries
+                          if 'silk_' not in query['sql'] and 'FROM "clients_client"' in query['sql']]
+        self.assertEqual(len(client_queries), 1)
+
+    def test_other_companys_client_is_not_found(self):
+        response = self.client.get(self._url(self.other_client))
+
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_deleted_client_is_not_found(self):
+        self.client_with_customers.is_deleted = True
+        self.client_with_customers.save()
+
+        response = self.client.get(self._url(self.client_with_customers))
+
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_create_with_invalid_client_is_forbidden(self):
+        response = self.client.post(reverse('list-create-customer'),
+                                    dict(CreateCustomerTestCase.valid_add_customer_request, client='abc'),
+                                    format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+
+class BulkCreateCustomerTestCase(APITestCase):
+
+    def setUp(self):
+        self.company = CompanyFactory.create()
+        self.user = UserFactory.create(company=self.company, group=AemGroupFactory.for_role('AEM_CUSTOMER_SUPER_USER'))
+
+        self.clients = ClientFactory.create_batch(3, company=self.company)
+        self.other_client = ClientFactory.create(company=CompanyFactory.create())
+
+        self.client.force_authenticate(user=self.user)
+
+    def _upload(self, rows):
+        body = '\n'.join(row if isinstance(row, str) else json.dumps(row) for row in rows)
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.generic('POST', reverse('bulk-create-customer'), body,
+                                           content_type='application/x-ndjson')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK, response.content)
+
+        return response.json(), [query['sql'] for query in queries if 'silk_' not in query['sql']]
+
+    def _row(self, client, name):
+        return {'client': client.pk, 'name': name, 'email': '{}@example.com'.format(name)}
+
+    def test_rows_are_created_across_clients_with_a_status_each(self):
+        result, _ = self._upload([
+            self._row(self.clients[0], 'first'),
+            self._row(self.clients[1], 'second'),
+            self._row(self.other_client, 'third'),
+            dict(self._row(self.clients[2], 'fourth'), email='not an email'),
+            '{not json',
+            self._row(self.clients[2], 'fifth'),
+        ])
+
+        self.assertEqual(result['created'], 3)
+        self.assertEqual(result['failed'], 3)
+        self.assertEqual([row['status'] for row in result['results']],
+                         ['created', 'created', 'error', 'error', 'error', 'created'])
+        self.assertIn('client', result['results'][2]['errors'])
+        self.assertIn('email', result['results'][3]['errors'])
+
+        self.assertEqual(sorted(Customer.objects.filter(company=self.company).values_list('name', 'client_id')),
+                         [('fifth', self.clients[2].pk), ('first', self.clients[0].pk),
+                          ('second', self.clients[1].pk)])
+        self.assertFalse(Customer.objects.filter(client=self.other_client).exists())
+
+        self.company.refresh_from_db()
+        self.assertEqual(self.company.customer_count, 3)
+
+    def test_bulk_created_rows_have_contact_keys(self):
+        self._upload([dict(self._row(self.clients[0], 'first'), email='First@Example.com', mobile_number='07949 887097')])
+
+        self.assertEqual(Customer.objects.values_list('email_key', 'mobile_number_key').get(),
+                         ('first@example.com', '447949887097'))
+
+    def test_ownership_is_checked_once_per_batch(self):
+        rows = [self._row(client, 'customer-{}-{}'.format(client.pk, i)) for client in self.clients for i in range(4)]
+
+        _, queries = self._upload(rows)
+
+        client_queries = [sql for sql in queries if 'FROM "clients_client"' in sql]
+        self.assertEqual(len(client_queries), 1)
+        self.assertEqual(Customer.objects.filter(company=self.company).count(), 12)
+
+    def test_user_without_company_cant_bulk_create(self):
+        self.client.force_authenticate(user=UserFactory.create())
+
+        response = self.client.generic('POST', reverse('bulk-create-customer'),
+                                       json.dumps(self._row(self.clients[0], 'first')),
+                                       content_type='application/x-ndjson')
+
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+
+class CustomerDuplicatesTestCase(APITestCase):
+
+    def setUp(self):
+        self.company = CompanyFactory.create()
+        self.user = UserFactory.create(company=self.company, group=AemGroupFactory.for_role('AEM_CUSTOMER_SUPER_USER'))
+
+        client = ClientFactory.create(company=self.company)
+        self.first = CustomerFactory.create(client=client, email='jo@example.com', mobile_number='07949 887097')
+        self.second = CustomerFactory.create(client=ClientFactory.create(company=self.company),
+                                             email='JO@example.com')
+        CustomerFactory.create(client=client, email='someone@example.com')
+        CustomerFactory.create(client=ClientFactory.create(company=CompanyFactory.create()), email='jo@example.com')
+
+        self.client.force_authenticate(user=self.user)
+
+    def test_duplicates_of_company_are_grouped(self):
+        response = self.client.get(reverse('customer-duplicates'))
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK, response.content)
+        self.assertEqual(response.json(), [{'ids': [self.first.pk, self.second.pk], 'matched_on': ['email']}])
+
+    def test_viewing_duplicates_doesnt_need_add_permission(self):
+        self.client.force_authenticate(user=UserFactory.create(
+            company=self.company,
+            group=AemGroupFactory.create(
+                slug_field=settings.AEM_CUSTOMER_USER_SLUG_FIELD,
+                linked_group__name=settings.AEM_CUSTOMER_USER_LINKED_GROUP_NAME,
+                customer_permissions=settings.AEM_CUSTOMER_USER_CUSTOMER_PERMISSIONS
+            )
+        ))
+
+        response = self.client.get(reverse('customer-duplicates'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK, response.content)
+
+        self.client.force_authenticate(user=UserFactory.create(company=self.company))
+        response = self.client.get(reverse('customer-duplicates'))
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN, response.content)
+
+    def test_find_duplicates_command_refreshes_keys(self):
+        # `.update()` doesn't go through `save()`, so the keys are stale.
+        Customer.objects.filter(pk=self.second.pk).update(email='other@example.com', landline_number='+447949887097')
+
+        out = io.StringIO()
+        call_command('find_duplicates', self.company.pk, '--refresh-keys', stdout=out)
+
+        self.assertIn('{}, {} (phone)'.format(self.first.pk, self.second.pk), out.getvalue())
+        self.assertIn('1 groups, 2 customers in them', out.getvalue())
@@ -1,38 +1,82 @@
 import itertools
 
 from django.conf import settings
+from django.http import Http404
 from rest_framework.permissions import IsAuthenticated, BasePermission
 from rest_framework.response import Response
 from rest_framework.views import APIView
-from rest_framework.generics import ListCreateAPIView
+from rest_framework.generics import ListAPIView, ListCreateAPIView
 
+from aemauthentication.identity import get_identity
 from clients.models import Client
 from clients.serializers import ClientSerializer
+from core.duplicates import find_duplicates
+from core.pagination import KeysetPagination
+from core.parsers import CSVParser, JSONLinesParser
 from rest_framework import generics, permissions, status
 
+from customers.importing import import_customers
 from customers.models import Customer
 from customers.serializers import CustomerSerializer
 
 
+def client_belongs_to_company(client_id, company_id):
+    """
+    Whether `client_id` is a live client of `company_id`, in a single primary
+    key lookup. Another company's clients are reported as missing so their ids
+    can't be probed.
+    """
+    try:
+        return Client.objects.filter(pk=client_id, company_id=company_id).exists()
+    except (TypeError, ValueError):
+        return False
+
+
 class CanCreateCustomerPermission(BasePermission):
     message = "Invalid permissions to create customer."
 
     def has_permission(self, request, view):
-        if not request.user.company:
+        identity = get_identity(request)
+
+        if not identity.company:
             self.message = 'You must be associated with a company to create a customer.'
             return False
 
-        if not request.user.has_perm(settings.ADD_CUSTOMER_PERMISSION):
+        if not identity.has_perm(settings.ADD_CUSTOMER_PERMISSION):
             self.message = 'Invalid permissions to create a customer.'
             return False
 
-        try:
-            client = Client.objects.get(id=request.data['client'])
+        return True
+
+
+class CanViewCustomersPermission(BasePermission):
+    message = "Invalid permissions to view customers."
+
+    def has_permission(self, request, view):
+        identity = get_identity(request)
+
+        if not identity.company:
+            self.message = 'You must be associated with a company to view customers.'
+            return False
+
+        return identity.has_perm(settings.VIEW_CUSTOMER_PERMISSION)
+
+
+class CanAddCustomerToClientPermission(CanCreateCustomerPermission):
+    """
+    Also requires the client a new customer is created for to belong to the
+    user's company.
+    """
 
-            if client.company.id != request.user.company.id:
-                self.message = 'Client does not belong to your company.'
-                return False
-        except Client.DoesNotExist:
+    def has_permission(self, request, view):
+        if not super().has_permission(request, view):
+            return False
+
+        # Only a create names a client, listing is scoped to the user's company.
+        if request.method != 'POST':
+            return True
+
+        if not client_belongs_to_company(request.data.get('client'), get_identity(request).company_id):
             self.message = 'Client does not exist.'
             return False
 
@@ -41,15 +85,66 @@ class CanCreateCustomerPermission(BasePermission):
 
 class CreateCustomerAPIView(ListCreateAPIView):
     """
-    Creates a new Customer.
+    Lists the customers of the user's company, a page at a time, or creates a
+    new Customer.
     """
-    permission_classes = (IsAuthenticated, CanCreateCustomerPermission,)
+    permission_classes = (IsAuthenticated, CanAddCustomerToClientPermission,)
     serializer_class = CustomerSerializer
+    pagination_class = KeysetPagination
 
     def get_serializer(self, *args, **kwargs):
         serializer = super().get_serializer(*args, **kwargs)
-        serializer.company = self.request.user.company
+        serializer.company = get_identity(self.request).company
         return serializer
 
     def get_queryset(self):
-        return Customer.objects.filter(company__user=self.request.user)
+        return Customer.objects.filter(company_id=get_identity(self.request).company_id)
+
+
+class ListClientCustomersAPIView(ListAPIView):
+    """
+    Lists the customers of one of the user's clients, a page at a time.
+    """
+    permission_classes = (IsAuthenticated, CanViewCustomersPermission,)
+    serializer_class = CustomerSerializer
+    pagination_class = KeysetPagination
+
+    def get_queryset(self):
+        if not client_belongs_to_company(self.kwargs['pk'], get_identity(self.request).company_id):
+            raise Http404
+
+        return Customer.objects.filter(client_id=self.kwargs['pk'])
+
+
+class BulkCreateCustomerAPIView(APIView):
+    """
+    Creates many customers, across any of the user's clients, from a JSON
+    lines or CSV upload.
+
+    The response reports the outcome of every row by line number.
+    """
+    permission_classes = (IsAuthenticated, CanCreateCustomerPermission,)
+    parser_classes = (JSONLinesParser, CSVParser)
+
+    def post(self, request):
+        results = list(import_customers(get_identity(request).company, request.data))
+        created = sum(1 for result in results if result['status'] == 'created')
+
+        return Response({
+            'created': created,
+            'failed': len(results) - created,
+            'results': results
+        }, status=status.HTTP_200_OK)
+
+
+class CustomerDuplicatesAPIView(APIView):
+    """
+    Groups the user's company's customers that share a normalized email or
+    phone number, see `core.duplicates`.
+    """
+    permission_classes = (IsAuthenticated, CanViewCustomersPermission,)
+
+    def get(self, request):
+        groups = find_duplicates(Customer.objects.filter(company_id=get_identity(request).company_id))
+
+        return Response(groups, status=status.HTTP_200_OK)
@@ -0,0 +1,44 @@
+# Generated by Django 2.1.3 on 2026-10-18 17:05
+
+from django.db import migrations
+
+# The groups of a company's own staff, and the permissions to read its clients
+# and customers they're given, as in `AEM_CUSTOMER_*_PERMISSIONS` in settings.
+CUSTOMER_GROUP_SLUGS = ('aem-customer-super-user', 'aem-customer-admin', 'aem-customer-user')
+VIEW_PERMISSIONS = (
+    ('clients', 'client', 'view_client', 'Can view client'),
+    ('customers', 'customer', 'view_customer', 'Can view customer'),
+)
+
+
+def grant_view_permissions(apps, schema_editor):
+    AemGroup = apps.get_model('groups', 'AemGroup')
+    ContentType = apps.get_model('contenttypes', 'ContentType')
+    Permission = apps.get_model('auth', 'Permission')
+
+    # Permissions are only created after all the migrations have run, so they
+    # may not exist yet.
+    permissions = []
+    for app_label, model, codename, name in VIEW_PERMISSIONS:
+        content_type, _ = ContentType.objects.get_or_create(app_label=app_label, model=model)
+        permission, _ = Permission.objects.get_or_create(content_type=content_type, codename=codename,
+                                                         defaults={'name': name})
+        permissions.append(permission)
+
+    for aem_group in AemGroup.objects.filter(slug_field__in=CUSTOMER_GROUP_SLUGS).select_related('linked_group'):
+        aem_group.linked_group.permissions.add(*permissions)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('groups', '0001_initial'),
+        ('auth', '0009_alter_user_last_name_max_length'),
+        ('contenttypes', '0002_remove_content_type_name'),
+        ('clients', '0005_contact_keys'),
+        ('customers', '0005_contact_keys'),
+    ]
+
+    operations = [
+        migrations.RunPython(grant_view_permissions, migrations.RunPython.noop),
+    ]
@@ -1,3 +1,51 @@
-from django.test import TestCase
+import importlib
 
-# Create your tests here.
+from django.apps import apps
+from django.contrib.auth.models import Group
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from aemauthentication.factories import UserFactory
+from company.factories import CompanyFactory
+from groups.models import AemGroup
+
+grant_view_permissions = importlib.import_module('groups.migrations.0002_grant_view_permissions')
+
+
+class GrantViewPermissionsMigrationTestCase(APITestCase):
+    """
+    Groups made before the migration, as in a deployed database, rather than
+    built by the factories from the settings.
+    """
+
+    def setUp(self):
+        self.company = CompanyFactory.create()
+        self.group = AemGroup.objects.create(slug_field='aem-customer-user',
+                                             linked_group=Group.objects.create(name='Aem Customer User'))
+        self.user = UserFactory.create(company=self.company, group=self.group)
+
+        self.client.force_authenticate(user=self.user)
+
+    def test_customer_groups_can_read_after_migrating(self):
+        self.assertEqual(self.client.get(reverse('customer-duplicates')).status_code, status.HTTP_403_FORBIDDEN)
+
+        grant_view_permissions.grant_view_permissions(apps, None)
+
+        self.assertEqual(self.client.get(reverse('customer-duplicates')).status_code, status.HTTP_200_OK)
+        self.assertEqual(self.client.get(reverse('client-duplicates')).status_code, status.HTTP_200_OK)
+
+    def test_customer_groups_can_look_up_phone_numbers_after_migrating(self):
+        url = reverse('phone-lookup', kwargs={'number': '07949887097'})
+        self.assertEqual(self.client.get(url).status_code, status.HTTP_403_FORBIDDEN)
+
+        grant_view_permissions.grant_view_permissions(apps, None)
+
+        self.assertEqual(self.client.get(url).status_code, status.HTTP_200_OK)
+
+    def test_other_groups_are_left_alone(self):
+        staff = AemGroup.objects.create(slug_field='aem-employee', linked_group=Group.objects.create(name='Staff'))
+
+        grant_view_permissions.grant_view_permissions(apps, None)
+
+        self.assertFalse(staff.linked_group.permissions.exists())